@@ -1,13 +1,28 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response
 from flask_cors import CORS
 import os
 import threading
 import time
 from werkzeug.utils import secure_filename
 import json
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # 导入原有的处理函数
-from video_processor import VideoProcessor
+from video_processor import VideoProcessor, TTS_VOICE, TTS_SAMPLE_RATE, ASR_SAMPLE_RATE, SUBTITLE_MODES, SUBTITLE_MODE
+from model_registry import model_registry
+from translation_cache import translation_cache
+from job_scheduler import job_scheduler, stage_pools, QueueFullError
+from task_store import create_task_store, FINISHED_STATUSES
+from artifact_cache import artifact_cache, file_digest
+from chunked_upload import ChunkedUploadManager, UploadError
+from checkpoint import JobCheckpoint, STAGES, WORKER_ID, worker_alive, list_checkpoints
+from time_stretch import TIME_STRETCH_ENGINE
+from encoding_profiles import ENCODING_PROFILES, ENCODING_PROFILE, get_profile
+from vad import vad_params
+from asr_backends import get_backend
+from segment_stream import SegmentStream
+from parallel_asr import PARALLEL_ASR_PREWARM, parallel_asr_params, warm_up as warm_up_asr_pool
 
 app = Flask(__name__)
 CORS(app)
@@ -24,12 +39,67 @@ app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# 全局变量存储处理状态
-processing_status = {}
+# 分块上传会话
+upload_manager = ChunkedUploadManager(os.path.join(UPLOAD_FOLDER, '.parts'))
+# 整体上传（/api/upload-video）与单个分块的请求体上限
+app.config['MAX_CONTENT_LENGTH'] = upload_manager.max_bytes
+
+# 任务状态存储（默认SQLite，多个进程共享）
+task_store = create_task_store()
+
+# URL任务先只下载音频流并开始识别，视频流在后台下载，合成前才等待
+URL_SPLIT_DOWNLOAD = os.environ.get('URL_SPLIT_DOWNLOAD', 'true').lower() in ('1', 'true', 'yes', 'on')
+# 带字幕的任务边识别边翻译、生成字幕和配音
+ASR_STREAMING = os.environ.get('ASR_STREAMING', 'true').lower() in ('1', 'true', 'yes', 'on')
+# 后台下载视频流的线程，每个在途任务最多占用一个
+background_downloads = ThreadPoolExecutor(max_workers=job_scheduler.max_workers, thread_name_prefix='video_download')
+
+# SSE连接无变化时发送心跳注释的间隔（秒），防止被代理断开
+EVENTS_HEARTBEAT_SECONDS = 15
+# 完成时一次性发送的大字段
+RESULT_FIELDS = ('transcript', 'translated', 'optimized')
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def new_task_id(prefix):
+    """生成任务ID，同一秒内提交的任务不会冲突"""
+    return f"{prefix}_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+
+def queue_full_response(error):
+    """任务队列已满时返回503并带上建议重试时间"""
+    response = jsonify({
+        'success': False,
+        'error': str(error),
+        'retry_after': error.retry_after
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def start_model_warmup(debug=False):
+    """服务启动时在后台预热Whisper模型，首个任务无需等待加载"""
+    # debug模式下reloader父进程不处理请求，只在实际服务的子进程中加载
+    if debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    thread = threading.Thread(target=model_registry.preload)
+    thread.daemon = True
+    thread.start()
+    # 识别进程池默认在第一个长任务时才创建，开启预热时在启动时拉起，各进程加载好模型
+    if PARALLEL_ASR_PREWARM and parallel_asr_params():
+        thread = threading.Thread(target=warm_up_asr_pool, args=(model_registry.default_size,))
+        thread.daemon = True
+        thread.start()
+
+def option_error(label, value, choices):
+    """任务选项不合法时返回400响应"""
+    if value not in choices:
+        return jsonify({
+            'success': False,
+            'error': f'未知{label}: {value}，可选: {", ".join(choices)}'
+        }), 400
+    return None
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -41,25 +111,40 @@ def process_video():
         video_url = data.get('video_url', '')
         add_subtitles = data.get('add_subtitles', True)
         audio_mode = data.get('audio_mode', 'synth')
-        task_id = f"task_{int(time.time())}"
+        subtitle_mode = data.get('subtitle_mode', SUBTITLE_MODE)
+        encoding_profile = data.get('encoding_profile', ENCODING_PROFILE)
+        error = (option_error('字幕方式', subtitle_mode, SUBTITLE_MODES)
+                 or option_error('编码档位', encoding_profile, ENCODING_PROFILES))
+        if error:
+            return error
+        task_id = new_task_id('task')
         
-        # 初始化处理状态
-        processing_status[task_id] = {
-            'status': 'processing',
+        # 初始化处理状态，并记录任务参数供中断后恢复
+        task_store.create(task_id, {
+            'status': 'queued',
             'progress': 0,
-            'message': '开始处理...',
-            'steps': []
-        }
+            'message': '排队等待处理...',
+            'steps': [],
+            'worker': WORKER_ID
+        })
+        JobCheckpoint(task_id).save_job(kind='url', video_url=video_url, add_subtitles=add_subtitles,
+                                        audio_mode=audio_mode, subtitle_mode=subtitle_mode,
+                                        encoding_profile=encoding_profile)
         
-        # 在后台线程中处理视频
-        thread = threading.Thread(target=process_video_background, args=(task_id, video_url, add_subtitles, audio_mode))
-        thread.daemon = True
-        thread.start()
+        # 提交到任务调度器，由有界工作线程池处理
+        try:
+            position = job_scheduler.submit(task_id, process_video_background, task_id, video_url, add_subtitles,
+                                            audio_mode, subtitle_mode, encoding_profile)
+        except QueueFullError as e:
+            task_store.delete(task_id)
+            JobCheckpoint(task_id).delete()
+            return queue_full_response(e)
         
         return jsonify({
             'success': True,
             'task_id': task_id,
-            'message': '视频处理已开始'
+            'queue_position': position,
+            'message': '视频处理已开始' if position == 0 else f'任务已排队，当前排在第{position}位'
         })
         
     except Exception as e:
@@ -68,96 +153,396 @@ def process_video():
             'error': str(e)
         }), 500
 
-def process_video_background(task_id, video_url, add_subtitles, audio_mode):
-    try:
-        processor = VideoProcessor()
-        
-        def update_status(progress, message, step=None):
-            processing_status[task_id]['progress'] = progress
-            processing_status[task_id]['message'] = message
-            if step:
-                processing_status[task_id]['steps'].append(step)
-        
-        # 步骤1: 下载视频
-        update_status(10, '正在下载视频...', '开始下载视频')
-        video_path = processor.download_video(video_url, task_id)
-        update_status(20, '视频下载完成', '视频下载完成')
-        
-        # 步骤2: 提取音频
-        update_status(30, '正在提取音频...', '开始提取音频')
-        audio_path = processor.extract_audio(video_path, task_id)
-        update_status(40, '音频提取完成', '音频提取完成')
-        
-        # 步骤3: 语音转文字
-        if add_subtitles:
-            update_status(50, '正在识别语音...', '开始语音识别')
-            whisper_result = processor.speech_to_text_with_timestamps(audio_path)
-            transcript = whisper_result['text']
-            update_status(60, '语音识别完成', '语音识别完成')
-            
-            # 步骤4: 生成中文字幕字幕
-            update_status(65, '正在生成中文字幕字幕...', '开始生成中文字幕字幕')
-            subtitle_path = processor.generate_translated_srt_subtitle(whisper_result, task_id)
-            update_status(70, '中文字幕字幕生成完成', '中文字幕字幕生成完成')
-        else:
-            update_status(50, '正在识别语音...', '开始语音识别')
-            transcript = processor.speech_to_text(audio_path)
-            update_status(60, '语音识别完成', '语音识别完成')
-            subtitle_path = None
-        
-        # 步骤5: 翻译
-        update_status(75, '正在翻译文案...', '开始翻译')
-        translated_text = processor.translate_text(transcript)
-        update_status(80, '翻译完成', '翻译完成')
+# 各步骤的进度（开始, 完成），URL任务多一个下载步骤
+URL_PROGRESS = {
+    'download': (10, 20), 'extract': (30, 40), 'asr': (50, 60), 'subtitle': (65, 70),
+    'translate': (75, 80), 'optimize': (85, 90), 'tts': (95, 98), 'merge': (99, 100)
+}
+UPLOAD_PROGRESS = {
+    'extract': (20, 30), 'asr': (40, 50), 'subtitle': (55, 60),
+    'translate': (65, 70), 'optimize': (80, 85), 'tts': (90, 95), 'merge': (98, 100)
+}
+
+def make_status_updater(task_id):
+    def update_status(progress, message, step=None):
+        task_store.set_progress(task_id, progress, message, step)
+    return update_status
+
+def cached_step(step, hit):
+    """复用缓存产物的步骤在步骤列表中注明"""
+    return f'{step}（复用缓存）' if hit else step
+
+class SourceMedia:
+    """任务的源媒体：audio_path用于提取音频和语音识别，video()返回合成用的视频（含原音轨）及其缓存键。
+    上传任务两者是同一文件；URL任务的视频流在后台下载并与已下载的音频流配对，合成前才等待下载完成"""
+    def __init__(self, audio_path, video=None, source_hash=None):
+        self.audio_path = audio_path
+        self.source_hash = source_hash or file_digest(audio_path)
+        # None表示视频就是audio_path，Future的结果为(视频路径, 缓存键)
+        self._video = video
+
+    @property
+    def video_ready(self):
+        return not isinstance(self._video, Future) or self._video.done()
+
+    def video(self):
+        if self._video is None:
+            return self.audio_path, self.source_hash
+        return self._video.result()
+
+def run_video_pipeline(task_id, processor, media, add_subtitles, audio_mode, subtitle_mode, encoding_profile,
+                       update_status, progress, checkpoint, started_at=None):
+    """视频获取之后的公共处理流程；每个步骤先申请对应资源类型的阶段名额，
+    使不同任务的网络、识别、编码步骤可以相互重叠。
+    各步骤产物按源文件哈希、上游产物的缓存键和本步骤参数缓存，参数未变的步骤直接复用产物，
+    例如只修改audio_mode时只重新合成视频；每个阶段完成后写入检查点，中断的任务从最后完成的阶段继续。
+    识别只依赖media.audio_path，URL任务的视频流可以在识别、翻译和配音期间继续下载"""
+    source_hash = media.source_hash
+    started_at = started_at or time.time()
+    
+    def extract_audio():
+        update_status(progress['extract'][0], '正在提取音频...', '开始提取音频')
+        audio_path, _, hit = checkpoint.file_stage(
+            'extract', {'source': source_hash, 'format': 'pcm_s16le', 'sample_rate': ASR_SAMPLE_RATE, 'channels': 1},
+            f'temp/audio_{task_id}',
+            lambda: stage_pools.run('encode', processor.extract_audio, media.audio_path, task_id)
+        )
+        update_status(progress['extract'][1], '音频提取完成', cached_step('音频提取完成', hit))
+        return audio_path
+    
+    def transcribe():
+        # 识别结果已缓存时不需要提取音频
+        audio_path = extract_audio()
+        update_status(progress['asr'][0], '正在识别语音...', '开始语音识别')
+        with stage_pools.stage('asr'):
+            if add_subtitles:
+                return processor.speech_to_text_with_timestamps(audio_path)
+            result = processor.transcribe(audio_path)
+            return {'text': result['text'], 'vad': result.get('vad')}
+    
+    def subtitle_params(asr_key):
+        return {'asr': asr_key, 'source_language': 'en', 'target_language': 'zh'}
+    
+    def transcribe_streaming():
+        """识别的同时逐批翻译分句、写中文字幕、合成分句配音；返回{'asr': 识别阶段结果, 'subtitle': 字幕阶段结果,
+        'tts': 配音路径}，阶段结果与checkpoint的阶段方法相同，为(产物, 缓存键, 是否复用)"""
+        audio_path = extract_audio()
+        total_duration = processor.probe_duration(media.audio_path)
+        update_status(progress['asr'][0], '正在识别语音（同时翻译并生成字幕和配音）...', '开始语音识别（分句流式处理）')
+        streamed = {}
         
-        # 步骤6: 优化文案
-        update_status(85, '正在优化文案...', '开始文案优化')
-        optimized_text = processor.optimize_text(translated_text)
-        update_status(90, '文案优化完成', '文案优化完成')
+        def produce(on_segment):
+            with stage_pools.stage('asr'):
+                return processor.speech_to_text_with_timestamps(audio_path, on_segment=on_segment)
         
-        # 步骤7: 生成语音
-        update_status(95, '正在生成语音...', '开始语音合成')
-        new_audio_path = processor.generate_segmented_audio(whisper_result, task_id) if add_subtitles else processor.generate_audio(optimized_text, task_id)
-        update_status(98, '语音生成完成', '语音生成完成')
+        def subtitles_ready(subtitle_path):
+            # 识别和字幕完成后立即记录检查点，之后配音失败时恢复任务不必重新识别
+            streamed['asr'] = checkpoint.json_stage('asr', asr_params, lambda: stream.result)
+            streamed['subtitle'] = checkpoint.file_stage(
+                'subtitle', subtitle_params(streamed['asr'][1]), f'temp/subtitle_{task_id}', lambda: subtitle_path
+            )
         
-        # 步骤8: 合并视频
-        update_status(99, '正在合并视频...', '开始视频合并')
-        if audio_mode == 'original':
-            # 只用原音轨
-            output_path = processor.merge_video_audio_original(video_path, task_id, subtitle_path)
+        stream = SegmentStream(produce, name=f'asr_{task_id}')
+        try:
+            # 网络阶段名额只在每批翻译和配音请求期间占用，等待识别时不占用
+            _, streamed['tts'] = processor.generate_streaming_outputs(
+                stream, task_id, total_duration=total_duration,
+                network_slot=lambda: stage_pools.stage('network'), on_subtitles=subtitles_ready
+            )
+        except Exception:
+            # 字幕完成前出错时识别可能已经结束，识别结果同样记录检查点
+            if 'asr' not in streamed and stream.result is not None:
+                checkpoint.json_stage('asr', asr_params, lambda: stream.result)
+            raise
+        if stream.first_segment_at:
+            # 从开始处理到第一句识别结果交给下游的耗时
+            task_store.update(task_id, time_to_first_segment=round(stream.first_segment_at - started_at, 2))
+        return streamed
+    
+    # 步骤: 提取音频、语音转文字
+    asr_params = {
+        'source': source_hash,
+        'model': model_registry.default_size,
+        'backend': get_backend().params(),
+        'language': 'auto',
+        'word_timestamps': bool(add_subtitles),
+        'vad': vad_params(),
+        'parallel': parallel_asr_params(),
+    }
+    # 带字幕的任务需要重新识别时，翻译、字幕和配音随识别流式进行，结果与逐阶段处理相同
+    streamed = None
+    if add_subtitles and ASR_STREAMING and not checkpoint.will_reuse('asr', asr_params):
+        streamed = transcribe_streaming()
+        whisper_result, asr_key, hit = streamed['asr']
+    else:
+        whisper_result, asr_key, hit = checkpoint.json_stage('asr', asr_params, transcribe)
+    transcript = whisper_result['text']
+    asr_step = '语音识别完成'
+    vad_stats = whisper_result.get('vad')
+    if vad_stats:
+        # 只记录统计，有声区间列表较长，留在识别结果中
+        task_store.update(task_id, vad={k: v for k, v in vad_stats.items() if k != 'regions'})
+        if vad_stats['skipped_seconds']:
+            asr_step = f"语音识别完成（跳过静音{vad_stats['skipped_seconds']:.0f}s）"
+    update_status(progress['asr'][1], '语音识别完成', cached_step(asr_step, hit))
+    # 从开始处理到拿到识别结果的耗时
+    time_to_first_transcript = round(time.time() - started_at, 2)
+    task_store.update(task_id, time_to_first_transcript=time_to_first_transcript)
+    print(f"[任务] {task_id} 识别结果就绪，耗时{time_to_first_transcript}s")
+    
+    # 步骤: 生成中文字幕
+    subtitle_path = None
+    subtitle_key = None
+    if add_subtitles:
+        update_status(progress['subtitle'][0], '正在生成中文字幕字幕...', '开始生成中文字幕字幕')
+        if streamed:
+            subtitle_path, subtitle_key, hit = streamed['subtitle']
         else:
-            # 用新音轨
-            if add_subtitles and subtitle_path:
-                output_path = processor.merge_video_audio_subtitle(video_path, new_audio_path, subtitle_path, task_id)
+            subtitle_path, subtitle_key, hit = checkpoint.file_stage(
+                'subtitle', subtitle_params(asr_key), f'temp/subtitle_{task_id}',
+                lambda: stage_pools.run('network', processor.generate_translated_srt_subtitle, whisper_result, task_id)
+            )
+        update_status(progress['subtitle'][1], '中文字幕字幕生成完成', cached_step('中文字幕字幕生成完成', hit))
+    
+    # 步骤: 翻译
+    update_status(progress['translate'][0], '正在翻译文案...', '开始翻译')
+    translated_text, translate_key, hit = checkpoint.json_stage(
+        'translate', {'asr': asr_key, 'source_language': 'en', 'target_language': 'zh'},
+        lambda: stage_pools.run('network', processor.translate_text, transcript)
+    )
+    update_status(progress['translate'][1], '翻译完成', cached_step('翻译完成', hit))
+    
+    # 步骤: 优化文案
+    update_status(progress['optimize'][0], '正在优化文案...', '开始文案优化')
+    optimized_text, optimize_key, hit = checkpoint.json_stage(
+        'optimize', {'translate': translate_key, 'model': 'qwen_turbo'},
+        lambda: stage_pools.run('network', processor.optimize_text, translated_text)
+    )
+    update_status(progress['optimize'][1], '文案优化完成', cached_step('文案优化完成', hit))
+    
+    # 步骤: 生成语音
+    update_status(progress['tts'][0], '正在生成语音...', '开始语音合成')
+    if add_subtitles:
+        tts_params = {'asr': asr_key, 'voice': TTS_VOICE, 'segmented': True,
+                      'sample_rate': TTS_SAMPLE_RATE, 'stretch_engine': TIME_STRETCH_ENGINE}
+        synthesize = lambda: stage_pools.run(
+            'network', processor.generate_segmented_audio, whisper_result, task_id,
+            total_duration=processor.probe_duration(media.audio_path)
+        )
+    else:
+        tts_params = {'optimize': optimize_key, 'voice': TTS_VOICE, 'segmented': False}
+        synthesize = lambda: stage_pools.run('network', processor.generate_audio, optimized_text, task_id)
+    if streamed:
+        synthesize = lambda: streamed['tts']
+    new_audio_path, tts_key, hit = checkpoint.file_stage('tts', tts_params, f'temp/new_audio_{task_id}', synthesize)
+    update_status(progress['tts'][1], '语音生成完成', cached_step('语音生成完成', hit))
+    
+    # 步骤: 合并视频；sidecar方式的字幕不进入视频，与不加字幕的合成结果相同
+    merged_subtitle = subtitle_path if subtitle_mode != 'sidecar' else None
+    
+    def merge():
+        with stage_pools.stage('encode'):
+            if audio_mode == 'original':
+                # 只用原音轨
+                return processor.merge_video_audio_original(video_path, task_id, merged_subtitle, subtitle_mode,
+                                                            encoding_profile)
+            elif merged_subtitle:
+                # 用新音轨
+                return processor.merge_video_audio_subtitle(video_path, new_audio_path, merged_subtitle, task_id,
+                                                            subtitle_mode, encoding_profile)
             else:
-                output_path = processor.merge_video_audio(video_path, new_audio_path, task_id)
-        update_status(100, '处理完成！', '视频处理完成')
+                return processor.merge_video_audio(video_path, new_audio_path, task_id, encoding_profile)
+    
+    if not media.video_ready:
+        update_status(progress['tts'][1], '等待视频下载完成...', '等待视频下载完成')
+    video_path, video_key = media.video()
+    update_status(progress['merge'][0], '正在合并视频...', '开始视频合并')
+    output_path, _, hit = checkpoint.file_stage('merge', {
+        'source': video_key,
+        'audio_mode': audio_mode,
+        'subtitle': subtitle_key if merged_subtitle else None,
+        'subtitle_mode': subtitle_mode if merged_subtitle else None,
+        'audio': None if audio_mode == 'original' else tts_key,
+        'encoding_profile': get_profile(encoding_profile),
+    }, f'outputs/output_{task_id}', merge)
+    # 记录视频流是直接复制还是重新编码
+    merge_info = {'video': 'cached'} if hit else processor.last_merge_info
+    if not hit and merge_info and merge_info.get('video') == 'copy':
+        update_status(progress['merge'][1], '处理完成！', '视频处理完成（视频流复制，未重新编码）')
+    else:
+        update_status(progress['merge'][1], '处理完成！', cached_step('视频处理完成', hit))
+    subtitle_file = None
+    if subtitle_path and subtitle_mode == 'sidecar':
+        subtitle_file = processor.export_sidecar_subtitle(subtitle_path, output_path)
+    
+    # 更新最终状态
+    checkpoint.finish()
+    task_store.update(
+        task_id,
+        status='completed',
+        output_file=output_path,
+        transcript=transcript,
+        translated=translated_text,
+        optimized=optimized_text,
+        merge_info=merge_info,
+        subtitle_file=subtitle_file
+    )
+
+def download_source(task_id, processor, video_url, update_status, checkpoint):
+    """下载URL任务的源媒体：先只下载音频流，下载完即可开始识别；视频流提交到后台下载，
+    与该音频流配对封装（缓存键包含音频流的缓存键），合成时使用"""
+    if not URL_SPLIT_DOWNLOAD:
+        update_status(URL_PROGRESS['download'][0], '正在下载视频...', '开始下载视频')
+        video_path, _, hit = checkpoint.file_stage(
+            'download', {'url': video_url}, f'temp/raw_{task_id}',
+            lambda: stage_pools.run('network', processor.download_video, video_url, task_id)
+        )
+        update_status(URL_PROGRESS['download'][1], '视频下载完成', cached_step('视频下载完成', hit))
+        return SourceMedia(video_path)
+    
+    update_status(URL_PROGRESS['download'][0], '正在下载音频...', '开始下载音频')
+    audio_path, audio_key, hit = checkpoint.file_stage(
+        'download', {'url': video_url, 'stream': 'audio'}, f'temp/rawaudio_{task_id}',
+        lambda: stage_pools.run('network', processor.download_audio, video_url, task_id)
+    )
+    update_status(URL_PROGRESS['download'][1], '音频下载完成，视频在后台下载', cached_step('音频下载完成', hit))
+    
+    def download_video():
+        video_path, video_key, _ = checkpoint.file_stage(
+            'download_video', {'url': video_url, 'stream': 'video', 'audio': audio_key}, f'temp/raw_{task_id}',
+            lambda: stage_pools.run('network', processor.download_video_stream, video_url, task_id, audio_path)
+        )
+        print(f"[任务] {task_id} 视频下载完成: {video_path}（音频流: {audio_path}）")
+        return video_path, video_key
+    
+    return SourceMedia(audio_path, background_downloads.submit(download_video))
+
+def process_video_background(task_id, video_url, add_subtitles, audio_mode, subtitle_mode='burn', encoding_profile=None):
+    try:
+        started_at = time.time()
+        task_store.update(task_id, status='processing', worker=WORKER_ID, error=None)
+        processor = VideoProcessor()
+        update_status = make_status_updater(task_id)
+        checkpoint = JobCheckpoint(task_id)
         
-        # 更新最终状态
-        processing_status[task_id]['status'] = 'completed'
-        processing_status[task_id]['output_file'] = output_path
-        processing_status[task_id]['transcript'] = transcript
-        processing_status[task_id]['translated'] = translated_text
-        processing_status[task_id]['optimized'] = optimized_text
+        # 步骤1: 下载
+        media = download_source(task_id, processor, video_url, update_status, checkpoint)
+        
+        run_video_pipeline(task_id, processor, media, add_subtitles, audio_mode, subtitle_mode, encoding_profile,
+                           update_status, URL_PROGRESS, checkpoint, started_at)
         
     except Exception as e:
-        processing_status[task_id]['status'] = 'error'
-        processing_status[task_id]['error'] = str(e)
-        processing_status[task_id]['message'] = f'处理失败: {str(e)}'
+        task_store.update(task_id, status='error', error=str(e), message=f'处理失败: {str(e)}')
+
+def apply_queue_position(task_id, status):
+    """排队中的任务补充排队位置和提示消息（排队位置只在本进程调度器中可见）"""
+    if status['status'] == 'queued':
+        position = job_scheduler.position(task_id)
+        if position is not None:
+            status['queue_position'] = position
+            status['message'] = f'排队中，前面还有{position - 1}个任务' if position > 1 else '排队中，即将开始处理'
+    return status
 
 @app.route('/api/status/<task_id>')
 def get_status(task_id):
-    if task_id not in processing_status:
+    # 传入since时只返回第since条之后的新步骤，处理结果仍只在完成后返回
+    since = request.args.get('since', type=int)
+    if since is None:
+        status = task_store.get(task_id)
+    else:
+        status = task_store.get_progress(task_id, max(0, since))
+        if status is not None and status['status'] in FINISHED_STATUSES:
+            full = task_store.get(task_id)
+            full['steps'] = status['steps']
+            full['step_count'] = status['step_count']
+            status = full
+    if status is None:
         return jsonify({'error': '任务不存在'}), 404
-    
-    return jsonify(processing_status[task_id])
+    return jsonify(apply_queue_position(task_id, status))
+
+def sse_event(event, data, event_id=None):
+    """event_id为已发送的步骤数，浏览器断线重连时通过Last-Event-ID带回"""
+    head = f"id: {event_id}\n" if event_id is not None else ''
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/events/<task_id>')
+def task_events(task_id):
+    """SSE推送任务进度：状态变化时只发送变化的字段和新增步骤，
+    任务结束时发送一次包含完整结果的done事件后关闭连接；
+    每个事件的id为已发送的步骤数，自动重连时从Last-Event-ID之后的步骤继续发送，页面上不会重复"""
+    if task_store.get_progress(task_id) is None:
+        return jsonify({'error': '任务不存在'}), 404
+    try:
+        resume_steps = max(0, int(request.headers.get('Last-Event-ID', 0)))
+    except ValueError:
+        resume_steps = 0
+
+    def stream():
+        # 断线后浏览器3秒后自动重连
+        yield 'retry: 3000\n\n'
+        sent_steps = resume_steps
+        last = {}
+        last_sent = time.time()
+        while True:
+            generation = task_store.generation()
+            snapshot = task_store.get_progress(task_id, sent_steps)
+            if snapshot is None:
+                yield sse_event('done', {'status': 'error', 'error': '任务不存在'})
+                return
+            apply_queue_position(task_id, snapshot)
+            if snapshot['status'] in FINISHED_STATUSES:
+                final = task_store.get(task_id)
+                step_count = len(final['steps'])
+                final['steps'] = final['steps'][sent_steps:]
+                yield sse_event('done', final, step_count)
+                return
+            delta = {key: value for key, value in snapshot.items()
+                     if key not in ('steps', 'step_count') and last.get(key) != value}
+            if snapshot['steps']:
+                delta['steps'] = snapshot['steps']
+                sent_steps = snapshot['step_count']
+            if delta:
+                last.update(delta)
+                last_sent = time.time()
+                yield sse_event('progress', delta, sent_steps)
+            elif time.time() - last_sent >= EVENTS_HEARTBEAT_SECONDS:
+                last_sent = time.time()
+                yield ': keepalive\n\n'
+            task_store.wait_for_change(generation, EVENTS_HEARTBEAT_SECONDS)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+@app.route('/api/scheduler')
+def get_scheduler():
+    """查看任务调度器的运行与排队情况，以及各处理阶段的排队深度"""
+    stats = job_scheduler.stats()
+    stats['stages'] = stage_pools.stats()
+    return jsonify(stats)
+
+@app.route('/api/models')
+def get_models():
+    """查看已加载模型的加载耗时与内存占用"""
+    return jsonify(model_registry.stats())
+
+@app.route('/api/translation-cache')
+def get_translation_cache():
+    """查看翻译缓存命中情况"""
+    return jsonify(translation_cache.stats())
+
+@app.route('/api/artifact-cache')
+def get_artifact_cache():
+    """查看各阶段产物缓存的命中情况与占用空间"""
+    return jsonify(artifact_cache.stats())
 
 @app.route('/api/download/<task_id>')
 def download_result(task_id):
-    if task_id not in processing_status:
+    status = task_store.get(task_id)
+    if status is None:
         return jsonify({'error': '任务不存在'}), 404
     
-    status = processing_status[task_id]
     if status['status'] != 'completed':
         return jsonify({'error': '任务尚未完成'}), 400
     
@@ -167,6 +552,51 @@ def download_result(task_id):
     
     return send_file(output_file, as_attachment=True, download_name='processed_video.mp4')
 
+@app.route('/api/download/<task_id>/subtitle')
+def download_subtitle(task_id):
+    """下载sidecar方式输出的SRT字幕文件"""
+    status = task_store.get(task_id)
+    if status is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    if status['status'] != 'completed':
+        return jsonify({'error': '任务尚未完成'}), 400
+    
+    subtitle_file = status.get('subtitle_file')
+    if not subtitle_file or not os.path.exists(subtitle_file):
+        return jsonify({'error': '字幕文件不存在'}), 404
+    
+    return send_file(subtitle_file, as_attachment=True, download_name='processed_video.srt')
+
+def submit_upload_task(task_id, filepath, add_subtitles, audio_mode, subtitle_mode, encoding_profile, source_hash=None):
+    """为已保存的上传文件创建任务并提交到调度器；source_hash为上传时增量计算的文件哈希"""
+    task_store.create(task_id, {
+        'status': 'queued',
+        'progress': 0,
+        'message': '排队等待处理...',
+        'steps': [],
+        'worker': WORKER_ID
+    })
+    JobCheckpoint(task_id).save_job(kind='upload', video_path=filepath, add_subtitles=add_subtitles,
+                                    audio_mode=audio_mode, subtitle_mode=subtitle_mode,
+                                    encoding_profile=encoding_profile, source_hash=source_hash)
+    
+    try:
+        position = job_scheduler.submit(task_id, process_uploaded_video, task_id, filepath, add_subtitles, audio_mode,
+                                        subtitle_mode, encoding_profile)
+    except QueueFullError as e:
+        task_store.delete(task_id)
+        JobCheckpoint(task_id).delete()
+        os.remove(filepath)
+        return queue_full_response(e)
+    
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'queue_position': position,
+        'message': '视频上传成功，开始处理' if position == 0 else f'视频上传成功，当前排在第{position}位'
+    })
+
 @app.route('/api/upload-video', methods=['POST'])
 def upload_video():
     try:
@@ -177,105 +607,209 @@ def upload_video():
         if file.filename == '':
             return jsonify({'error': '没有选择文件'}), 400
         
+        subtitle_mode = request.form.get('subtitle_mode', SUBTITLE_MODE)
+        encoding_profile = request.form.get('encoding_profile', ENCODING_PROFILE)
+        error = (option_error('字幕方式', subtitle_mode, SUBTITLE_MODES)
+                 or option_error('编码档位', encoding_profile, ENCODING_PROFILES))
+        if error:
+            return error
+        
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
+            # 队列已满时不再接收文件，避免白白占用磁盘
+            if not job_scheduler.has_capacity():
+                return queue_full_response(QueueFullError(job_scheduler.retry_after()))
+            
+            task_id = new_task_id('upload')
+            # 文件名加上任务ID前缀，避免不同用户的同名文件互相覆盖
+            filename = f"{task_id}_{secure_filename(file.filename)}"
             filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
             file.save(filepath)
             
             add_subtitles = request.form.get('add_subtitles', 'true').lower() == 'true'
             audio_mode = request.form.get('audio_mode', 'synth')
             
-            task_id = f"upload_{int(time.time())}"
-            
-            thread = threading.Thread(target=process_uploaded_video, args=(task_id, filepath, add_subtitles, audio_mode))
-            thread.daemon = True
-            thread.start()
-            
-            return jsonify({
-                'success': True,
-                'task_id': task_id,
-                'message': '视频上传成功，开始处理'
-            })
+            return submit_upload_task(task_id, filepath, add_subtitles, audio_mode, subtitle_mode, encoding_profile)
         
         return jsonify({'error': '不支持的文件格式'}), 400
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def process_uploaded_video(task_id, video_path, add_subtitles, audio_mode):
+def upload_error_response(error):
+    body = {'success': False, 'error': str(error)}
+    if error.offset is not None:
+        body['offset'] = error.offset
+    return jsonify(body), error.status_code
+
+@app.route('/api/uploads', methods=['POST'])
+def init_upload():
+    """分块上传第一步：声明文件名、大小和处理选项，返回upload_id和分块大小"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    if not allowed_file(filename):
+        return jsonify({'success': False, 'error': '不支持的文件格式'}), 400
+    subtitle_mode = data.get('subtitle_mode', SUBTITLE_MODE)
+    encoding_profile = data.get('encoding_profile', ENCODING_PROFILE)
+    error = (option_error('字幕方式', subtitle_mode, SUBTITLE_MODES)
+             or option_error('编码档位', encoding_profile, ENCODING_PROFILES))
+    if error:
+        return error
+    if not job_scheduler.has_capacity():
+        return queue_full_response(QueueFullError(job_scheduler.retry_after()))
+    try:
+        session = upload_manager.create(filename, data.get('size'), {
+            'add_subtitles': bool(data.get('add_subtitles', True)),
+            'audio_mode': data.get('audio_mode', 'synth'),
+            'subtitle_mode': subtitle_mode,
+            'encoding_profile': encoding_profile
+        })
+    except (UploadError, TypeError) as e:
+        return upload_error_response(e if isinstance(e, UploadError) else UploadError('文件大小无效'))
+    session['success'] = True
+    return jsonify(session)
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """查询已收到的字节数，断点续传时从该偏移继续"""
     try:
+        return jsonify(upload_manager.get(upload_id))
+    except UploadError as e:
+        return upload_error_response(e)
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """分块上传第二步：请求体为原始字节，offset参数为该块在文件中的起始位置"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'success': False, 'error': '缺少offset参数'}), 400
+    try:
+        new_offset = upload_manager.write_chunk(upload_id, offset, request.stream, request.content_length)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'success': True, 'offset': new_offset})
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    try:
+        upload_manager.abort(upload_id)
+    except UploadError as e:
+        return upload_error_response(e)
+    return jsonify({'success': True})
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """分块上传第三步：校验大小后把文件移入上传目录并创建处理任务"""
+    if not job_scheduler.has_capacity():
+        return queue_full_response(QueueFullError(job_scheduler.retry_after()))
+    task_id = new_task_id('upload')
+    try:
+        session = upload_manager.get(upload_id)
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{task_id}_{secure_filename(session['filename'])}")
+        session, digest = upload_manager.complete(upload_id, filepath)
+    except UploadError as e:
+        return upload_error_response(e)
+    options = session['options']
+    return submit_upload_task(task_id, filepath, options['add_subtitles'], options['audio_mode'],
+                              options.get('subtitle_mode', SUBTITLE_MODE), options.get('encoding_profile'),
+                              source_hash=digest)
+
+def process_uploaded_video(task_id, video_path, add_subtitles, audio_mode, subtitle_mode='burn', encoding_profile=None):
+    try:
+        started_at = time.time()
         processor = VideoProcessor()
+        update_status = make_status_updater(task_id)
         
-        def update_status(progress, message, step=None):
-            processing_status[task_id]['progress'] = progress
-            processing_status[task_id]['message'] = message
-            if step:
-                processing_status[task_id]['steps'].append(step)
-        
-        processing_status[task_id] = {
-            'status': 'processing',
-            'progress': 0,
-            'message': '开始处理上传的视频...',
-            'steps': []
-        }
-        
-        # 步骤1: 提取音频
-        update_status(20, '正在提取音频...', '开始提取音频')
-        audio_path = processor.extract_audio(video_path, task_id)
-        update_status(30, '音频提取完成', '音频提取完成')
-        
-        # 步骤2: 语音转文字
-        if add_subtitles:
-            update_status(40, '正在识别语音...', '开始语音识别')
-            whisper_result = processor.speech_to_text_with_timestamps(audio_path)
-            transcript = whisper_result['text']
-            update_status(50, '语音识别完成', '语音识别完成')
-            
-            update_status(55, '正在生成中文字幕字幕...', '开始生成中文字幕字幕')
-            subtitle_path = processor.generate_translated_srt_subtitle(whisper_result, task_id)
-            update_status(60, '中文字幕字幕生成完成', '中文字幕字幕生成完成')
-        else:
-            update_status(40, '正在识别语音...', '开始语音识别')
-            transcript = processor.speech_to_text(audio_path)
-            update_status(50, '语音识别完成', '语音识别完成')
-            subtitle_path = None
+        task_store.update(task_id, status='processing', message='开始处理上传的视频...', worker=WORKER_ID, error=None)
         
-        # 步骤4: 翻译
-        update_status(65, '正在翻译文案...', '开始翻译')
-        translated_text = processor.translate_text(transcript)
-        update_status(70, '翻译完成', '翻译完成')
-        
-        # 步骤5: 优化文案
-        update_status(80, '正在优化文案...', '开始文案优化')
-        optimized_text = processor.optimize_text(translated_text)
-        update_status(85, '文案优化完成', '文案优化完成')
-        
-        # 步骤6: 生成语音
-        update_status(90, '正在生成语音...', '开始语音合成')
-        new_audio_path = processor.generate_segmented_audio(whisper_result, task_id) if add_subtitles else processor.generate_audio(optimized_text, task_id)
-        update_status(95, '语音生成完成', '语音生成完成')
-        
-        # 步骤7: 合并视频
-        update_status(98, '正在合并视频...', '开始视频合并')
-        if audio_mode == 'original':
-            output_path = processor.merge_video_audio_original(video_path, task_id, subtitle_path)
-        else:
-            if add_subtitles and subtitle_path:
-                output_path = processor.merge_video_audio_subtitle(video_path, new_audio_path, subtitle_path, task_id)
-            else:
-                output_path = processor.merge_video_audio(video_path, new_audio_path, task_id)
-        update_status(100, '处理完成！', '视频处理完成')
-        
-        processing_status[task_id]['status'] = 'completed'
-        processing_status[task_id]['output_file'] = output_path
-        processing_status[task_id]['transcript'] = transcript
-        processing_status[task_id]['translated'] = translated_text
-        processing_status[task_id]['optimized'] = optimized_text
+        checkpoint = JobCheckpoint(task_id)
+        media = SourceMedia(video_path, source_hash=checkpoint.job.get('source_hash'))
+        run_video_pipeline(task_id, processor, media, add_subtitles, audio_mode, subtitle_mode, encoding_profile,
+                           update_status, UPLOAD_PROGRESS, checkpoint, started_at)
         
     except Exception as e:
-        processing_status[task_id]['status'] = 'error'
-        processing_status[task_id]['error'] = str(e)
-        processing_status[task_id]['message'] = f'处理失败: {str(e)}'
+        task_store.update(task_id, status='error', error=str(e), message=f'处理失败: {str(e)}')
+
+# 可恢复的任务状态：已结束的任务，或处理进程已退出的排队中/处理中任务
+RESUMABLE_STATUSES = FINISHED_STATUSES + ('queued', 'processing')
+
+def resume_job(task_id):
+    """按检查点中的任务参数重新执行，已完成的阶段直接复用产物"""
+    job = JobCheckpoint(task_id).job
+    if job.get('kind') == 'url':
+        process_video_background(task_id, job['video_url'], job['add_subtitles'], job['audio_mode'],
+                                 job.get('subtitle_mode', 'burn'), job.get('encoding_profile'))
+    else:
+        process_uploaded_video(task_id, job['video_path'], job['add_subtitles'], job['audio_mode'],
+                               job.get('subtitle_mode', 'burn'), job.get('encoding_profile'))
+
+def can_resume(task):
+    if task['status'] in FINISHED_STATUSES:
+        return True
+    return task['status'] in RESUMABLE_STATUSES and not worker_alive(task.get('worker'))
+
+def submit_resume(task_id, message, from_stage=None):
+    """认领任务并提交到调度器，其他进程已认领或任务仍在处理时返回False"""
+    if not task_store.update_if(task_id, can_resume, status='queued', worker=WORKER_ID, error=None, message=message):
+        return False
+    if from_stage:
+        JobCheckpoint(task_id).reset_from(from_stage)
+    job_scheduler.submit(task_id, resume_job, task_id)
+    return True
+
+def resume_interrupted_jobs(debug=False):
+    """服务启动时恢复上次进程中断的任务，从最后一个完成的阶段继续"""
+    # debug模式下reloader父进程不处理请求，只在实际服务的子进程中恢复
+    if debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    for task_id in task_store.list_tasks(('queued', 'processing')):
+        checkpoint = JobCheckpoint(task_id)
+        if not checkpoint.exists or not checkpoint.job:
+            task_store.update_if(task_id, can_resume, status='error', error='任务中断且没有检查点，无法恢复',
+                                 message='处理失败: 任务中断且没有检查点，无法恢复')
+            continue
+        try:
+            if submit_resume(task_id, '服务重启，任务等待恢复...'):
+                print(f"[检查点] 恢复任务 {task_id}，已完成阶段: {checkpoint.completed_stages()}")
+        except QueueFullError as e:
+            task_store.update(task_id, status='error', error=str(e), message='任务队列已满，请稍后通过恢复接口重试')
+    # 清理任务记录已过期的检查点
+    for task_id in list_checkpoints():
+        if not task_store.exists(task_id):
+            JobCheckpoint(task_id).delete()
+
+@app.route('/api/tasks/<task_id>/resume', methods=['POST'])
+def resume_task(task_id):
+    """从指定阶段（或最后完成的阶段之后）重新处理任务，from_stage可选: download/extract/asr/subtitle/translate/optimize/tts/merge"""
+    task = task_store.get(task_id)
+    if task is None:
+        return jsonify({'error': '任务不存在'}), 404
+    checkpoint = JobCheckpoint(task_id)
+    if not checkpoint.job:
+        return jsonify({'error': '任务没有检查点，无法恢复'}), 400
+    from_stage = (request.get_json(silent=True) or {}).get('from_stage')
+    if from_stage is not None and from_stage not in STAGES:
+        return jsonify({'error': f'未知阶段: {from_stage}，可选: {", ".join(STAGES)}'}), 400
+    if not can_resume(task):
+        return jsonify({'error': '任务仍在处理中'}), 409
+    if not job_scheduler.has_capacity():
+        return queue_full_response(QueueFullError(job_scheduler.retry_after()))
+    
+    message = f'从{from_stage}阶段重新处理，排队中...' if from_stage else '任务恢复，排队中...'
+    try:
+        if not submit_resume(task_id, message, from_stage):
+            return jsonify({'error': '任务仍在处理中'}), 409
+    except QueueFullError as e:
+        task_store.update(task_id, status='error', error=str(e), message='任务队列已满，请稍后重试')
+        return queue_full_response(e)
+    
+    return jsonify({
+        'success': True,
+        'task_id': task_id,
+        'from_stage': from_stage,
+        'completed_stages': JobCheckpoint(task_id).completed_stages()
+    })
 
 if __name__ == '__main__':
+    start_model_warmup(debug=True)
+    resume_interrupted_jobs(debug=True)
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""
+处理产物缓存
+按内容寻址缓存流水线各阶段的产物（下载的视频、提取的音频、识别结果、字幕、译文、配音、合成视频），
+缓存键为阶段名加输入内容哈希和阶段参数（源文件哈希、模型尺寸、语言、音色、编码参数等）的哈希，
+参数不变的阶段直接复用产物；产物文件存放在缓存目录，索引存放在SQLite（WAL模式），按总大小LRU淘汰
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+# 产物格式或处理逻辑不兼容变化时递增，使旧缓存全部失效
+ARTIFACT_CACHE_VERSION = 1
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+def file_digest(path, block_size=1024 * 1024):
+    """计算文件内容的sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def json_default(value):
+    # Whisper结果中可能含有numpy数值
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+class ArtifactCache:
+    def __init__(self, root=None, max_bytes=None, enabled=None):
+        self.root = root or os.environ.get('ARTIFACT_CACHE_DIR', 'cache/artifacts')
+        self.max_bytes = int(max_bytes or float(os.environ.get('ARTIFACT_CACHE_MAX_GB', 20)) * 1024 ** 3)
+        self.enabled = _env_flag('ARTIFACT_CACHE_ENABLED', 'true') if enabled is None else enabled
+        self.index_path = os.path.join(self.root, 'index.db')
+        self.hits = {}
+        self.misses = {}
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        """每个线程使用独立连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        os.makedirs(self.root, exist_ok=True)
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        if not self._schema_ready:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    key TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_artifacts_accessed ON artifacts (accessed_at)')
+            self._schema_ready = True
+        self._local.conn = conn
+        return conn
+
+    def make_key(self, stage, params):
+        """阶段名与参数（其中包含上游阶段的缓存键）共同决定缓存键"""
+        raw = json.dumps({'version': ARTIFACT_CACHE_VERSION, 'stage': stage, 'params': params},
+                         sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _count(self, stage, hit):
+        with self._stats_lock:
+            counter = self.hits if hit else self.misses
+            counter[stage] = counter.get(stage, 0) + 1
+
+    def _lookup(self, key):
+        """查找产物文件路径并刷新访问时间，文件已被删除时移除索引"""
+        if not self.enabled:
+            return None
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT path FROM artifacts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            path = os.path.join(self.root, row[0])
+            if not os.path.exists(path):
+                conn.execute('DELETE FROM artifacts WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE artifacts SET accessed_at = ?, hits = hits + 1 WHERE key = ?', (time.time(), key))
+            return path
+        except sqlite3.Error as e:
+            print(f"[产物缓存] 查询失败: {e}")
+            return None
+
+    def contains(self, key):
+        return self._lookup(key) is not None
+
+    def get_file(self, key, stage, dest_prefix):
+        """命中时把产物复制到dest_prefix加原扩展名的路径并返回该路径，未命中返回None；
+        复制而不是硬链接，避免任务目录中的文件被覆盖写入时损坏缓存"""
+        path = self._lookup(key)
+        if path is None:
+            self._count(stage, False)
+            return None
+        dest = dest_prefix + os.path.splitext(path)[1]
+        directory = os.path.dirname(dest)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        shutil.copyfile(path, dest)
+        self._count(stage, True)
+        return dest
+
+    def put_file(self, key, stage, src_path):
+        """把产物文件复制到缓存目录并登记"""
+        if not self.enabled:
+            return
+        ext = os.path.splitext(src_path)[1]
+        relative = os.path.join(key[:2], key + ext)
+        path = os.path.join(self.root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再改名，并发写入同一产物时不会读到半个文件
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(src_path, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[产物缓存] 写入文件失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        now = time.time()
+        try:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO artifacts (key, stage, path, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, stage, relative, os.path.getsize(path), now, now)
+            )
+        except sqlite3.Error as e:
+            print(f"[产物缓存] 登记失败: {e}")
+            return
+        self.evict(keep=key)
+
+    def get_json(self, key, stage):
+        path = self._lookup(key)
+        if path is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+                self._count(stage, True)
+                return value
+            except (OSError, ValueError) as e:
+                print(f"[产物缓存] 读取失败: {e}")
+        self._count(stage, False)
+        return None
+
+    def put_json(self, key, stage, value):
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f"{key}.{os.getpid()}.{threading.get_ident()}.json")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False, default=json_default)
+            self.put_file(key, stage, tmp_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def file_stage(self, stage, params, dest_prefix, produce, refresh=False):
+        """文件产物阶段：命中则复制缓存产物，否则调用produce()生成并写入缓存，返回(路径, 缓存键, 是否命中)；
+        refresh为True时不读取缓存，重新生成并覆盖"""
+        key = self.make_key(stage, params)
+        path = None if refresh else self.get_file(key, stage, dest_prefix)
+        if path is not None:
+            print(f"[产物缓存] {stage} 命中: {path}")
+            return path, key, True
+        path = produce()
+        self.put_file(key, stage, path)
+        return path, key, False
+
+    def json_stage(self, stage, params, produce, refresh=False):
+        """JSON产物阶段（识别结果、文本等），返回(值, 缓存键, 是否命中)"""
+        key = self.make_key(stage, params)
+        value = None if refresh else self.get_json(key, stage)
+        if value is not None:
+            print(f"[产物缓存] {stage} 命中")
+            return value, key, True
+        value = produce()
+        self.put_json(key, stage, value)
+        return value, key, False
+
+    def evict(self, keep=None):
+        """总大小超出上限时按最近访问时间淘汰，keep为刚写入的产物不参与淘汰"""
+        try:
+            conn = self._connect()
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM artifacts').fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            removed = 0
+            rows = conn.execute(
+                'SELECT key, path, size FROM artifacts WHERE key != ? ORDER BY accessed_at ASC', (keep or '',)
+            ).fetchall()
+            for key, relative, size in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM artifacts WHERE key = ?', (key,))
+                try:
+                    os.remove(os.path.join(self.root, relative))
+                except OSError:
+                    pass
+                total -= size
+                removed += 1
+            if removed:
+                print(f"[产物缓存] 淘汰产物: {removed}")
+            return removed
+        except sqlite3.Error as e:
+            print(f"[产物缓存] 淘汰失败: {e}")
+            return 0
+
+    def stats(self):
+        entries = total = None
+        if self.enabled:
+            try:
+                entries, total = self._connect().execute(
+                    'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM artifacts'
+                ).fetchone()
+            except sqlite3.Error:
+                pass
+        with self._stats_lock:
+            hits = dict(self.hits)
+            misses = dict(self.misses)
+        return {
+            'enabled': self.enabled,
+            'root': self.root,
+            'entries': entries,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+        }
+
+
+# 进程级共享实例
+artifact_cache = ArtifactCache()
@@ -0,0 +1,160 @@
+"""
+语音识别后端
+两个识别方法（及分段并行识别的工作进程）都通过这里的后端调用模型，识别结果统一为openai-whisper的结构：
+{'text', 'segments', 'language'}，分句含start/end/text，开启逐词时间戳时含words
+
+- whisper：openai-whisper（PyTorch），CPU上以fp32推理，整段识别完才返回分句
+- faster-whisper：基于CTranslate2的实现，CPU上默认int8量化推理，同尺寸模型明显更快、内存更少，逐句解码
+- auto：安装了faster-whisper时使用它，否则使用openai-whisper
+"""
+
+import os
+from abc import ABC, abstractmethod
+
+# 识别后端：auto/whisper/faster-whisper
+ASR_BACKEND = os.environ.get('ASR_BACKEND', 'auto')
+# faster-whisper的推理设备与量化类型（int8/int8_float16/float16/float32）
+ASR_DEVICE = os.environ.get('ASR_DEVICE', 'cpu')
+ASR_COMPUTE_TYPE = os.environ.get('ASR_COMPUTE_TYPE', 'int8')
+
+
+class ASRBackend(ABC):
+    name = 'base'
+
+    @abstractmethod
+    def available(self):
+        """是否已安装该后端依赖的包"""
+
+    @abstractmethod
+    def load(self, size):
+        """加载指定尺寸的模型"""
+
+    def set_threads(self, threads):
+        """限制本进程的推理线程数（分段并行识别时每个工作进程调用）"""
+
+    @abstractmethod
+    def transcribe(self, model, audio, on_segment=None, **options):
+        """audio为16kHz单声道float32数组或音频路径，options支持word_timestamps、language；
+        on_segment按顺序接收解码出的分句，能逐句解码的后端每解码出一句就回调"""
+
+    @abstractmethod
+    def detect_language(self, model, samples):
+        """检测采样数组的语种，返回语种代码"""
+
+    def params(self):
+        """影响识别结果的后端参数，用于识别阶段的缓存键"""
+        return {'name': self.name}
+
+
+class OpenAIWhisperBackend(ASRBackend):
+    name = 'whisper'
+
+    def available(self):
+        try:
+            import whisper  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def load(self, size):
+        import whisper
+        return whisper.load_model(size)
+
+    def set_threads(self, threads):
+        import torch
+        torch.set_num_threads(threads)
+
+    def transcribe(self, model, audio, on_segment=None, **options):
+        # openai-whisper只能整段返回，识别结束后再逐句回调
+        result = model.transcribe(audio, **options)
+        if on_segment is not None:
+            for segment in result['segments']:
+                on_segment(segment)
+        return result
+
+    def detect_language(self, model, samples):
+        import whisper
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(samples), model.dims.n_mels).to(model.device)
+        _, probs = model.detect_language(mel)
+        return max(probs, key=probs.get)
+
+
+class FasterWhisperBackend(ASRBackend):
+    name = 'faster-whisper'
+
+    def __init__(self, device=None, compute_type=None):
+        self.device = device or ASR_DEVICE
+        self.compute_type = compute_type or ASR_COMPUTE_TYPE
+        # 0为由CTranslate2决定
+        self.cpu_threads = 0
+
+    def available(self):
+        try:
+            import faster_whisper  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def load(self, size):
+        from faster_whisper import WhisperModel
+        return WhisperModel(size, device=self.device, compute_type=self.compute_type, cpu_threads=self.cpu_threads)
+
+    def set_threads(self, threads):
+        # 线程数在加载模型时生效，工作进程先设置再加载
+        self.cpu_threads = threads
+
+    def transcribe(self, model, audio, on_segment=None, **options):
+        segments, info = model.transcribe(audio, **options)
+        # segments是惰性生成器，遍历时才逐段解码
+        result_segments = []
+        for segment in segments:
+            item = {
+                'id': len(result_segments),
+                'seek': segment.seek,
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text,
+                'tokens': list(segment.tokens),
+                'temperature': segment.temperature,
+                'avg_logprob': segment.avg_logprob,
+                'compression_ratio': segment.compression_ratio,
+                'no_speech_prob': segment.no_speech_prob,
+            }
+            if segment.words is not None:
+                item['words'] = [
+                    {'word': word.word, 'start': word.start, 'end': word.end, 'probability': word.probability}
+                    for word in segment.words
+                ]
+            result_segments.append(item)
+            if on_segment is not None:
+                on_segment(item)
+        return {
+            'text': ''.join(segment['text'] for segment in result_segments),
+            'segments': result_segments,
+            'language': info.language,
+        }
+
+    def detect_language(self, model, samples):
+        # 不遍历segments时只做语种检测，不解码
+        _, info = model.transcribe(samples)
+        return info.language
+
+    def params(self):
+        return {'name': self.name, 'compute_type': self.compute_type}
+
+
+BACKENDS = {
+    'whisper': OpenAIWhisperBackend(),
+    'faster-whisper': FasterWhisperBackend(),
+}
+
+
+def get_backend(name=None):
+    """按名称取得识别后端，auto时优先使用已安装的faster-whisper"""
+    name = name or ASR_BACKEND
+    if name == 'auto':
+        faster = BACKENDS['faster-whisper']
+        return faster if faster.available() else BACKENDS['whisper']
+    if name not in BACKENDS:
+        raise Exception(f"未知识别后端: {name}，可选: auto, {', '.join(BACKENDS)}")
+    return BACKENDS[name]
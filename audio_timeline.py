@@ -0,0 +1,102 @@
+"""
+配音时间轴拼接
+按视频总时长预分配一段PCM缓冲区，每个分句按其起始时间写入对应采样位置，最后一次性编码输出；
+超长视频使用np.memmap落盘缓冲，避免占用过多内存；时长未知时从短缓冲区开始按需延长
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+# 超过该时长（秒）的时间轴使用磁盘映射缓冲区
+DUB_MEMMAP_SECONDS = float(os.environ.get('DUB_MEMMAP_SECONDS', 1800))
+
+
+class DubTimeline:
+    def __init__(self, duration, sample_rate, memmap_seconds=None):
+        self.sample_rate = sample_rate
+        self.length = max(1, int(round(duration * sample_rate)))
+        self.memmap_seconds = DUB_MEMMAP_SECONDS if memmap_seconds is None else memmap_seconds
+        self._memmap_path = None
+        if duration > self.memmap_seconds:
+            self.buffer = self._create_memmap(self.length)
+        else:
+            self.buffer = np.zeros(self.length, dtype=np.float32)
+        self.placed = 0
+
+    def _create_memmap(self, length):
+        fd, self._memmap_path = tempfile.mkstemp(prefix='dub_timeline_', suffix='.f32', dir='temp')
+        os.close(fd)
+        # 新建的映射文件内容全为0，即静音
+        return np.memmap(self._memmap_path, dtype=np.float32, mode='w+', shape=(length,))
+
+    @property
+    def duration(self):
+        return self.length / self.sample_rate
+
+    def place(self, start, samples):
+        """把分句音频写入时间轴的起始位置，超出时间轴的部分截断"""
+        offset = int(round(start * self.sample_rate))
+        if offset >= self.length or len(samples) == 0:
+            return
+        end = min(self.length, offset + len(samples))
+        self.buffer[offset:end] = samples[:end - offset]
+        self.placed += 1
+
+    def fits(self, start, samples):
+        """分句音频写入后是否完全在时间轴内（不会被截断）"""
+        return int(round(start * self.sample_rate)) + len(samples) <= self.length
+
+    def extend(self, duration):
+        """把时间轴延长到duration（只增不减），新增部分为静音；内存缓冲区延长到超过磁盘映射阈值时改为落盘"""
+        length = int(round(duration * self.sample_rate))
+        if length <= self.length:
+            return
+        if self._memmap_path:
+            self.buffer.flush()
+            self.buffer = None
+            itemsize = np.dtype(np.float32).itemsize
+            stale = os.path.getsize(self._memmap_path) // itemsize
+            with open(self._memmap_path, 'r+b') as f:
+                f.truncate(length * itemsize)
+            self.buffer = np.memmap(self._memmap_path, dtype=np.float32, mode='r+', shape=(length,))
+            # 截断过的时间轴，文件中残留的旧采样要清为静音
+            self.buffer[self.length:min(stale, length)] = 0
+        elif duration > self.memmap_seconds:
+            buffer = self._create_memmap(length)
+            buffer[:self.length] = self.buffer[:self.length]
+            self.buffer = buffer
+        else:
+            self.buffer = np.concatenate([self.buffer, np.zeros(length - self.length, dtype=np.float32)])
+        self.length = length
+
+    def grow_to_fit(self, start, samples):
+        """分句音频超出时间轴时延长到能完整写入，至少延长为当前的两倍，避免逐句延长反复复制缓冲区"""
+        if self.fits(start, samples):
+            return
+        needed = int(round(start * self.sample_rate)) + len(samples)
+        self.extend(max(needed, self.length * 2) / self.sample_rate)
+
+    def truncate(self, duration):
+        """把时间轴缩短到duration（只减不增），之后的采样不再输出"""
+        length = max(1, int(round(duration * self.sample_rate)))
+        if length < self.length:
+            self.length = length
+            self.buffer = self.buffer[:length]
+
+    def write(self, path, block_seconds=60):
+        """分块编码为16位PCM wav文件"""
+        block = int(block_seconds * self.sample_rate)
+        with sf.SoundFile(path, 'w', samplerate=self.sample_rate, channels=1, subtype='PCM_16') as f:
+            for start in range(0, self.length, block):
+                f.write(np.clip(self.buffer[start:start + block], -1.0, 1.0))
+        return path
+
+    def close(self):
+        """释放缓冲区，删除磁盘映射文件"""
+        self.buffer = None
+        if self._memmap_path:
+            os.remove(self._memmap_path)
+            self._memmap_path = None
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+识别后端对比压测：用各识别后端分别识别本地测试音频，统计模型加载耗时、识别耗时、实时率（耗时/音频时长），
+以及词错误率WER：测试音频旁有同名.txt参考文本时对比参考文本，同时对比第一个后端的结果（一致性）。
+中文等不以空格分词的文字按字计算（即CER）
+
+用法: python bench_asr_backends.py clips/a.wav clips/b.mp3 --backends whisper faster-whisper --model base
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import time
+import unicodedata
+
+import numpy as np
+
+from asr_backends import BACKENDS, FasterWhisperBackend
+
+SAMPLE_RATE = 16000
+CJK = re.compile(r'([㐀-鿿豈-﫿])')
+
+
+def load_audio(path):
+    """与服务中一致：ffmpeg解码为16kHz单声道float32"""
+    output = subprocess.run([
+        'ffmpeg', '-v', 'error', '-i', path, '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), '-'
+    ], capture_output=True, check=True).stdout
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+
+def tokenize(text):
+    """小写、去标点，CJK字符逐字切分"""
+    text = ''.join(' ' if unicodedata.category(ch).startswith('P') else ch for ch in text.lower())
+    return CJK.sub(r' \1 ', text).split()
+
+
+def wer(reference, hypothesis):
+    ref, hyp = tokenize(reference), tokenize(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (r != h))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def read_reference(path):
+    reference_path = os.path.splitext(path)[0] + '.txt'
+    if not os.path.exists(reference_path):
+        return None
+    with open(reference_path, encoding='utf-8') as f:
+        return f.read()
+
+
+def make_backends(names, compute_type):
+    backends = []
+    for name in names:
+        backend = FasterWhisperBackend(compute_type=compute_type) if name == 'faster-whisper' else BACKENDS[name]
+        if not backend.available():
+            print(f"跳过未安装的后端: {name}")
+            continue
+        backends.append(backend)
+    return backends
+
+
+def main():
+    parser = argparse.ArgumentParser(description='识别后端对比压测')
+    parser.add_argument('clips', nargs='+', help='测试音频，可在旁边放同名.txt参考文本')
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument('--model', default=os.environ.get('WHISPER_MODEL_SIZE', 'base'), help='模型尺寸')
+    parser.add_argument('--compute-type', default=None, help='faster-whisper量化类型，默认ASR_COMPUTE_TYPE')
+    parser.add_argument('--language', default=None, help='指定语种，不指定时各后端自行检测')
+    args = parser.parse_args()
+
+    backends = make_backends(args.backends, args.compute_type)
+    if not backends:
+        raise SystemExit('没有可用的识别后端')
+    clips = [(path, load_audio(path), read_reference(path)) for path in args.clips]
+    total_audio = sum(len(samples) for _, samples, _ in clips) / SAMPLE_RATE
+    options = {'language': args.language} if args.language else {}
+    print(f"测试音频{len(clips)}段，共{total_audio:.0f}s，模型{args.model}，CPU核心数{os.cpu_count()}")
+
+    baseline_texts = {}
+    print(f"{'backend':<22}{'clip':<24}{'load_s':>8}{'time_s':>9}{'rtf':>8}{'wer':>8}{'parity':>8}")
+    for backend in backends:
+        start = time.time()
+        model = backend.load(args.model)
+        load_seconds = time.time() - start
+        label = backend.name + (f"({backend.compute_type})" if isinstance(backend, FasterWhisperBackend) else '')
+        total_time = 0.0
+        for path, samples, reference in clips:
+            duration = len(samples) / SAMPLE_RATE
+            start = time.time()
+            text = backend.transcribe(model, samples, **options)['text']
+            elapsed = time.time() - start
+            total_time += elapsed
+            error = f"{wer(reference, text):.3f}" if reference is not None else '-'
+            parity = f"{wer(baseline_texts[path], text):.3f}" if path in baseline_texts else '-'
+            baseline_texts.setdefault(path, text)
+            print(f"{label:<22}{os.path.basename(path)[:22]:<24}{load_seconds:>8.2f}{elapsed:>9.2f}"
+                  f"{elapsed / duration:>8.3f}{error:>8}{parity:>8}")
+        print(f"{label:<22}{'合计':<24}{load_seconds:>8.2f}{total_time:>9.2f}{total_time / total_audio:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+编码档位压测：用ffmpeg生成合成测试片段（testsrc2画面加正弦音），按每个编码档位重新编码，
+统计编码耗时、编码帧率、CPU时间和输出文件大小；编码参数与视频合成阶段完全相同
+
+用法: python bench_encode.py --duration 20 --size 1920x1080 --profiles draft standard archive
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+from encoding_profiles import ENCODING_PROFILES, get_profile, scale_filter, video_encode_args, audio_encode_args
+
+
+def cpu_seconds():
+    """已结束子进程（ffmpeg）的CPU时间"""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return children.ru_utime + children.ru_stime
+
+
+def make_clip(path, duration, size, fps):
+    """生成带运动画面和声音的测试片段，用无损x264编码，避免源文件本身的压缩失真影响对比"""
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={fps}:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-qp', '0', '-pix_fmt', 'yuv420p',
+        '-c:a', 'pcm_s16le', '-shortest', path
+    ], check=True)
+
+
+def encode(source, output, profile):
+    scale = scale_filter(profile)
+    filter_args = f'-vf "{scale}"' if scale else ''
+    command = (
+        f'ffmpeg -y -v error -i "{source}" {filter_args} '
+        f'{video_encode_args(profile)} {audio_encode_args(profile)} "{output}"'
+    )
+    start_cpu, start_wall = cpu_seconds(), time.time()
+    subprocess.run(command, shell=True, check=True)
+    return time.time() - start_wall, cpu_seconds() - start_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description='编码档位压测')
+    parser.add_argument('--duration', type=float, default=20, help='测试片段时长（秒）')
+    parser.add_argument('--size', default='1920x1080', help='测试片段分辨率')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--profiles', nargs='+', default=list(ENCODING_PROFILES), help='参与压测的档位')
+    args = parser.parse_args()
+
+    frames = int(args.duration * args.fps)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mkv')
+        make_clip(source, args.duration, args.size, args.fps)
+        print(f"测试片段: {args.size} {args.fps}fps {args.duration:.0f}s，共{frames}帧")
+        print(f"{'profile':<10}{'preset':>11}{'crf':>5}{'height':>8}{'time_s':>9}{'fps':>9}{'cpu_s':>9}{'size_MB':>10}")
+        for name in args.profiles:
+            profile = get_profile(name)
+            output = os.path.join(tmp, f'{name}.mp4')
+            wall, cpu = encode(source, output, profile)
+            size_mb = os.path.getsize(output) / 1024 / 1024
+            height = profile['max_height'] or '-'
+            print(f"{name:<10}{profile['preset']:>11}{profile['crf']:>5}{height:>8}"
+                  f"{wall:>9.2f}{frames / wall:>9.1f}{cpu:>9.2f}{size_mb:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
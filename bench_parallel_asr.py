@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+分段并行识别压测：对同一段音频先在本进程内整段识别，再用不同进程数分段并行识别，
+统计识别耗时、实时率（耗时/音频时长）、相对整段识别的加速比，并核对合并后的词数与整段识别一致。
+识别进程在计时前预热（加载模型），与服务中常驻进程池的情况相同
+
+用法: python bench_parallel_asr.py --audio speech.wav --repeat 4 --workers 1 2 4 --chunk-seconds 120 --model base
+"""
+
+import argparse
+import os
+import subprocess
+import time
+
+import numpy as np
+
+from asr_backends import get_backend
+from model_registry import model_registry
+from parallel_asr import parallel_transcribe, warm_up
+
+SAMPLE_RATE = 16000
+
+
+def load_audio(path, repeat):
+    """与服务中一致：ffmpeg解码为16kHz单声道float32，重复拼接repeat次得到更长的测试音频"""
+    output = subprocess.run([
+        'ffmpeg', '-v', 'error', '-i', path, '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), '-'
+    ], capture_output=True, check=True).stdout
+    samples = np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+    return np.tile(samples, repeat)
+
+
+def count_words(result):
+    return len(result['text'].split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分段并行识别压测')
+    parser.add_argument('--audio', required=True, help='测试音频（任意ffmpeg可解码的格式）')
+    parser.add_argument('--repeat', type=int, default=1, help='把测试音频重复拼接的次数')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}), help='识别进程数')
+    parser.add_argument('--chunk-seconds', type=float, default=None, help='每段目标时长（秒）')
+    parser.add_argument('--model', default=model_registry.default_size, help='Whisper模型尺寸')
+    parser.add_argument('--word-timestamps', action='store_true', help='同时计算逐词时间戳')
+    args = parser.parse_args()
+
+    samples = load_audio(args.audio, args.repeat)
+    duration = len(samples) / SAMPLE_RATE
+    options = {'word_timestamps': args.word_timestamps}
+    print(f"测试音频: {args.audio} x{args.repeat}，时长{duration:.0f}s，模型{args.model}，"
+          f"识别后端{get_backend().name}，CPU核心数{os.cpu_count()}")
+
+    with model_registry.use(args.model) as model:
+        start = time.time()
+        result = get_backend().transcribe(model, samples, **options)
+        baseline = time.time() - start
+    words = count_words(result)
+    print(f"{'mode':<12}{'chunks':>8}{'time_s':>9}{'rtf':>8}{'speedup':>9}{'words':>8}")
+    print(f"{'整段识别':<12}{1:>8}{baseline:>9.2f}{baseline / duration:>8.3f}{1:>9.2f}{words:>8}")
+
+    for workers in args.workers:
+        warm_up(args.model, workers)
+        start = time.time()
+        result = parallel_transcribe(samples, SAMPLE_RATE, args.model, options,
+                                     workers=workers, chunk_seconds=args.chunk_seconds)
+        elapsed = time.time() - start
+        chunk_words = count_words(result)
+        check = '' if chunk_words == words else f'  词数相差{chunk_words - words:+d}'
+        print(f"{f'{workers}进程':<12}{result['parallel']['chunks']:>8}{elapsed:>9.2f}{elapsed / duration:>8.3f}"
+              f"{baseline / elapsed:>9.2f}{chunk_words:>8}{check}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+分段并行编码压测：用ffmpeg生成合成测试片段（带字幕），对比整段单进程编码与不同进程数的分段并行编码，
+统计编码耗时、相对整段编码的加速比，并核对输出帧数与整段编码一致
+
+用法: python bench_parallel_encode.py --duration 120 --workers 1 2 4 8 --profile standard
+"""
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from encoding_profiles import ENCODING_PROFILES, get_profile, scale_filter, video_encode_args
+from parallel_encode import parallel_encode
+
+
+def make_clip(path, duration, size, fps, gop):
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate={fps}:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(gop), '-pix_fmt', 'yuv420p', path
+    ], check=True)
+
+
+def make_subtitle(path, duration):
+    """每秒一条字幕，覆盖分段边界附近的时间点"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for idx in range(int(duration)):
+            f.write(f"{idx + 1}\n{srt_time(idx)} --> {srt_time(idx + 0.9)}\n第{idx}秒\n\n")
+
+
+def srt_time(seconds):
+    millis = int(round(seconds * 1000))
+    return f"{millis // 3600000:02d}:{millis // 60000 % 60:02d}:{millis // 1000 % 60:02d},{millis % 1000:03d}"
+
+
+def count_frames(path):
+    output = subprocess.check_output([
+        'ffprobe', '-v', 'error', '-count_packets', '-select_streams', 'v:0',
+        '-show_entries', 'stream=nb_read_packets', '-of', 'csv=p=0', path
+    ])
+    return int(output.decode().strip())
+
+
+def encode_single(source, output, profile, subtitle_path):
+    filters = [f for f in (scale_filter(profile), f'subtitles={subtitle_path}') if f]
+    subprocess.run(
+        f'ffmpeg -y -v error -i "{source}" -map 0:v:0 -vf "{",".join(filters)}" {video_encode_args(profile)} "{output}"',
+        shell=True, check=True
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分段并行编码压测')
+    parser.add_argument('--duration', type=float, default=120, help='测试片段时长（秒）')
+    parser.add_argument('--size', default='1280x720', help='测试片段分辨率')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--gop', type=int, default=60, help='测试片段关键帧间隔（帧）')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}), help='并行编码进程数')
+    parser.add_argument('--chunk-seconds', type=float, default=None, help='每段目标时长（秒）')
+    parser.add_argument('--profile', default='standard', choices=list(ENCODING_PROFILES))
+    args = parser.parse_args()
+
+    profile = get_profile(args.profile)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.mp4')
+        subtitle = os.path.join(tmp, 'subtitle.srt')
+        make_clip(source, args.duration, args.size, args.fps, args.gop)
+        make_subtitle(subtitle, args.duration)
+        print(f"测试片段: {args.size} {args.fps}fps {args.duration:.0f}s，档位{args.profile}，CPU核心数{os.cpu_count()}")
+
+        output = os.path.join(tmp, 'single.mp4')
+        start = time.time()
+        encode_single(source, output, profile, subtitle)
+        baseline = time.time() - start
+        frames = count_frames(output)
+        print(f"{'mode':<12}{'chunks':>8}{'time_s':>9}{'speedup':>9}{'frames':>8}")
+        print(f"{'整段编码':<12}{1:>8}{baseline:>9.2f}{1:>9.2f}{frames:>8}")
+
+        for workers in args.workers:
+            output = os.path.join(tmp, f'parallel_{workers}.mp4')
+            start = time.time()
+            info = parallel_encode(source, output, profile, args.duration, subtitle,
+                                   workers=workers, chunk_seconds=args.chunk_seconds)
+            elapsed = time.time() - start
+            chunk_frames = count_frames(output)
+            check = '' if chunk_frames == frames else '  帧数不一致!'
+            print(f"{f'{workers}进程':<12}{info['chunks']:>8}{elapsed:>9.2f}{baseline / elapsed:>9.2f}{chunk_frames:>8}{check}")
+
+
+if __name__ == '__main__':
+    main()
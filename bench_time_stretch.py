@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+变速引擎压测：对每个引擎在不同变速比例和分句长度下统计
+吞吐量（每CPU秒处理的音频秒数，包含ffmpeg子进程CPU时间）和客观质量分
+
+质量分：
+- ref_lsd: 与librosa参考结果逐帧对数谱距离（dB，越小越接近参考）
+- drift: 输出与输入的长时平均谱距离（dB，反映音色/音高是否保持）
+
+用法: python bench_time_stretch.py --lengths 1 5 20 --speeds 0.6 0.8 1.25 1.6
+"""
+
+import argparse
+import resource
+import time
+
+import numpy as np
+
+from time_stretch import ENGINES
+
+SAMPLE_RATE = 24000
+
+
+def make_speech_like(duration, sr=SAMPLE_RATE, seed=0):
+    """生成带颤音和音节包络的谐波信号，近似语音"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(duration * sr)) / sr
+    f0 = 160 + 25 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    y = sum(np.sin(h * phase) / h for h in range(1, 12))
+    syllables = 0.5 + 0.5 * np.sign(np.sin(2 * np.pi * 4 * t)) * np.abs(np.sin(2 * np.pi * 4 * t)) ** 0.3
+    y = y * syllables + 0.02 * rng.standard_normal(len(t))
+    return (0.15 * y).astype(np.float32)
+
+
+def cpu_seconds():
+    """当前进程与已结束子进程的CPU时间之和"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def spectrogram(y, n_fft=1024, hop=256):
+    frames = np.lib.stride_tricks.sliding_window_view(y, n_fft)[::hop]
+    return np.abs(np.fft.rfft(frames * np.hanning(n_fft), axis=1)) + 1e-6
+
+
+def log_spectral_distance(a, b):
+    return float(np.sqrt(np.mean((20 * np.log10(a) - 20 * np.log10(b)) ** 2)))
+
+
+def quality(y, out, reference):
+    ref_lsd = log_spectral_distance(spectrogram(out), spectrogram(reference))
+    drift = log_spectral_distance(spectrogram(out).mean(axis=0), spectrogram(y).mean(axis=0))
+    return ref_lsd, drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description='变速引擎压测')
+    parser.add_argument('--lengths', type=float, nargs='+', default=[1, 5, 20], help='分句时长（秒）')
+    parser.add_argument('--speeds', type=float, nargs='+', default=[0.6, 0.8, 1.25, 1.6], help='变速倍数（>1为压缩）')
+    parser.add_argument('--repeat', type=int, default=3, help='每组重复次数')
+    args = parser.parse_args()
+
+    print(f"{'engine':<10}{'length':>8}{'speed':>8}{'audio_s/cpu_s':>16}{'ref_lsd':>10}{'drift':>10}")
+    for length in args.lengths:
+        y = make_speech_like(length)
+        for speed in args.speeds:
+            target_len = int(len(y) / speed)
+            reference = ENGINES['librosa'].stretch(y, SAMPLE_RATE, target_len)
+            for name, engine in ENGINES.items():
+                engine.stretch(y, SAMPLE_RATE, target_len)  # 预热
+                start = cpu_seconds()
+                for _ in range(args.repeat):
+                    out = engine.stretch(y, SAMPLE_RATE, target_len)
+                cpu = max(cpu_seconds() - start, 1e-9)
+                throughput = length * args.repeat / cpu
+                ref_lsd, drift = quality(y, out, reference)
+                print(f"{name:<10}{length:>8.1f}{speed:>8.2f}{throughput:>16.1f}{ref_lsd:>10.2f}{drift:>10.2f}")
+
+    # ffmpeg单进程批量处理多个分句
+    items = [(make_speech_like(2.0, seed=i), int(2.0 * SAMPLE_RATE / (0.7 + 0.02 * i))) for i in range(40)]
+    for label, func in [
+        ('ffmpeg逐句', lambda: [ENGINES['ffmpeg'].stretch(y, SAMPLE_RATE, n) for y, n in items]),
+        ('ffmpeg批量', lambda: ENGINES['ffmpeg'].stretch_batch(items, SAMPLE_RATE)),
+        ('wsola逐句', lambda: ENGINES['wsola'].stretch_batch(items, SAMPLE_RATE)),
+    ]:
+        start_cpu, start_wall = cpu_seconds(), time.time()
+        func()
+        cpu = max(cpu_seconds() - start_cpu, 1e-9)
+        print(f"{label}: {len(items)}句 墙钟 {time.time() - start_wall:.2f}s, 吞吐 {2.0 * len(items) / cpu:.1f} 音频秒/CPU秒")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+分句翻译压测：本地启动模拟阿里云机器翻译的HTTP服务（可配置延迟），
+对比逐句翻译与批量翻译的接口调用次数和耗时
+
+用法: python bench_translate.py --segments 300 --latency 0.08
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeMTHandler(BaseHTTPRequestHandler):
+    """模拟阿里云机器翻译RPC接口，支持TranslateGeneral和GetBatchTranslate"""
+    latency = 0.05
+    calls = {}
+    lock = threading.Lock()
+
+    def _params(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = self.rfile.read(length).decode('utf-8')
+            params.update({k: v[0] for k, v in parse_qs(body).items()})
+        return params
+
+    def _reply(self, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        params = self._params()
+        # 旧版SDK通过Action参数指定接口，新版SDK使用x-acs-action请求头
+        action = params.get('Action') or self.headers.get('x-acs-action', 'unknown')
+        with self.lock:
+            self.calls[action] = self.calls.get(action, 0) + 1
+        time.sleep(self.latency)
+        if action == 'GetBatchTranslate':
+            source = json.loads(params.get('SourceText', '{}'))
+            self._reply({
+                'RequestId': 'bench',
+                'Code': 200,
+                'TranslatedList': [
+                    {'index': idx, 'code': '200', 'translated': f'[zh]{text}', 'wordCount': str(len(text))}
+                    for idx, text in source.items()
+                ]
+            })
+        else:
+            text = params.get('SourceText', '')
+            self._reply({
+                'RequestId': 'bench',
+                'Code': '200',
+                'Data': {'Translated': f'[zh]{text}', 'WordCount': str(len(text))}
+            })
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_server(latency):
+    FakeMTHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeMTHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def make_texts(count):
+    """生成长度不一的英文分句"""
+    base = "This is sentence number {} of the benchmark, spoken at a natural pace by the narrator."
+    return [base.format(i) + " And some more words." * (i % 4) for i in range(count)]
+
+
+def run(label, func):
+    FakeMTHandler.calls.clear()
+    start = time.time()
+    results = func()
+    elapsed = time.time() - start
+    calls = dict(FakeMTHandler.calls)
+    print(f"{label}: 耗时 {elapsed:.2f}s, 接口调用 {sum(calls.values())} 次 {calls}")
+    return results, elapsed, sum(calls.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分句翻译压测')
+    parser.add_argument('--segments', type=int, default=300, help='分句数量')
+    parser.add_argument('--latency', type=float, default=0.05, help='模拟接口延迟（秒）')
+    args = parser.parse_args()
+
+    server = start_fake_server(args.latency)
+    os.environ['ALI_MT_ENDPOINT'] = f'127.0.0.1:{server.server_address[1]}'
+    os.environ['ALI_MT_PROTOCOL'] = 'http'
+    # 关闭翻译缓存，保证两种方式都真实请求接口
+    os.environ['TRANSLATION_CACHE_ENABLED'] = 'false'
+    for key in ['OPENAI_API_KEY', 'ALI_API_KEY', 'ALI_CLOUD_ACCESS_KEY_ID', 'ALI_CLOUD_ACCESS_KEY_SECRET']:
+        os.environ.setdefault(key, 'bench')
+
+    from video_processor import VideoProcessor
+    processor = VideoProcessor()
+    texts = make_texts(args.segments)
+
+    print(f"分句数: {args.segments}, 模拟延迟: {args.latency * 1000:.0f}ms")
+    single, single_time, single_calls = run('逐句翻译', lambda: [processor.translate_text(t) for t in texts])
+    batch, batch_time, batch_calls = run('批量翻译', lambda: processor.translate_batch(texts))
+
+    assert [zh for zh, _ in batch] == single, "批量翻译结果与逐句翻译不一致"
+    print(f"调用次数减少: {single_calls} -> {batch_calls} ({single_calls / max(batch_calls, 1):.1f}x)")
+    print(f"耗时减少: {single_time:.2f}s -> {batch_time:.2f}s ({single_time / max(batch_time, 1e-6):.1f}x)")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
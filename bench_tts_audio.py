@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+分句TTS音频处理开销压测：对比旧流程（mp3落盘 + 两次ffmpeg转换 + librosa读写）
+与内存流程（直接解码wav字节为NumPy数组）的单句开销，不包含TTS网络请求和变速计算本身
+
+用法: python bench_tts_audio.py --segments 30 --duration 3
+"""
+
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+import soundfile as sf
+
+
+def make_tone(duration, sr):
+    """生成近似语音频段的合成音频"""
+    t = np.arange(int(duration * sr)) / sr
+    y = sum(np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate([180, 360, 540, 720, 1100]))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+    return (0.2 * y * envelope).astype(np.float32)
+
+
+def make_tts_bytes(duration):
+    """分别构造旧流程的mp3字节（48kHz）和新流程的wav字节"""
+    from video_processor import TTS_SAMPLE_RATE
+    workdir = tempfile.mkdtemp(prefix='bench_tts_')
+    try:
+        wav48 = os.path.join(workdir, 'tone.wav')
+        mp3 = os.path.join(workdir, 'tone.mp3')
+        sf.write(wav48, make_tone(duration, 48000), 48000)
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-i', wav48, mp3], check=True)
+        with open(mp3, 'rb') as f:
+            mp3_bytes = f.read()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    buffer = io.BytesIO()
+    sf.write(buffer, make_tone(duration, TTS_SAMPLE_RATE), TTS_SAMPLE_RATE, format='WAV')
+    return mp3_bytes, buffer.getvalue()
+
+
+def legacy_segment(mp3_bytes, temp_dir, idx):
+    """旧流程：落盘mp3 -> ffmpeg转22.05kHz wav -> librosa读取 -> 写回wav -> ffmpeg转回mp3 -> pydub读取拼接"""
+    import librosa
+    from pydub import AudioSegment
+    seg_audio_path = os.path.join(temp_dir, f"seg_{idx}.mp3")
+    with open(seg_audio_path, 'wb') as f:
+        f.write(mp3_bytes)
+    wav_path = seg_audio_path.replace('.mp3', '.wav')
+    os.system(f'ffmpeg -y -loglevel error -i "{seg_audio_path}" -ar 22050 "{wav_path}"')
+    y, sr = librosa.load(wav_path, sr=None, mono=True)
+    sf.write(wav_path, y, sr)
+    os.system(f'ffmpeg -y -loglevel error -i "{wav_path}" -ar 48000 "{seg_audio_path}"')
+    return AudioSegment.from_file(seg_audio_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分句TTS音频处理开销压测')
+    parser.add_argument('--segments', type=int, default=30, help='分句数量')
+    parser.add_argument('--duration', type=float, default=3.0, help='每句音频时长（秒）')
+    args = parser.parse_args()
+
+    for key in ['OPENAI_API_KEY', 'ALI_API_KEY', 'ALI_CLOUD_ACCESS_KEY_ID', 'ALI_CLOUD_ACCESS_KEY_SECRET']:
+        os.environ.setdefault(key, 'bench')
+    from video_processor import VideoProcessor
+    processor = VideoProcessor()
+    mp3_bytes, wav_bytes = make_tts_bytes(args.duration)
+
+    temp_dir = tempfile.mkdtemp(prefix='bench_tts_legacy_')
+    try:
+        start = time.time()
+        for idx in range(args.segments):
+            legacy_segment(mp3_bytes, temp_dir, idx)
+        legacy_time = time.time() - start
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    start = time.time()
+    for _ in range(args.segments):
+        processor._decode_audio_bytes(wav_bytes)
+    memory_time = time.time() - start
+
+    print(f"分句数: {args.segments}, 每句时长: {args.duration:.1f}s")
+    print(f"旧流程（落盘+ffmpeg往返）: 每句 {legacy_time / args.segments * 1000:.1f}ms")
+    print(f"内存流程（wav字节直接解码）: 每句 {memory_time / args.segments * 1000:.1f}ms")
+    print(f"单句开销降低: {legacy_time / max(memory_time, 1e-9):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -32,6 +32,21 @@ class MultiPlatformBuilder:
         files_to_copy = [
             "app.py",
             "video_processor.py", 
+            "model_registry.py",
+            "asr_backends.py",
+            "segment_stream.py",
+            "translation_cache.py",
+            "artifact_cache.py",
+            "checkpoint.py",
+            "chunked_upload.py",
+            "encoding_profiles.py",
+            "parallel_encode.py",
+            "vad.py",
+            "parallel_asr.py",
+            "audio_timeline.py",
+            "time_stretch.py",
+            "job_scheduler.py",
+            "task_store.py",
             "requirements.txt",
             ".env.example",
             "README.md"
@@ -130,9 +145,14 @@ sys.path.insert(0, str(project_root))
 os.environ.setdefault('FLASK_ENV', 'production')
 
 # 导入并启动应用
-from app import app
+from app import app, start_model_warmup, resume_interrupted_jobs
 
 if __name__ == '__main__':
+    # 后台预热Whisper模型
+    start_model_warmup()
+    # 恢复上次中断的任务
+    resume_interrupted_jobs()
+    
     print("🚀 启动AI视频处理工具...")
     print("📱 访问地址: http://localhost:5000")
     print("🛑 按 Ctrl+C 停止服务")
@@ -204,6 +224,8 @@ services:
       - ./uploads:/app/uploads
       - ./outputs:/app/outputs
       - ./temp:/app/temp
+      - ./cache:/app/cache
+      - ./data:/app/data
     environment:
       - FLASK_ENV=production
     restart: unless-stopped
@@ -0,0 +1,179 @@
+"""
+任务检查点
+每个任务在检查点目录下维护一份清单（manifest.json），记录任务参数以及每个已完成阶段的缓存键和产物，
+进程崩溃或重启后从最后一个完成的阶段继续；运维也可以指定阶段，从该阶段起重新处理
+"""
+
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+from artifact_cache import artifact_cache, json_default
+
+# 处理阶段顺序；download_video为URL任务在后台下载的视频流（download只下载音频流时）
+STAGES = ('download', 'download_video', 'extract', 'asr', 'subtitle', 'translate', 'optimize', 'tts', 'merge')
+
+CHECKPOINT_DIR = os.environ.get('CHECKPOINT_DIR', 'data/checkpoints')
+
+# 当前进程的标识：主机名:进程号:启动随机数，进程重启后即使进程号相同（如容器内的1号进程）也能区分
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def worker_alive(worker_id):
+    """判断记录的处理进程是否仍在运行；其他主机上的进程无法判断，视为存活"""
+    if not worker_id:
+        return False
+    try:
+        host, pid, _ = worker_id.split(':')
+        pid = int(pid)
+    except ValueError:
+        return False
+    if worker_id == WORKER_ID:
+        return True
+    if host != socket.gethostname():
+        return True
+    if pid == os.getpid():
+        # 进程号与当前进程相同但启动随机数不同，说明是重启前的进程
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobCheckpoint:
+    def __init__(self, task_id, root=None):
+        self.task_id = task_id
+        self.directory = os.path.join(root or CHECKPOINT_DIR, task_id)
+        self.manifest_path = os.path.join(self.directory, 'manifest.json')
+        self._lock = threading.Lock()
+        self.manifest = self._read() or {'task_id': task_id, 'job': {}, 'stages': {}}
+
+    def _read(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[检查点] 读取清单失败 {self.task_id}: {e}")
+            return None
+
+    def _write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        # 先写临时文件再改名，崩溃时清单不会只写一半
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    @property
+    def job(self):
+        return self.manifest['job']
+
+    def save_job(self, **params):
+        """记录任务参数（来源、字幕、音轨模式等），恢复任务时按此重新执行"""
+        with self._lock:
+            self.manifest['job'].update(params)
+            self._write()
+
+    def completed_stages(self):
+        return [stage for stage in STAGES if stage in self.manifest['stages']]
+
+    def get(self, stage, key):
+        """返回已完成阶段的记录；缓存键不一致（参数变化）或产物文件已丢失时返回None"""
+        entry = self.manifest['stages'].get(stage)
+        if entry is None or entry['key'] != key:
+            return None
+        path = entry.get('path')
+        if path and not os.path.exists(path):
+            print(f"[检查点] {self.task_id} 阶段{stage}的产物已丢失: {path}")
+            return None
+        return entry
+
+    def complete(self, stage, key, path=None):
+        with self._lock:
+            self.manifest['stages'][stage] = {'key': key, 'path': path, 'completed_at': time.time()}
+            self._write()
+
+    def reset_from(self, stage):
+        """删除stage及之后阶段的记录，这些阶段重新处理时不读取产物缓存，直到任务完成"""
+        stages = STAGES[STAGES.index(stage):]
+        with self._lock:
+            for name in stages:
+                self.manifest['stages'].pop(name, None)
+            self.manifest['job']['refresh'] = list(stages)
+            self._write()
+
+    def finish(self):
+        """任务完成后清除强制重新处理的标记"""
+        if self.manifest['job'].get('refresh'):
+            with self._lock:
+                self.manifest['job'].pop('refresh', None)
+                self._write()
+
+    def _refresh(self, stage):
+        return stage in self.manifest['job'].get('refresh', ())
+
+    def value_path(self, stage):
+        return os.path.join(self.directory, f'{stage}.json')
+
+    def will_reuse(self, stage, params):
+        """阶段产物是否可以直接复用（检查点中已完成或产物缓存中已有），不读取产物"""
+        key = artifact_cache.make_key(stage, params)
+        if self.get(stage, key) is not None:
+            return True
+        return not self._refresh(stage) and artifact_cache.contains(key)
+
+    def file_stage(self, stage, params, dest_prefix, produce):
+        """文件产物阶段：已完成的阶段直接返回清单中的产物，否则经产物缓存执行并记录检查点，
+        返回(路径, 缓存键, 是否复用)"""
+        key = artifact_cache.make_key(stage, params)
+        entry = self.get(stage, key)
+        if entry is not None:
+            print(f"[检查点] {self.task_id} 阶段{stage}已完成，跳过")
+            return entry['path'], key, True
+        path, key, hit = artifact_cache.file_stage(stage, params, dest_prefix, produce, refresh=self._refresh(stage))
+        self.complete(stage, key, path)
+        return path, key, hit
+
+    def json_stage(self, stage, params, produce):
+        """JSON产物阶段，结果保存在检查点目录中，返回(值, 缓存键, 是否复用)"""
+        key = artifact_cache.make_key(stage, params)
+        path = self.value_path(stage)
+        if self.get(stage, key) is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+                print(f"[检查点] {self.task_id} 阶段{stage}已完成，跳过")
+                return value, key, True
+            except (OSError, ValueError) as e:
+                print(f"[检查点] 读取阶段{stage}结果失败，重新处理: {e}")
+        value, key, hit = artifact_cache.json_stage(stage, params, produce, refresh=self._refresh(stage))
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False, default=json_default)
+        self.complete(stage, key, path)
+        return value, key, hit
+
+    def delete(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def list_checkpoints(root=None):
+    """列出检查点目录下所有任务ID"""
+    root = root or CHECKPOINT_DIR
+    if not os.path.isdir(root):
+        return []
+    return [name for name in os.listdir(root) if os.path.exists(os.path.join(root, name, 'manifest.json'))]
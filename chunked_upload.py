@@ -0,0 +1,182 @@
+"""
+分块上传
+大文件按 初始化 / 逐块上传 / 完成 三步上传：每块直接流式写入磁盘，边写边计算sha256作为产物缓存的源文件哈希，
+网络中断后从服务端已收到的偏移继续上传；会话信息保存在磁盘上，多个进程和服务重启后都能继续同一上传
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+# 流式写盘的块大小
+WRITE_BLOCK = 1024 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400, offset=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class ChunkedUploadManager:
+    def __init__(self, root=None, max_bytes=None, chunk_bytes=None, ttl_seconds=None):
+        self.root = root or os.path.join(os.environ.get('UPLOAD_FOLDER', 'uploads'), '.parts')
+        self.max_bytes = int(max_bytes or os.environ.get('MAX_FILE_SIZE', 4 * 1024 ** 3))
+        self.chunk_bytes = int(chunk_bytes or os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get('UPLOAD_SESSION_TTL_HOURS', 24)) * 3600
+        self.ttl_seconds = ttl_seconds
+        # 进程内的增量哈希状态 {upload_id: (已哈希的字节数, hasher)}，与文件长度不一致时从文件重建
+        self._hashers = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+
+    def _paths(self, upload_id):
+        # upload_id只允许十六进制字符，防止路径穿越
+        if not upload_id or any(c not in '0123456789abcdef' for c in upload_id):
+            raise UploadError('上传会话不存在', 404)
+        base = os.path.join(self.root, upload_id)
+        return base + '.json', base + '.part'
+
+    def _upload_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def create(self, filename, size, options=None):
+        """创建上传会话，返回会话信息"""
+        if size is None or size <= 0:
+            raise UploadError('文件大小无效')
+        if size > self.max_bytes:
+            raise UploadError(f'文件大小不能超过{self.max_bytes // (1024 * 1024)}MB', 413)
+        self.maybe_purge()
+        os.makedirs(self.root, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = self._paths(upload_id)
+        session = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'size': size,
+            'options': options or {},
+            'created_at': time.time(),
+        }
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(session, f, ensure_ascii=False)
+        return self.describe(session, 0)
+
+    def describe(self, session, offset):
+        return {
+            'upload_id': session['upload_id'],
+            'filename': session['filename'],
+            'size': session['size'],
+            'offset': offset,
+            'chunk_size': self.chunk_bytes,
+            'max_size': self.max_bytes,
+        }
+
+    def _load(self, upload_id):
+        meta_path, part_path = self._paths(upload_id)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('上传会话不存在或已过期', 404)
+        if not os.path.exists(part_path):
+            raise UploadError('上传会话不存在或已过期', 404)
+        return session, part_path
+
+    def get(self, upload_id):
+        """查询上传进度，客户端据此从服务端已收到的偏移继续上传"""
+        session, part_path = self._load(upload_id)
+        return self.describe(session, os.path.getsize(part_path))
+
+    def _hasher(self, upload_id, part_path, offset):
+        """取得与已写入内容一致的增量哈希；其他进程写入过或服务重启后，从文件重新计算已收到部分"""
+        state = self._hashers.get(upload_id)
+        if state is not None and state[0] == offset:
+            return state[1]
+        hasher = hashlib.sha256()
+        remaining = offset
+        with open(part_path, 'rb') as f:
+            while remaining > 0:
+                block = f.read(min(WRITE_BLOCK, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher
+
+    def write_chunk(self, upload_id, offset, stream, length):
+        """从stream读取length字节追加到offset位置，边写边哈希，返回新的偏移；
+        连接中断时已收到的字节保留，客户端可以从新的偏移继续"""
+        if length is None or length <= 0:
+            raise UploadError('分块为空或缺少Content-Length')
+        if length > self.chunk_bytes:
+            raise UploadError(f'分块不能超过{self.chunk_bytes}字节', 413)
+        with self._upload_lock(upload_id):
+            session, part_path = self._load(upload_id)
+            current = os.path.getsize(part_path)
+            if offset != current:
+                raise UploadError('分块偏移与已上传大小不一致', 409, current)
+            if current + length > session['size']:
+                raise UploadError('上传内容超过声明的文件大小', 413, current)
+            hasher = self._hasher(upload_id, part_path, current)
+            written = 0
+            try:
+                with open(part_path, 'ab') as f:
+                    while written < length:
+                        block = stream.read(min(WRITE_BLOCK, length - written))
+                        if not block:
+                            break
+                        f.write(block)
+                        hasher.update(block)
+                        written += len(block)
+            finally:
+                self._hashers[upload_id] = (current + written, hasher)
+            return current + written
+
+    def complete(self, upload_id, dest_path):
+        """校验文件完整后移动到dest_path，返回(会话信息, sha256)"""
+        with self._upload_lock(upload_id):
+            session, part_path = self._load(upload_id)
+            received = os.path.getsize(part_path)
+            if received != session['size']:
+                raise UploadError(f"文件尚未上传完成: {received}/{session['size']}", 409, received)
+            digest = self._hasher(upload_id, part_path, received).hexdigest()
+            os.replace(part_path, dest_path)
+            self.abort(upload_id)
+            return session, digest
+
+    def abort(self, upload_id):
+        """删除上传会话和未完成的文件"""
+        for path in self._paths(upload_id):
+            if os.path.exists(path):
+                os.remove(path)
+        self._hashers.pop(upload_id, None)
+        with self._lock:
+            self._locks.pop(upload_id, None)
+
+    def maybe_purge(self, interval=600):
+        """最多每interval秒清理一次超过保留时长的未完成上传"""
+        now = time.time()
+        if not self.ttl_seconds or now - self._last_purge < interval or not os.path.isdir(self.root):
+            return
+        self._last_purge = now
+        for name in os.listdir(self.root):
+            upload_id, ext = os.path.splitext(name)
+            if ext != '.json':
+                continue
+            # 以最后一次写入分块的时间为准
+            part_path = os.path.join(self.root, upload_id + '.part')
+            path = part_path if os.path.exists(part_path) else os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    self.abort(upload_id)
+                    print(f"[分块上传] 清理过期上传: {upload_id}")
+            except (OSError, UploadError) as e:
+                print(f"[分块上传] 清理过期上传失败: {e}")
@@ -0,0 +1,25 @@
+"""
+测试公用的音频构造工具：正弦波与静音
+"""
+
+import numpy as np
+import pytest
+
+SR = 16000
+
+
+@pytest.fixture
+def tone():
+    """返回生成正弦波的函数，采样率默认16kHz"""
+    def make(seconds, freq=220.0, sr=SR):
+        t = np.arange(int(seconds * sr)) / sr
+        return (0.3 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return make
+
+
+@pytest.fixture
+def silence():
+    """返回生成静音的函数"""
+    def make(seconds, sr=SR):
+        return np.zeros(int(seconds * sr), dtype=np.float32)
+    return make
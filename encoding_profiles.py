@@ -0,0 +1,53 @@
+"""
+视频编码档位
+所有需要重新编码视频的合成命令共用同一组档位参数：x264预设、CRF、最大分辨率（高度）、音频码率和编码线程数，
+每个任务可以按用途选择档位：draft用于快速预览（缩小到720p），standard为默认，archive用于存档（画质优先）；
+standard和archive保持原分辨率，只替换音轨时1440p、4K的源视频也能直接流复制
+"""
+
+import os
+
+# 视频编码器
+VIDEO_CODEC = 'libx264'
+# 默认档位
+ENCODING_PROFILE = os.environ.get('ENCODING_PROFILE', 'standard')
+# 编码线程数，0为由x264按核心数自动决定；同时编码多个任务时可以调小，避免线程争抢
+ENCODE_THREADS = int(os.environ.get('ENCODE_THREADS', 0))
+
+# max_height为None时保持原分辨率
+ENCODING_PROFILES = {
+    'draft': {'preset': 'ultrafast', 'crf': 28, 'max_height': 720, 'audio_bitrate': '96k', 'threads': ENCODE_THREADS},
+    'standard': {'preset': 'veryfast', 'crf': 23, 'max_height': None, 'audio_bitrate': '128k', 'threads': ENCODE_THREADS},
+    'archive': {'preset': 'slow', 'crf': 18, 'max_height': None, 'audio_bitrate': '192k', 'threads': ENCODE_THREADS},
+}
+
+
+def get_profile(name=None):
+    """按名称取得档位参数（包含name字段）；未指定或档位不存在（如检查点中记录的档位已被移除）时使用默认档位"""
+    name = name or ENCODING_PROFILE
+    if name not in ENCODING_PROFILES:
+        fallback = ENCODING_PROFILE if ENCODING_PROFILE in ENCODING_PROFILES else 'standard'
+        print(f"[编码档位] 未知编码档位: {name}，使用{fallback}档位")
+        name = fallback
+    return dict(ENCODING_PROFILES[name], name=name)
+
+
+def needs_downscale(profile, height):
+    """源视频高度超过档位上限时需要缩小，即使源编码可以直接流复制也要重新编码"""
+    return bool(profile['max_height'] and height and height > profile['max_height'])
+
+
+def scale_filter(profile):
+    """限制最大高度的缩放滤镜，宽度按比例取偶数，高度不超过上限时也取偶数（x264要求宽高都是偶数）；
+    档位不限制分辨率时返回None"""
+    if not profile['max_height']:
+        return None
+    return f"scale=-2:'min({profile['max_height']},trunc(ih/2)*2)'"
+
+
+def video_encode_args(profile):
+    return f"-c:v {VIDEO_CODEC} -preset {profile['preset']} -crf {profile['crf']} -threads {profile['threads']}"
+
+
+def audio_encode_args(profile):
+    return f"-c:a aac -b:a {profile['audio_bitrate']}"
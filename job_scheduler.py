@@ -0,0 +1,184 @@
+"""
+任务调度器
+固定数量的工作线程从有界队列中取任务执行，队列满时拒绝新任务并给出建议重试时间；
+任务内部的各处理阶段再按资源类型（网络/语音识别/编码）分别限流
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"任务队列已满，请{retry_after}秒后重试")
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    def __init__(self, max_workers=None, max_queue=None):
+        self.max_workers = max(1, int(max_workers or os.environ.get('JOB_WORKERS', 4)))
+        self.max_queue = max(0, int(max_queue if max_queue is not None else os.environ.get('JOB_QUEUE_SIZE', 20)))
+        self._pending = deque()
+        self._running = set()
+        self._cond = threading.Condition()
+        self._workers = []
+        # 任务平均耗时（指数滑动平均），用于估算重试时间
+        self._avg_seconds = None
+        self.completed = 0
+        self.rejected = 0
+
+    def _ensure_workers(self):
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work, name=f"job_worker_{len(self._workers)}")
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def retry_after(self):
+        """估算多少秒后队列会空出位置：平均每 平均耗时/工作线程数 秒完成一个任务"""
+        with self._cond:
+            return self._retry_after_locked()
+
+    def _retry_after_locked(self):
+        avg = self._avg_seconds or 60
+        return max(5, int(math.ceil(avg / self.max_workers)))
+
+    def _idle_locked(self):
+        return self.max_workers - len(self._running)
+
+    def has_capacity(self):
+        with self._cond:
+            return len(self._pending) < self.max_queue + self._idle_locked()
+
+    def submit(self, task_id, func, *args):
+        """提交任务，返回排队位置（0表示马上执行），队列满时抛出QueueFullError"""
+        with self._cond:
+            # 空闲的工作线程会立即取走任务，不占用排队名额
+            if len(self._pending) >= self.max_queue + self._idle_locked():
+                self.rejected += 1
+                raise QueueFullError(self._retry_after_locked())
+            self._pending.append((task_id, func, args))
+            self._ensure_workers()
+            self._cond.notify()
+            return max(0, len(self._pending) - self._idle_locked())
+
+    def position(self, task_id):
+        """任务在队列中的位置（从1开始），已开始执行或不在队列中返回None"""
+        with self._cond:
+            for idx, (pending_id, _, _) in enumerate(self._pending):
+                if pending_id == task_id:
+                    return idx + 1
+        return None
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                task_id, func, args = self._pending.popleft()
+                self._running.add(task_id)
+            start = time.time()
+            try:
+                func(*args)
+            except Exception as e:
+                print(f"[调度] 任务 {task_id} 异常: {str(e)}")
+            finally:
+                elapsed = time.time() - start
+                with self._cond:
+                    self._running.discard(task_id)
+                    self.completed += 1
+                    self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+
+    def stats(self):
+        with self._cond:
+            return {
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': len(self._running),
+                'queued': len(self._pending),
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_job_seconds': round(self._avg_seconds, 1) if self._avg_seconds is not None else None,
+            }
+
+
+# 进程级共享实例
+job_scheduler = JobScheduler()
+
+
+class StagePool:
+    """单个处理阶段的资源池，限制该阶段同时运行的任务数"""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = max(1, int(limit))
+        self._semaphore = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.busy_seconds = 0.0
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            self.waiting += 1
+        self._semaphore.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+        start = time.time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.busy_seconds += time.time() - start
+            self._semaphore.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'running': self.running,
+                'waiting': self.waiting,
+                'completed': self.completed,
+                'busy_seconds': round(self.busy_seconds, 1),
+            }
+
+
+class StagePools:
+    """按资源类型划分的阶段资源池：
+    network - 下载、翻译、文案优化、TTS等网络等待为主的阶段
+    asr     - Whisper语音识别（CPU密集）
+    encode  - ffmpeg音频提取与视频编码（CPU密集）
+    不同任务处于不同阶段时可以同时运行，例如任务A编码的同时任务B在识别、任务C在合成语音"""
+
+    def __init__(self, limits=None):
+        limits = limits or {
+            'network': os.environ.get('STAGE_NETWORK_CONCURRENCY', 8),
+            'asr': os.environ.get('STAGE_ASR_CONCURRENCY', 1),
+            'encode': os.environ.get('STAGE_ENCODE_CONCURRENCY', 1),
+        }
+        self.pools = {name: StagePool(name, limit) for name, limit in limits.items()}
+
+    def stage(self, name):
+        """获取阶段资源，用法: with stage_pools.stage('asr'): ..."""
+        return self.pools[name].slot()
+
+    def run(self, name, func, *args, **kwargs):
+        """在阶段资源名额内执行func并返回结果"""
+        with self.stage(name):
+            return func(*args, **kwargs)
+
+    def stats(self):
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+# 进程级共享实例
+stage_pools = StagePools()
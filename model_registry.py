@@ -0,0 +1,145 @@
+"""
+Whisper模型注册表
+进程内共享模型实例：每个模型尺寸只加载一份，所有任务复用，支持预热与LRU淘汰
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from asr_backends import get_backend
+
+try:
+    import psutil
+except ImportError:  # psutil为可选依赖，缺失时只统计权重内存
+    psutil = None
+
+
+def _current_rss():
+    """当前进程常驻内存（字节），无psutil时返回None"""
+    if psutil is None:
+        return None
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
+def _model_weight_bytes(model):
+    """统计模型参数与缓冲区占用的字节数"""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class WhisperModelRegistry:
+    def __init__(self, default_size=None, max_models=None, loader=None):
+        self.default_size = default_size or os.environ.get('WHISPER_MODEL_SIZE', 'base')
+        self.max_models = max(1, int(max_models or os.environ.get('WHISPER_MAX_MODELS', 2)))
+        self._loader = loader
+        self._models = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+        # 每个尺寸一把加载锁，避免并发任务重复加载同一模型
+        self._load_locks = {}
+        # 每个模型一把推理锁：whisper解码时会在模型上挂kv-cache钩子，同一实例不能并发transcribe
+        self._use_locks = {}
+
+    def _load(self, size):
+        if self._loader is not None:
+            return self._loader(size)
+        # 默认按ASR_BACKEND配置的识别后端加载
+        return get_backend().load(size)
+
+    def get(self, size=None):
+        """获取指定尺寸的模型，未加载时加载并登记"""
+        size = size or self.default_size
+        with self._lock:
+            model = self._models.get(size)
+            if model is not None:
+                self._models.move_to_end(size)
+                self._stats[size]['hits'] += 1
+                return model
+            load_lock = self._load_locks.setdefault(size, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                model = self._models.get(size)
+                if model is not None:
+                    self._models.move_to_end(size)
+                    self._stats[size]['hits'] += 1
+                    return model
+
+            print(f"[模型] 开始加载Whisper模型: {size}")
+            rss_before = _current_rss()
+            start = time.time()
+            model = self._load(size)
+            load_seconds = time.time() - start
+            rss_after = _current_rss()
+
+            with self._lock:
+                self._models[size] = model
+                self._use_locks.setdefault(size, threading.Lock())
+                previous = self._stats.get(size, {})
+                self._stats[size] = {
+                    'size': size,
+                    'load_seconds': round(load_seconds, 3),
+                    'weight_bytes': _model_weight_bytes(model) if hasattr(model, 'parameters') else None,
+                    'rss_delta_bytes': (rss_after - rss_before) if rss_before is not None else None,
+                    'loaded_at': time.time(),
+                    'loads': previous.get('loads', 0) + 1,
+                    'hits': previous.get('hits', 0),
+                }
+                self._evict_locked()
+            print(f"[模型] Whisper模型 {size} 加载完成，耗时: {load_seconds:.2f}s")
+            return model
+
+    def _evict_locked(self):
+        """超出容量时淘汰最久未使用的模型（调用方需持有self._lock）"""
+        while len(self._models) > self.max_models:
+            size, _ = self._models.popitem(last=False)
+            self._stats[size]['evicted_at'] = time.time()
+            print(f"[模型] 淘汰Whisper模型: {size}")
+
+    @contextmanager
+    def use(self, size=None):
+        """独占使用模型进行推理"""
+        size = size or self.default_size
+        model = self.get(size)
+        with self._lock:
+            use_lock = self._use_locks.setdefault(size, threading.Lock())
+        with use_lock:
+            yield model
+
+    def preload(self, sizes=None):
+        """服务启动时预热模型"""
+        if sizes is None:
+            configured = os.environ.get('WHISPER_PRELOAD_MODELS', self.default_size)
+            sizes = [s.strip() for s in configured.split(',') if s.strip()]
+        for size in sizes:
+            try:
+                self.get(size)
+            except Exception as e:
+                print(f"[模型] 预热Whisper模型 {size} 失败: {str(e)}")
+
+    def stats(self):
+        """返回每个模型的加载耗时与内存占用"""
+        with self._lock:
+            loaded = list(self._models.keys())
+            models = []
+            for size, info in self._stats.items():
+                item = dict(info)
+                item['loaded'] = size in self._models
+                models.append(item)
+        return {
+            'backend': None if self._loader is not None else get_backend().name,
+            'default_size': self.default_size,
+            'max_models': self.max_models,
+            'loaded': loaded,
+            'process_rss_bytes': _current_rss(),
+            'models': models,
+        }
+
+
+# 进程级共享实例
+model_registry = WhisperModelRegistry()
@@ -0,0 +1,257 @@
+"""
+长音频分段并行识别
+单次Whisper transcribe只用一个进程，耗时随时长线性增长。这里把长音频在静音处切成若干段，
+交给常驻的进程池并行识别（第一个长任务时创建，每个工作进程各自持有加载好的模型），再把各段结果合并为一份segments。
+
+分段方式：
+- 在每个等分点附近（前后各1/5段长）找平均电平最低的位置切开，通常落在句间停顿里
+- 切点不在静音里时（连续说话），两侧各多送PARALLEL_ASR_OVERLAP_SECONDS的音频，保证切点附近的词完整
+- 每段只保留起始时间落在本段范围内的词，再去掉与上一个词时间重叠的词，切点两侧不会出现重复的词；
+  切点都在静音里时不需要逐词时间戳，按分句中点归属
+- 语种先用第一段检测一次，各段统一使用，避免不同段识别成不同语种
+"""
+
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from asr_backends import get_backend
+from model_registry import model_registry
+from vad import VAD_THRESHOLD_DB, frame_levels
+
+# 时长达到该值（秒）的音频自动分段并行识别，0为关闭
+PARALLEL_ASR_MIN_SECONDS = float(os.environ.get('PARALLEL_ASR_MIN_SECONDS', 600))
+# 识别进程数，0为CPU核心数（最多4个，每个进程各加载一份模型）
+PARALLEL_ASR_WORKERS = int(os.environ.get('PARALLEL_ASR_WORKERS', 0))
+# 每段的目标时长（秒）
+PARALLEL_ASR_CHUNK_SECONDS = float(os.environ.get('PARALLEL_ASR_CHUNK_SECONDS', 120))
+# 切点不在静音里时两侧多送的音频（秒）
+PARALLEL_ASR_OVERLAP_SECONDS = float(os.environ.get('PARALLEL_ASR_OVERLAP_SECONDS', 1.0))
+# 服务启动时就拉起识别进程池；默认关闭，第一个需要并行识别的长任务才创建，
+# 只处理短视频的部署不会多占每个识别进程一份模型的内存
+PARALLEL_ASR_PREWARM = os.environ.get('PARALLEL_ASR_PREWARM', 'false').lower() in ('1', 'true', 'yes', 'on')
+# 找切点时比较的平均电平窗口（秒）
+CUT_WINDOW_SECONDS = 0.5
+# 语种检测使用的音频长度（秒），与Whisper的解码窗口一致
+LANGUAGE_DETECT_SECONDS = 30
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def default_workers():
+    return PARALLEL_ASR_WORKERS or min(4, os.cpu_count() or 1)
+
+
+def should_parallel_transcribe(duration, workers=None):
+    workers = workers or default_workers()
+    return bool(PARALLEL_ASR_MIN_SECONDS and duration and workers > 1 and duration >= PARALLEL_ASR_MIN_SECONDS)
+
+
+def parallel_asr_params():
+    """影响识别结果的分段参数，用于识别阶段的缓存键（进程数不影响结果）；关闭时返回None"""
+    if not should_parallel_transcribe(PARALLEL_ASR_MIN_SECONDS):
+        return None
+    return {
+        'min_seconds': PARALLEL_ASR_MIN_SECONDS,
+        'chunk_seconds': PARALLEL_ASR_CHUNK_SECONDS,
+        'overlap': PARALLEL_ASR_OVERLAP_SECONDS,
+    }
+
+
+# ---- 工作进程 ----
+
+def _init_worker(size, threads):
+    """工作进程启动时限制推理线程数并加载模型，之后的分段直接使用预热好的模型"""
+    get_backend().set_threads(threads)
+    model_registry.get(size)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _detect_language(size, samples):
+    with model_registry.use(size) as model:
+        return get_backend().detect_language(model, samples)
+
+
+def _transcribe_chunk(size, samples, options):
+    with model_registry.use(size) as model:
+        return get_backend().transcribe(model, samples, **options)
+
+
+# ---- 进程池 ----
+
+def get_pool(workers, size):
+    """取得常驻进程池，进程数变化时重建；用spawn启动，避免在多线程的服务进程里fork"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        # 工作进程异常退出后进程池不可再用，重新创建
+        if _pool is None or _pool_workers != workers or getattr(_pool, '_broken', False):
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            print(f"[并行识别] 启动{workers}个识别进程，每进程{threads}线程，预加载模型{size}")
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker, initargs=(size, threads)
+            )
+            _pool_workers = workers
+        return _pool
+
+
+def warm_up(size, workers=None):
+    """拉起全部识别进程并加载模型（PARALLEL_ASR_PREWARM开启时服务启动即调用）"""
+    workers = workers or default_workers()
+    try:
+        pool = get_pool(workers, size)
+        pids = set(pool.map(_ping, range(workers)))
+        print(f"[并行识别] {len(pids)}个识别进程已就绪")
+    except Exception as e:
+        print(f"[并行识别] 预热识别进程失败: {str(e)}")
+
+
+# ---- 分段与合并 ----
+
+def plan_chunks(samples, sample_rate, chunk_seconds, overlap):
+    """返回各段信息：core为本段负责的时间范围，window为实际送去识别的音频范围（秒）"""
+    duration = len(samples) / sample_rate
+    count = max(1, int(math.ceil(duration / chunk_seconds)))
+    if count == 1:
+        return [{'core': (0.0, duration), 'window': (0.0, duration)}]
+
+    levels, frame_len = frame_levels(samples, sample_rate)
+    frame_seconds = frame_len / sample_rate
+    width = max(1, int(round(CUT_WINDOW_SECONDS / frame_seconds)))
+    # 按能量（而不是dB值）求窗口平均，窗口内只要有声音就不算静音
+    power = np.convolve(np.power(10.0, levels / 10), np.ones(width) / width, mode='same')
+    smoothed = 10 * np.log10(np.maximum(power, 1e-12))
+    silence_level = np.percentile(levels, 95) - VAD_THRESHOLD_DB
+
+    cuts = [(0.0, True)]
+    search = duration / count / 5
+    for idx in range(1, count):
+        target = duration * idx / count
+        lo = max(int((target - search) / frame_seconds), int(cuts[-1][0] / frame_seconds) + 1)
+        hi = min(int((target + search) / frame_seconds), len(smoothed) - 1)
+        if hi <= lo:
+            continue
+        best = lo + int(np.argmin(smoothed[lo:hi]))
+        cuts.append((best * frame_seconds, smoothed[best] < silence_level))
+    cuts.append((duration, True))
+
+    chunks = []
+    for (start, start_silent), (end, end_silent) in zip(cuts, cuts[1:]):
+        window = (
+            start if start_silent else max(0.0, start - overlap),
+            end if end_silent else min(duration, end + overlap),
+        )
+        chunks.append({'core': (start, end), 'window': window})
+    return chunks
+
+
+def _shift(segment, offset):
+    segment['start'] += offset
+    segment['end'] += offset
+    for word in segment.get('words') or []:
+        word['start'] += offset
+        word['end'] += offset
+
+
+class ChunkMerger:
+    """按顺序合并各段识别结果，时间戳换算到整段音频的时间轴，去掉切点两侧重复的词；
+    每合并一段就返回该段新确定的分句，前面的段识别完即可交给下游，不必等全部完成"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.segments = []
+        self.language = None
+        self._last_word_end = None
+
+    def add(self, idx, result):
+        chunk = self.chunks[idx]
+        core_start = chunk['core'][0] if idx > 0 else -math.inf
+        core_end = chunk['core'][1] if idx < len(self.chunks) - 1 else math.inf
+        previous_end = self._last_word_end
+        if self.language is None:
+            self.language = result.get('language')
+        added = []
+        for segment in result['segments']:
+            _shift(segment, chunk['window'][0])
+            words = segment.get('words')
+            if words:
+                kept = [w for w in words if core_start <= w['start'] < core_end]
+                # 上一段末尾完整识别过的词，在下一段开头可能只剩半个，按时间重叠去掉
+                if previous_end is not None:
+                    kept = [w for w in kept if w['start'] >= previous_end]
+                if not kept:
+                    continue
+                if len(kept) < len(words):
+                    segment = {key: value for key, value in segment.items() if key != 'tokens'}
+                    segment.update(text=''.join(w['word'] for w in kept), start=kept[0]['start'],
+                                   end=kept[-1]['end'], words=kept)
+                self._last_word_end = kept[-1]['end']
+            elif not core_start <= (segment['start'] + segment['end']) / 2 < core_end:
+                continue
+            segment['id'] = len(self.segments)
+            self.segments.append(segment)
+            added.append(segment)
+        return added
+
+    def result(self):
+        return {
+            'text': ''.join(segment['text'] for segment in self.segments),
+            'segments': self.segments,
+            'language': self.language,
+        }
+
+
+def parallel_transcribe(samples, sample_rate, size, options=None, workers=None, chunk_seconds=None, on_segment=None):
+    """分段并行识别16kHz单声道采样数组，返回与Whisper transcribe相同结构的结果；
+    on_segment按顺序接收合并后确定的分句（第一段识别完即开始回调）"""
+    options = dict(options or {})
+    workers = workers or default_workers()
+    chunk_seconds = chunk_seconds or PARALLEL_ASR_CHUNK_SECONDS
+    chunks = plan_chunks(samples, sample_rate, chunk_seconds, PARALLEL_ASR_OVERLAP_SECONDS)
+    duration = len(samples) / sample_rate
+    silent_cuts = sum(1 for chunk in chunks[1:] if chunk['window'][0] == chunk['core'][0])
+    print(f"[并行识别] 时长{duration:.0f}s，分{len(chunks)}段（{silent_cuts}个切点在静音处），{workers}个进程")
+
+    pool = get_pool(workers, size)
+    if not options.get('language'):
+        options['language'] = pool.submit(
+            _detect_language, size, samples[:LANGUAGE_DETECT_SECONDS * sample_rate]
+        ).result()
+        print(f"[并行识别] 检测到语种: {options['language']}")
+
+    # 有切点不在静音里时，需要逐词时间戳才能在重叠部分按词去重，结果中再去掉调用方没要求的逐词时间戳
+    strip_words = silent_cuts < len(chunks) - 1 and not options.get('word_timestamps')
+    if strip_words:
+        options['word_timestamps'] = True
+
+    futures = []
+    for chunk in chunks:
+        start, end = (int(round(t * sample_rate)) for t in chunk['window'])
+        futures.append(pool.submit(_transcribe_chunk, size, samples[start:end], options))
+    merger = ChunkMerger(chunks)
+    try:
+        for idx, future in enumerate(futures):
+            for segment in merger.add(idx, future.result()):
+                if strip_words:
+                    segment.pop('words', None)
+                if on_segment is not None:
+                    on_segment(segment)
+    except Exception:
+        # 下游取消分句流或某段识别失败时，取消还在排队的分段，进程池是共享的，不能整体关闭
+        cancelled = sum(1 for future in futures if future.cancel())
+        print(f"[并行识别] 识别中止，取消{cancelled}个未开始的分段")
+        raise
+    result = merger.result()
+    result['parallel'] = {'chunks': len(chunks), 'workers': workers, 'silent_cuts': silent_cuts}
+    return result
@@ -0,0 +1,149 @@
+"""
+长视频分段并行编码
+单个x264进程难以用满多核，长视频的重新编码会成为整个任务的瓶颈。这里在关键帧处把视频切成若干段，
+每段由独立的ffmpeg进程并行编码（缩放、烧录字幕与整段编码时完全相同），再用concat分离器无损拼接。
+
+分段方式：
+- 分段边界取在关键帧上，每段从自己的关键帧开始解码，不需要解码上一段的内容
+- 各段保留原始时间轴（-copyts），按时间戳精确截取[本段关键帧, 下段关键帧)内的帧，每一帧恰好属于一段，
+  字幕滤镜看到的也是原始时间，不需要改写字幕文件
+- 各段编码后时间戳从0开始，concat分离器按各段时长依次衔接
+"""
+
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from encoding_profiles import scale_filter, video_encode_args
+
+# 时长达到该值（秒）的视频需要重新编码时自动分段并行编码，0为关闭
+PARALLEL_ENCODE_MIN_SECONDS = float(os.environ.get('PARALLEL_ENCODE_MIN_SECONDS', 300))
+# 并行编码的进程数，0为CPU核心数
+PARALLEL_ENCODE_WORKERS = int(os.environ.get('PARALLEL_ENCODE_WORKERS', 0))
+# 每段的目标时长（秒），段数至少等于进程数，段数多于进程数时先完成的进程继续处理后面的段
+PARALLEL_ENCODE_CHUNK_SECONDS = float(os.environ.get('PARALLEL_ENCODE_CHUNK_SECONDS', 60))
+# 每段的最短时长（秒），关键帧稀疏或不均匀时不切出过短的段（过短的段并行收益抵不过进程启动开销）
+PARALLEL_ENCODE_MIN_CHUNK_SECONDS = float(os.environ.get('PARALLEL_ENCODE_MIN_CHUNK_SECONDS', 10))
+# 分段边界比关键帧时间戳提前的量（秒），避免浮点误差把关键帧划到上一段
+BOUNDARY_EPSILON = 0.001
+
+
+def default_workers():
+    return PARALLEL_ENCODE_WORKERS or os.cpu_count() or 1
+
+
+def should_parallel_encode(duration, workers=None):
+    workers = workers or default_workers()
+    return bool(PARALLEL_ENCODE_MIN_SECONDS and duration and workers > 1 and duration >= PARALLEL_ENCODE_MIN_SECONDS)
+
+
+def probe_keyframes(video_path):
+    """读取首个视频流的关键帧时间（秒，已减去容器起始时间）和容器起始时间；只读取数据包，不解码"""
+    start_time = float(subprocess.check_output([
+        'ffprobe', '-v', 'error', '-show_entries', 'format=start_time',
+        '-of', 'default=noprint_wrappers=1:nokey=1', video_path
+    ]).decode().strip() or 0)
+    output = subprocess.check_output([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path
+    ]).decode()
+    keyframes = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time) - start_time)
+    return sorted(set(keyframes)), start_time
+
+
+def plan_chunks(keyframes, duration, chunks, min_seconds=None):
+    """在最接近等分点的关键帧处分段，返回各段起始关键帧时间（第一段从0开始，每段到下一段的起点为止，
+    最后一段到结尾）；与上一段起点或结尾的距离不足min_seconds的关键帧不作为分段点"""
+    min_seconds = PARALLEL_ENCODE_MIN_CHUNK_SECONDS if min_seconds is None else min_seconds
+    starts = [0.0]
+    for idx in range(1, chunks):
+        target = duration * idx / chunks
+        nearest = min(keyframes, key=lambda t: abs(t - target), default=None)
+        if nearest is None or nearest - starts[-1] < max(min_seconds, BOUNDARY_EPSILON) or duration - nearest < min_seconds:
+            continue
+        starts.append(nearest)
+    return starts
+
+
+@lru_cache(maxsize=None)
+def passthrough_args():
+    """按原时间戳输出每一帧的参数：-vsync自ffmpeg 5.1起弃用，改为-fps_mode；旧版ffmpeg没有-fps_mode时退回-vsync"""
+    try:
+        output = subprocess.run(['ffmpeg', '-hide_banner', '-h', 'full'], capture_output=True, text=True).stdout
+    except OSError:
+        output = ''
+    return '-fps_mode passthrough' if '-fps_mode' in output else '-vsync passthrough'
+
+
+def chunk_command(video_path, output_path, profile, start_time, start, end, threads, subtitle_path=None):
+    """编码[start, end)内的帧；end为None表示到结尾"""
+    # 从本段关键帧开始解码，-noaccurate_seek保留定位点之后的全部帧，由trim按时间戳精确截取
+    seek = f'-ss {start:.6f} -noaccurate_seek ' if start > 0 else ''
+    trim = f'trim=start={max(0.0, start - BOUNDARY_EPSILON):.6f}'
+    if end is not None:
+        trim += f':end={end - BOUNDARY_EPSILON:.6f}'
+    # 先把时间戳换算到从0开始（与整段编码时一致），截取并烧录字幕后，再让本段时间戳从0开始
+    filters = [f'setpts=PTS-{start_time:.6f}/TB', trim]
+    scale = scale_filter(profile)
+    if scale:
+        filters.append(scale)
+    if subtitle_path:
+        filters.append(f'subtitles={subtitle_path}')
+    filters.append('setpts=PTS-STARTPTS')
+    encode_args = video_encode_args(dict(profile, threads=threads))
+    return (
+        f'ffmpeg -y -v error -copyts {seek}-i "{video_path}" -map 0:v:0 -an -sn '
+        f'-vf "{",".join(filters)}" {passthrough_args()} {encode_args} "{output_path}"'
+    )
+
+
+def parallel_encode(video_path, output_path, profile, duration, subtitle_path=None, workers=None, chunk_seconds=None):
+    """分段并行编码视频流（不含音频），结果写入output_path（mp4），返回分段信息"""
+    workers = workers or default_workers()
+    chunk_seconds = chunk_seconds or PARALLEL_ENCODE_CHUNK_SECONDS
+    keyframes, start_time = probe_keyframes(video_path)
+    chunks = max(workers, int(math.ceil(duration / chunk_seconds)))
+    starts = plan_chunks(keyframes, duration, chunks)
+    # 进程数较多时限制每个x264进程的线程数，避免线程数远超核心数
+    threads = profile['threads'] or max(1, (os.cpu_count() or 1) // min(workers, len(starts)))
+    print(f"[并行编码] {video_path} 时长{duration:.0f}s，分{len(starts)}段，{workers}个进程，每进程{threads}线程")
+
+    work_dir = tempfile.mkdtemp(prefix='chunks_', dir=os.path.dirname(output_path) or '.')
+    try:
+        jobs = []
+        for idx, start in enumerate(starts):
+            end = starts[idx + 1] if idx + 1 < len(starts) else None
+            chunk_path = os.path.join(work_dir, f'chunk_{idx:04d}.mp4')
+            jobs.append((chunk_path, chunk_command(video_path, chunk_path, profile, start_time, start, end,
+                                                   threads, subtitle_path)))
+
+        def run(job):
+            chunk_path, command = job
+            result = subprocess.run(command, shell=True)
+            if result.returncode != 0 or not os.path.exists(chunk_path):
+                raise Exception(f"分段编码失败: {chunk_path}")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, jobs))
+
+        list_path = os.path.join(work_dir, 'chunks.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for chunk_path, _ in jobs:
+                f.write(f"file '{os.path.abspath(chunk_path)}'\n")
+        result = subprocess.run([
+            'ffmpeg', '-y', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-c', 'copy', output_path
+        ])
+        if result.returncode != 0 or not os.path.exists(output_path):
+            raise Exception("分段拼接失败")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {'chunks': len(starts), 'workers': workers}
@@ -128,7 +128,12 @@ def main():
     
     # 导入并启动应用
     try:
-        from app import app
+        from app import app, start_model_warmup, resume_interrupted_jobs
+        
+        # 后台预热Whisper模型
+        start_model_warmup(debug=True)
+        # 恢复上次中断的任务
+        resume_interrupted_jobs(debug=True)
         
         print("🚀 启动AI视频处理工具...")
         print("📱 访问地址: http://localhost:5000")
@@ -0,0 +1,86 @@
+"""
+识别分句流
+语音识别在后台线程中运行，每确定一个分句就放进队列；下游（翻译、字幕、配音）在另一个线程里
+按批取出已到达的分句处理，不必等整段识别完成，总耗时接近最慢的一个阶段而不是各阶段之和。
+分句攒够一定数量或等待一定时间后才交给下游，逐句解码的后端也不会退化为每句一次翻译请求
+"""
+
+import os
+import queue
+import threading
+import time
+
+# 每批最多的分句数
+STREAM_BATCH_ITEMS = int(os.environ.get('ASR_STREAMING_BATCH_ITEMS', 20))
+# 一批中第一个分句到达后最多再等待的时长（秒）
+STREAM_BATCH_SECONDS = float(os.environ.get('ASR_STREAMING_BATCH_SECONDS', 5.0))
+
+_END = object()
+
+
+class StreamCancelled(Exception):
+    """下游已放弃分句流，识别线程在下一次回调时中止"""
+
+
+class SegmentStream:
+    def __init__(self, produce, name='segment_stream'):
+        """produce(on_segment)在后台线程中执行识别，按顺序对每个分句调用on_segment，返回完整识别结果"""
+        self._produce = produce
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self.result = None
+        self.error = None
+        self.count = 0
+        self.started_at = time.time()
+        self.first_segment_at = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self.result = self._produce(self._put)
+        except Exception as e:
+            self.error = e
+        finally:
+            self._queue.put(_END)
+
+    def _put(self, segment):
+        if self._cancelled.is_set():
+            raise StreamCancelled("分句流已取消")
+        if self.first_segment_at is None:
+            self.first_segment_at = time.time()
+        self.count += 1
+        self._queue.put(segment)
+
+    def batches(self, max_items=None, max_wait=None):
+        """每次至少等到一个分句，再最多等待max_wait秒或攒够max_items个分句后一起返回；
+        识别结束后停止，识别失败时抛出异常"""
+        max_items = max_items or STREAM_BATCH_ITEMS
+        max_wait = STREAM_BATCH_SECONDS if max_wait is None else max_wait
+        finished = False
+        while not finished:
+            item = self._queue.get()
+            if item is _END:
+                break
+            batch = [item]
+            deadline = time.time() + max_wait
+            while len(batch) < max_items:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if item is _END:
+                    finished = True
+                    break
+                batch.append(item)
+            yield batch
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """取消并等待识别线程结束：下游出错时识别线程在下一次回调时中止，不再占用识别资源；
+        无法中途打断的识别（如openai-whisper整段识别）会等到本次识别返回"""
+        if self._thread.is_alive():
+            self._cancelled.set()
+        self._thread.join()
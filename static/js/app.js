@@ -1,6 +1,10 @@
 // 全局变量
 let currentTaskId = null;
 let statusCheckInterval = null;
+let statusEventSource = null;
+let statusRequestPending = false;
+// 已收到的任务状态（进度事件只包含变化的字段和新增步骤，在此累积）
+let taskState = null;
 
 // 页面加载完成后初始化
 document.addEventListener('DOMContentLoaded', function() {
@@ -64,31 +68,17 @@ function handleFileUpload(file) {
         return;
     }
     
-    // 检查文件大小 (限制为500MB)
-    if (file.size > 500 * 1024 * 1024) {
-        showError('文件大小不能超过500MB');
-        return;
-    }
-    
     // 获取字幕选项
     const addSubtitles = document.getElementById('addSubtitlesFile').checked;
     const audioMode = document.querySelector('#file input[name="audioMode"]:checked')?.value || 'synth';
-    
-    // 创建FormData
-    const formData = new FormData();
-    formData.append('video', file);
-    formData.append('add_subtitles', addSubtitles);
-    formData.append('audio_mode', audioMode);
+    const subtitleMode = document.querySelector('#file input[name="subtitleModeFile"]:checked')?.value || 'burn';
+    const encodingProfile = document.querySelector('#file input[name="encodingProfileFile"]:checked')?.value || 'standard';
     
     // 显示加载状态
     showLoadingModal();
     
-    // 发送上传请求
-    fetch('/api/upload-video', {
-        method: 'POST',
-        body: formData
-    })
-    .then(response => response.json())
+    // 分块上传，文件大小由服务端校验
+    uploadInChunks(file, addSubtitles, audioMode, subtitleMode, encodingProfile)
     .then(data => {
         hideLoadingModal();
         
@@ -96,7 +86,8 @@ function handleFileUpload(file) {
             currentTaskId = data.task_id;
             showStatusCard();
             startStatusCheck();
-            showSuccess('视频上传成功，开始处理...');
+            // 排队时提示前面的任务数
+            showSuccess(data.queue_position > 0 ? data.message : '视频上传成功，开始处理...');
         } else {
             showError(data.error || '上传失败');
         }
@@ -107,12 +98,120 @@ function handleFileUpload(file) {
     });
 }
 
+// 单个分块失败后的最大重试次数
+const UPLOAD_MAX_RETRIES = 5;
+
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// 更新上传进度
+function updateUploadProgress(loaded, total) {
+    const loadingMessage = document.getElementById('loadingMessage');
+    if (loadingMessage) {
+        loadingMessage.textContent = `正在上传 ${formatFileSize(loaded)} / ${formatFileSize(total)}（${Math.floor(loaded * 100 / total)}%）`;
+    }
+}
+
+// 查询服务端已收到的字节数
+async function fetchUploadOffset(uploadId) {
+    const response = await fetch(`/api/uploads/${uploadId}`);
+    if (!response.ok) return null;
+    return (await response.json()).offset;
+}
+
+// 分块上传：初始化 -> 逐块上传 -> 完成；网络中断时从服务端已收到的偏移继续，
+// 刷新页面后重新选择同一文件也会续传（沿用首次上传时的处理选项）
+async function uploadInChunks(file, addSubtitles, audioMode, subtitleMode, encodingProfile) {
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    let session = null;
+    
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+        const response = await fetch(`/api/uploads/${savedId}`);
+        if (response.ok) {
+            session = await response.json();
+        } else {
+            localStorage.removeItem(resumeKey);
+        }
+    }
+    
+    if (!session) {
+        const response = await fetch('/api/uploads', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                filename: file.name,
+                size: file.size,
+                add_subtitles: addSubtitles,
+                audio_mode: audioMode,
+                subtitle_mode: subtitleMode,
+                encoding_profile: encodingProfile
+            })
+        });
+        session = await response.json();
+        if (!response.ok || !session.success) {
+            throw new Error(session.error || '上传初始化失败');
+        }
+        localStorage.setItem(resumeKey, session.upload_id);
+    }
+    
+    let offset = session.offset;
+    let retries = 0;
+    while (offset < file.size) {
+        updateUploadProgress(offset, file.size);
+        const chunk = file.slice(offset, Math.min(offset + session.chunk_size, file.size));
+        let response;
+        try {
+            response = await fetch(`/api/uploads/${session.upload_id}?offset=${offset}`, {
+                method: 'PUT',
+                headers: {
+                    'Content-Type': 'application/octet-stream',
+                },
+                body: chunk
+            });
+        } catch (error) {
+            // 网络错误：等待后以服务端已收到的偏移为准继续
+            if (++retries > UPLOAD_MAX_RETRIES) throw error;
+            await sleep(1000 * retries);
+            const serverOffset = await fetchUploadOffset(session.upload_id).catch(() => null);
+            if (serverOffset !== null) offset = serverOffset;
+            continue;
+        }
+        
+        const data = await response.json();
+        if (response.ok) {
+            offset = data.offset;
+            retries = 0;
+        } else if (response.status === 409 && data.offset !== undefined) {
+            // 偏移不一致（如上一块已部分写入），从服务端偏移继续
+            offset = data.offset;
+        } else if (response.status >= 500 && ++retries <= UPLOAD_MAX_RETRIES) {
+            await sleep(1000 * retries);
+        } else {
+            throw new Error(data.error || '分块上传失败');
+        }
+    }
+    updateUploadProgress(file.size, file.size);
+    
+    const response = await fetch(`/api/uploads/${session.upload_id}/complete`, { method: 'POST' });
+    const data = await response.json();
+    if (data.success) {
+        localStorage.removeItem(resumeKey);
+    }
+    return data;
+}
+
 // 处理YouTube URL
 function processVideoUrl() {
     const urlInput = document.getElementById('videoUrl');
     const url = urlInput.value.trim();
     const addSubtitles = document.getElementById('addSubtitles').checked;
     const audioMode = document.querySelector('input[name="audioMode"]:checked').value;
+    const subtitleMode = document.querySelector('#url input[name="subtitleMode"]:checked')?.value || 'burn';
+    const encodingProfile = document.querySelector('#url input[name="encodingProfile"]:checked')?.value || 'standard';
     
     if (!url) {
         showError('请输入YouTube视频链接');
@@ -136,7 +235,9 @@ function processVideoUrl() {
         body: JSON.stringify({
             video_url: url,
             add_subtitles: addSubtitles,
-            audio_mode: audioMode
+            audio_mode: audioMode,
+            subtitle_mode: subtitleMode,
+            encoding_profile: encodingProfile
         })
     })
     .then(response => response.json())
@@ -147,7 +248,7 @@ function processVideoUrl() {
             currentTaskId = data.task_id;
             showStatusCard();
             startStatusCheck();
-            showSuccess('视频处理已开始...');
+            showSuccess(data.queue_position > 0 ? data.message : '视频处理已开始...');
         } else {
             showError(data.error || '处理失败');
         }
@@ -171,8 +272,63 @@ function showStatusCard() {
     statusCard.classList.add('fade-in-up');
 }
 
-// 开始状态检查
+// 开始状态检查：优先使用SSE推送，浏览器不支持或连接失败时退回轮询
 function startStatusCheck() {
+    stopStatusCheck();
+    taskState = { progress: 0, message: '', steps: [] };
+    
+    if (!window.EventSource) {
+        startStatusPolling();
+        return;
+    }
+    
+    const taskId = currentTaskId;
+    const source = new EventSource(`/api/events/${taskId}`);
+    statusEventSource = source;
+    
+    source.addEventListener('progress', function(e) {
+        applyStatusDelta(JSON.parse(e.data));
+        updateStatusDisplay(taskState);
+    });
+    
+    source.addEventListener('done', function(e) {
+        stopStatusCheck();
+        applyStatusDelta(JSON.parse(e.data));
+        handleFinalStatus(taskState);
+    });
+    
+    source.onerror = function() {
+        // 连接建立前就失败（如代理不支持SSE）时改为轮询，建立后的断线由浏览器自动重连
+        if (source.readyState === EventSource.CLOSED && statusEventSource === source) {
+            console.error('进度推送连接失败，改用轮询');
+            statusEventSource = null;
+            startStatusPolling();
+        }
+    };
+}
+
+// 停止状态检查
+function stopStatusCheck() {
+    if (statusEventSource) {
+        statusEventSource.close();
+        statusEventSource = null;
+    }
+    if (statusCheckInterval) {
+        clearInterval(statusCheckInterval);
+        statusCheckInterval = null;
+    }
+}
+
+// 把增量状态合并到taskState，步骤追加到已有列表之后
+function applyStatusDelta(delta) {
+    const steps = delta.steps || [];
+    delete delta.steps;
+    Object.assign(taskState, delta);
+    taskState.steps = taskState.steps.concat(steps);
+}
+
+// 轮询状态（SSE不可用时使用），只请求新增的步骤
+function startStatusPolling() {
     if (statusCheckInterval) {
         clearInterval(statusCheckInterval);
     }
@@ -182,31 +338,41 @@ function startStatusCheck() {
 
 // 检查处理状态
 function checkStatus() {
-    if (!currentTaskId) return;
+    // 上一次请求未返回时跳过，避免重复追加步骤
+    if (!currentTaskId || statusRequestPending) return;
+    statusRequestPending = true;
     
-    fetch(`/api/status/${currentTaskId}`)
+    fetch(`/api/status/${currentTaskId}?since=${taskState.steps.length}`)
         .then(response => response.json())
         .then(data => {
-            updateStatusDisplay(data);
+            statusRequestPending = false;
+            applyStatusDelta(data);
+            updateStatusDisplay(taskState);
             
             if (data.status === 'completed' || data.status === 'error') {
-                clearInterval(statusCheckInterval);
-                statusCheckInterval = null;
-                
-                if (data.status === 'completed') {
-                    showResults(data);
-                } else {
-                    // 确保关闭加载模态框
-                    hideLoadingModal();
-                    showError(data.error || '处理失败');
-                }
+                stopStatusCheck();
+                handleFinalStatus(taskState);
             }
         })
         .catch(error => {
+            statusRequestPending = false;
             console.error('状态检查失败:', error);
         });
 }
 
+// 处理任务结束状态
+function handleFinalStatus(data) {
+    updateStatusDisplay(data);
+    
+    if (data.status === 'completed') {
+        showResults(data);
+    } else {
+        // 确保关闭加载模态框
+        hideLoadingModal();
+        showError(data.error || '处理失败');
+    }
+}
+
 // 更新状态显示
 function updateStatusDisplay(data) {
     const progressBar = document.getElementById('progressBar');
@@ -258,6 +424,10 @@ function showResults(data) {
                 <a href="/api/download/${currentTaskId}" class="btn btn-success">
                     <i class="fas fa-download me-2"></i>下载处理后的视频
                 </a>
+                ${data.subtitle_file ? `
+                <a href="/api/download/${currentTaskId}/subtitle" class="btn btn-outline-success ms-2">
+                    <i class="fas fa-closed-captioning me-2"></i>下载字幕文件
+                </a>` : ''}
             </div>
         </div>
     `;
@@ -288,6 +458,10 @@ function showResults(data) {
 
 // 显示加载模态框
 function showLoadingModal() {
+    const loadingMessage = document.getElementById('loadingMessage');
+    if (loadingMessage) {
+        loadingMessage.textContent = '请稍候，这可能需要几分钟时间...';
+    }
     const modal = new bootstrap.Modal(document.getElementById('loadingModal'));
     modal.show();
 }
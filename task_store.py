@@ -0,0 +1,407 @@
+"""
+任务状态存储
+替代进程内的processing_status字典：提供内存和SQLite（WAL模式）两种后端，
+进度更新为原子操作，已结束的任务按保留时长自动清理；SQLite后端可被多个API进程和工作进程同时读写；
+写入后唤醒等待中的订阅者，供SSE进度推送使用
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+# 已结束的任务状态
+FINISHED_STATUSES = ('completed', 'error')
+# 作为独立列存储的字段，其余字段序列化到data列
+CORE_FIELDS = ('status', 'progress', 'message')
+
+
+class TaskStore(ABC):
+    def __init__(self, ttl_seconds=None):
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get('TASK_TTL_HOURS', 72)) * 3600
+        self.ttl_seconds = ttl_seconds
+        self._last_purge = 0.0
+        # 写入计数，订阅者据此判断等待期间是否有新的写入
+        self._generation = 0
+        self._changed = threading.Condition()
+        # 跨进程写入无法通知到本进程，等待时最多间隔poll_interval秒重新读取一次；None表示只依赖本进程通知
+        self.poll_interval = None
+
+    @abstractmethod
+    def create(self, task_id, fields):
+        """新建任务，fields为初始字段"""
+
+    @abstractmethod
+    def get(self, task_id):
+        """返回任务状态字典（含steps列表），不存在返回None"""
+
+    @abstractmethod
+    def update(self, task_id, **fields):
+        """原子地合并更新任务字段"""
+
+    @abstractmethod
+    def update_if(self, task_id, predicate, **fields):
+        """predicate(当前任务状态)为真时才更新，检查与更新在同一事务内完成，返回是否已更新；
+        用于多个进程争抢同一任务（如重启后恢复中断的任务）"""
+
+    @abstractmethod
+    def set_progress(self, task_id, progress, message, step=None):
+        """原子地更新进度、消息并追加步骤"""
+
+    @abstractmethod
+    def get_progress(self, task_id, since=0):
+        """只读取状态、进度、消息和第since条之后的新步骤，不反序列化其余字段；不存在返回None"""
+
+    @abstractmethod
+    def delete(self, task_id):
+        """删除任务"""
+
+    @abstractmethod
+    def list_tasks(self, statuses=None):
+        """按状态列出任务ID"""
+
+    @abstractmethod
+    def purge_expired(self):
+        """删除超过保留时长的已结束任务，返回删除数量"""
+
+    def exists(self, task_id):
+        return self.get(task_id) is not None
+
+    def generation(self):
+        with self._changed:
+            return self._generation
+
+    def _notify(self):
+        with self._changed:
+            self._generation += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, generation, timeout):
+        """等待写入计数超过generation，最多等待timeout秒"""
+        if self.poll_interval is not None:
+            timeout = min(timeout, self.poll_interval)
+        with self._changed:
+            return self._changed.wait_for(lambda: self._generation != generation, timeout)
+
+    def maybe_purge(self, interval=600):
+        """最多每interval秒清理一次过期任务"""
+        now = time.time()
+        if self.ttl_seconds and now - self._last_purge > interval:
+            self._last_purge = now
+            try:
+                removed = self.purge_expired()
+                if removed:
+                    print(f"[任务存储] 清理过期任务: {removed}")
+            except Exception as e:
+                print(f"[任务存储] 清理过期任务失败: {e}")
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内存储，仅适用于单进程部署"""
+
+    def __init__(self, ttl_seconds=None):
+        super().__init__(ttl_seconds)
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def create(self, task_id, fields):
+        now = time.time()
+        task = {'status': 'queued', 'progress': 0, 'message': '', 'steps': []}
+        task.update(fields)
+        task['steps'] = list(task['steps'])
+        with self._lock:
+            self._tasks[task_id] = {'task': task, 'updated_at': now, 'finished_at': None}
+        self._notify()
+        self.maybe_purge()
+
+    def get(self, task_id):
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return None
+            task = dict(entry['task'])
+            task['steps'] = list(task['steps'])
+            return task
+
+    def _touch_locked(self, entry):
+        entry['updated_at'] = time.time()
+        if entry['task'].get('status') not in FINISHED_STATUSES:
+            entry['finished_at'] = None
+        elif entry['finished_at'] is None:
+            entry['finished_at'] = entry['updated_at']
+
+    def update(self, task_id, **fields):
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return
+            entry['task'].update(fields)
+            self._touch_locked(entry)
+        self._notify()
+
+    def update_if(self, task_id, predicate, **fields):
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None or not predicate(dict(entry['task'])):
+                return False
+            entry['task'].update(fields)
+            self._touch_locked(entry)
+        self._notify()
+        return True
+
+    def set_progress(self, task_id, progress, message, step=None):
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return
+            entry['task']['progress'] = progress
+            entry['task']['message'] = message
+            if step:
+                entry['task']['steps'].append(step)
+            self._touch_locked(entry)
+        self._notify()
+
+    def get_progress(self, task_id, since=0):
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return None
+            task = entry['task']
+            return {
+                'status': task.get('status'),
+                'progress': task.get('progress'),
+                'message': task.get('message'),
+                'steps': task['steps'][since:],
+                'step_count': len(task['steps']),
+            }
+
+    def delete(self, task_id):
+        with self._lock:
+            self._tasks.pop(task_id, None)
+        self._notify()
+
+    def list_tasks(self, statuses=None):
+        with self._lock:
+            return [task_id for task_id, entry in self._tasks.items()
+                    if statuses is None or entry['task'].get('status') in statuses]
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [task_id for task_id, entry in self._tasks.items()
+                       if entry['finished_at'] is not None and entry['finished_at'] < cutoff]
+            for task_id in expired:
+                del self._tasks[task_id]
+        return len(expired)
+
+
+class SQLiteTaskStore(TaskStore):
+    """SQLite存储（WAL模式），多个进程可同时读写同一数据库文件"""
+
+    def __init__(self, path=None, ttl_seconds=None):
+        super().__init__(ttl_seconds)
+        self.path = path or os.environ.get('TASK_DB_PATH', 'data/tasks.db')
+        self._local = threading.local()
+        self.poll_interval = float(os.environ.get('TASK_EVENTS_POLL_SECONDS', 0.5))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                data TEXT NOT NULL DEFAULT '{}',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+            CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks (finished_at);
+            CREATE TABLE IF NOT EXISTS task_steps (
+                task_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                step TEXT NOT NULL,
+                PRIMARY KEY (task_id, seq)
+            );
+        ''')
+
+    def _connect(self):
+        """每个线程使用独立连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, func):
+        """在写事务中执行func(conn)"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._notify()
+        return result
+
+    @staticmethod
+    def _split(fields):
+        core = {k: fields[k] for k in CORE_FIELDS if k in fields}
+        extra = {k: v for k, v in fields.items() if k not in CORE_FIELDS and k != 'steps'}
+        return core, extra
+
+    def _append_steps(self, conn, task_id, steps):
+        row = conn.execute('SELECT COALESCE(MAX(seq), -1) FROM task_steps WHERE task_id = ?', (task_id,)).fetchone()
+        seq = row[0] + 1
+        conn.executemany(
+            'INSERT INTO task_steps (task_id, seq, step) VALUES (?, ?, ?)',
+            [(task_id, seq + i, step) for i, step in enumerate(steps)]
+        )
+
+    def create(self, task_id, fields):
+        now = time.time()
+        core, extra = self._split(fields)
+        status = core.get('status', 'queued')
+
+        def write(conn):
+            conn.execute('DELETE FROM task_steps WHERE task_id = ?', (task_id,))
+            conn.execute(
+                'INSERT OR REPLACE INTO tasks (task_id, status, progress, message, data, created_at, updated_at, finished_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (task_id, status, core.get('progress', 0), core.get('message', ''),
+                 json.dumps(extra, ensure_ascii=False), now, now,
+                 now if status in FINISHED_STATUSES else None)
+            )
+            if fields.get('steps'):
+                self._append_steps(conn, task_id, fields['steps'])
+
+        self._transaction(write)
+        self.maybe_purge()
+
+    def get(self, task_id):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT status, progress, message, data FROM tasks WHERE task_id = ?', (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        task = json.loads(row[3])
+        task.update({'status': row[0], 'progress': row[1], 'message': row[2]})
+        task['steps'] = [r[0] for r in conn.execute(
+            'SELECT step FROM task_steps WHERE task_id = ? ORDER BY seq', (task_id,)
+        )]
+        return task
+
+    def update(self, task_id, **fields):
+        self._transaction(lambda conn: self._update_locked(conn, task_id, fields))
+
+    def _update_locked(self, conn, task_id, fields, predicate=None):
+        """在写事务内合并更新任务字段，任务不存在或predicate不成立时返回False"""
+        core, extra = self._split(fields)
+        row = conn.execute('SELECT status, progress, message, data FROM tasks WHERE task_id = ?', (task_id,)).fetchone()
+        if row is None:
+            return False
+        data = json.loads(row[3])
+        if predicate is not None:
+            task = dict(data)
+            task.update({'status': row[0], 'progress': row[1], 'message': row[2]})
+            if not predicate(task):
+                return False
+        data.update(extra)
+        assignments = ['data = ?', 'updated_at = ?']
+        now = time.time()
+        params = [json.dumps(data, ensure_ascii=False), now]
+        for key, value in core.items():
+            assignments.append(f'{key} = ?')
+            params.append(value)
+        if core.get('status') in FINISHED_STATUSES:
+            assignments.append('finished_at = COALESCE(finished_at, ?)')
+            params.append(now)
+        elif 'status' in core:
+            # 重新开始处理的任务不再参与过期清理
+            assignments.append('finished_at = NULL')
+        conn.execute(f'UPDATE tasks SET {", ".join(assignments)} WHERE task_id = ?', params + [task_id])
+        return True
+
+    def update_if(self, task_id, predicate, **fields):
+        return self._transaction(lambda conn: self._update_locked(conn, task_id, fields, predicate))
+
+    def set_progress(self, task_id, progress, message, step=None):
+        def write(conn):
+            cursor = conn.execute(
+                'UPDATE tasks SET progress = ?, message = ?, updated_at = ? WHERE task_id = ?',
+                (progress, message, time.time(), task_id)
+            )
+            if step and cursor.rowcount:
+                self._append_steps(conn, task_id, [step])
+
+        self._transaction(write)
+
+    def get_progress(self, task_id, since=0):
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT status, progress, message FROM tasks WHERE task_id = ?', (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        steps = [r[0] for r in conn.execute(
+            'SELECT step FROM task_steps WHERE task_id = ? AND seq >= ? ORDER BY seq', (task_id, since)
+        )]
+        return {
+            'status': row[0],
+            'progress': row[1],
+            'message': row[2],
+            'steps': steps,
+            'step_count': since + len(steps),
+        }
+
+    def delete(self, task_id):
+        def write(conn):
+            conn.execute('DELETE FROM task_steps WHERE task_id = ?', (task_id,))
+            conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+
+        self._transaction(write)
+
+    def list_tasks(self, statuses=None):
+        conn = self._connect()
+        if statuses is None:
+            rows = conn.execute('SELECT task_id FROM tasks ORDER BY created_at')
+        else:
+            placeholders = ','.join('?' * len(statuses))
+            rows = conn.execute(
+                f'SELECT task_id FROM tasks WHERE status IN ({placeholders}) ORDER BY created_at', list(statuses)
+            )
+        return [r[0] for r in rows]
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+
+        def write(conn):
+            expired = [r[0] for r in conn.execute(
+                'SELECT task_id FROM tasks WHERE finished_at IS NOT NULL AND finished_at < ?', (cutoff,)
+            )]
+            for task_id in expired:
+                conn.execute('DELETE FROM task_steps WHERE task_id = ?', (task_id,))
+                conn.execute('DELETE FROM tasks WHERE task_id = ?', (task_id,))
+            return len(expired)
+
+        return self._transaction(write)
+
+
+def create_task_store():
+    """按TASK_STORE环境变量创建存储后端：sqlite（默认，支持多进程）或memory"""
+    backend = os.environ.get('TASK_STORE', 'sqlite').lower()
+    if backend == 'memory':
+        return MemoryTaskStore()
+    return SQLiteTaskStore()
@@ -0,0 +1,155 @@
+"""
+接口测试：任务进度的增量查询、SSE推送按Last-Event-ID续传，以及恢复任务时不接管仍在处理的进程
+"""
+
+import json
+import os
+import socket
+
+import pytest
+
+import app as app_module
+import checkpoint as checkpoint_module
+from checkpoint import WORKER_ID, JobCheckpoint
+from task_store import MemoryTaskStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = MemoryTaskStore(ttl_seconds=60)
+    monkeypatch.setattr(app_module, 'task_store', store)
+    return store
+
+
+@pytest.fixture
+def client(store):
+    return app_module.app.test_client()
+
+
+def add_task(store, status, steps, **fields):
+    store.create('t1', {'status': 'processing', 'progress': 0, 'steps': []})
+    for idx, step in enumerate(steps):
+        store.set_progress('t1', idx * 10, f'消息{idx}', step)
+    store.update('t1', status=status, **fields)
+
+
+def parse_events(text):
+    """把SSE响应文本解析为[{id, event, data}]，忽略retry和心跳注释"""
+    events = []
+    for block in text.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n') if not line.startswith((':', 'retry')))
+        if 'event' in fields:
+            events.append({'id': fields.get('id'), 'event': fields['event'], 'data': json.loads(fields['data'])})
+    return events
+
+
+def test_status_since_returns_only_new_steps(client, store):
+    add_task(store, 'processing', ['下载', '识别', '翻译'])
+    status = client.get('/api/status/t1?since=2').get_json()
+    assert status['steps'] == ['翻译']
+    assert status['step_count'] == 3
+    assert 'video_url' not in status
+
+    store.update('t1', status='completed', transcript='全文')
+    status = client.get('/api/status/t1?since=3').get_json()
+    assert (status['steps'], status['transcript']) == ([], '全文')
+
+
+def test_unknown_task_returns_404(client):
+    assert client.get('/api/status/missing').status_code == 404
+    assert client.get('/api/status/missing?since=0').status_code == 404
+    assert client.get('/api/events/missing').status_code == 404
+
+
+def test_events_resume_after_last_event_id(client, store):
+    add_task(store, 'completed', ['下载', '识别', '翻译', '合成'], transcript='全文')
+    response = client.get('/api/events/t1', headers={'Last-Event-ID': '2'})
+    assert response.mimetype == 'text/event-stream'
+    [done] = parse_events(response.get_data(as_text=True))
+    assert done['event'] == 'done'
+    assert done['id'] == '4'
+    assert done['data']['steps'] == ['翻译', '合成']
+    assert done['data']['transcript'] == '全文'
+
+
+def test_progress_event_replays_steps_after_last_event_id(client, store):
+    add_task(store, 'processing', ['下载', '识别', '翻译'])
+    response = client.get('/api/events/t1', headers={'Last-Event-ID': '1'}, buffered=False)
+    try:
+        chunks = iter(response.response)
+        assert next(chunks).startswith(b'retry:')
+        [progress] = parse_events(next(chunks).decode())
+    finally:
+        response.close()
+    assert progress['event'] == 'progress'
+    assert progress['id'] == '3'
+    assert progress['data']['steps'] == ['识别', '翻译']
+    assert progress['data']['status'] == 'processing'
+
+
+def test_invalid_last_event_id_replays_everything(client, store):
+    add_task(store, 'completed', ['下载', '识别'])
+    response = client.get('/api/events/t1', headers={'Last-Event-ID': 'abc'})
+    [done] = parse_events(response.get_data(as_text=True))
+    assert done['data']['steps'] == ['下载', '识别']
+
+
+class FakeScheduler:
+    """只记录提交的任务，不实际执行"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def has_capacity(self):
+        return True
+
+    def submit(self, task_id, fn, *args):
+        self.submitted.append(task_id)
+        return 1
+
+    def position(self, task_id):
+        return None
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint_module, 'CHECKPOINT_DIR', str(tmp_path / 'checkpoints'))
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(app_module, 'job_scheduler', scheduler)
+    return scheduler
+
+
+def add_interrupted_task(store, task_id, worker):
+    store.create(task_id, {'status': 'processing', 'progress': 30, 'steps': [], 'worker': worker})
+    JobCheckpoint(task_id).save_job(kind='url', video_url='http://x', add_subtitles=True, audio_mode='synth')
+
+
+def test_resume_does_not_take_over_live_worker(client, store, scheduler):
+    host = socket.gethostname()
+    add_interrupted_task(store, 't1', f'{host}:{os.getppid()}:other')
+    assert client.post('/api/tasks/t1/resume').status_code == 409
+    assert scheduler.submitted == []
+
+    # 进程号与当前进程相同但启动随机数不同，是重启前的进程，可以接管
+    store.update('t1', worker=f'{host}:{os.getpid()}:other')
+    response = client.post('/api/tasks/t1/resume', json={'from_stage': 'asr'})
+    assert response.status_code == 200
+    assert scheduler.submitted == ['t1']
+    assert store.get('t1')['worker'] == WORKER_ID
+    assert JobCheckpoint('t1').job['refresh'][0] == 'asr'
+    # 已由本进程认领
+    assert client.post('/api/tasks/t1/resume').status_code == 409
+
+
+def test_startup_resumes_only_orphaned_jobs(store, scheduler):
+    host = socket.gethostname()
+    add_interrupted_task(store, 'live', f'{host}-other:1:abc')
+    add_interrupted_task(store, 'orphan', f'{host}:{os.getpid()}:other')
+    store.create('lost', {'status': 'processing', 'progress': 0, 'steps': [], 'worker': f'{host}:{os.getpid()}:x'})
+    JobCheckpoint('expired').save_job(kind='url')
+
+    app_module.resume_interrupted_jobs()
+    assert scheduler.submitted == ['orphan']
+    assert store.get('live')['worker'] == f'{host}-other:1:abc'
+    assert store.get('lost')['status'] == 'error'
+    assert not JobCheckpoint('expired').exists
@@ -0,0 +1,94 @@
+"""
+产物缓存测试：按输入内容哈希命中与失效、JSON产物、按总大小LRU淘汰、索引对应文件丢失
+"""
+
+import numpy as np
+
+import artifact_cache as cache_module
+from artifact_cache import ArtifactCache, file_digest
+
+
+def make_cache(tmp_path, **kwargs):
+    return ArtifactCache(root=str(tmp_path / 'artifacts'), enabled=True, **kwargs)
+
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_file_stage_hits_when_input_digest_matches(tmp_path):
+    cache = make_cache(tmp_path)
+    source = write(tmp_path / 'video.mp4', b'frames')
+    calls = []
+
+    def produce():
+        calls.append(1)
+        return write(tmp_path / 'audio.wav', b'pcm-' + open(source, 'rb').read())
+
+    dest = str(tmp_path / 'job' / 'audio')
+    path, key, hit = cache.file_stage('audio', {'source': file_digest(source)}, dest, produce)
+    assert (path, hit) == (str(tmp_path / 'audio.wav'), False)
+    path, again, hit = cache.file_stage('audio', {'source': file_digest(source)}, dest, produce)
+    assert (again, hit, len(calls)) == (key, True, 1)
+    assert path == str(tmp_path / 'job' / 'audio.wav')
+    assert open(path, 'rb').read() == b'pcm-frames'
+    assert cache.stats()['hits'] == {'audio': 1}
+
+
+def test_changed_input_misses(tmp_path):
+    cache = make_cache(tmp_path)
+    source = write(tmp_path / 'video.mp4', b'frames')
+    output = write(tmp_path / 'audio.wav', b'pcm')
+    _, first, _ = cache.file_stage('audio', {'source': file_digest(source)}, str(tmp_path / 'a'), lambda: output)
+    write(tmp_path / 'video.mp4', b'other frames')
+    _, second, hit = cache.file_stage('audio', {'source': file_digest(source)}, str(tmp_path / 'a'), lambda: output)
+    assert not hit
+    assert first != second
+    # 参数不同的同名阶段也不命中
+    assert cache.make_key('audio', {'source': 'x', 'rate': 16000}) != cache.make_key('audio', {'source': 'x'})
+
+
+def test_json_stage_roundtrip_and_refresh(tmp_path):
+    cache = make_cache(tmp_path)
+    value, key, hit = cache.json_stage('asr', {'audio': 'k'}, lambda: {'start': np.float32(1.5), 'text': '你好'})
+    assert not hit
+    value, _, hit = cache.json_stage('asr', {'audio': 'k'}, lambda: {'text': '不应调用'})
+    assert (value, hit) == ({'start': 1.5, 'text': '你好'}, True)
+    value, _, hit = cache.json_stage('asr', {'audio': 'k'}, lambda: {'text': '重新识别'}, refresh=True)
+    assert (value, hit) == ({'text': '重新识别'}, False)
+    assert cache.get_json(key, 'asr') == {'text': '重新识别'}
+
+
+def test_eviction_drops_least_recently_accessed_over_byte_limit(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, max_bytes=25)
+    clock = iter(range(100))
+    monkeypatch.setattr(cache_module.time, 'time', lambda: float(next(clock)))
+    for name in ('a', 'b'):
+        cache.put_file(name * 64, 'tts', write(tmp_path / f'{name}.wav', b'0' * 10))
+    # 访问a后，最久未访问的是b
+    assert cache.contains('a' * 64)
+    cache.put_file('c' * 64, 'tts', write(tmp_path / 'c.wav', b'0' * 10))
+    assert [cache.contains(name * 64) for name in 'abc'] == [True, False, True]
+    assert cache.stats()['bytes'] == 20
+    assert not (tmp_path / 'artifacts' / 'bb' / ('b' * 64 + '.wav')).exists()
+
+
+def test_missing_file_behind_index_row_is_a_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.make_key('merge', {'video': 'v'})
+    cache.put_file(key, 'merge', write(tmp_path / 'out.mp4', b'video'))
+    (tmp_path / 'artifacts' / key[:2] / (key + '.mp4')).unlink()
+    assert cache.get_file(key, 'merge', str(tmp_path / 'job' / 'out')) is None
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['misses'] == {'merge': 1}
+    _, _, hit = cache.file_stage('merge', {'video': 'v'}, str(tmp_path / 'job' / 'out'),
+                                 lambda: write(tmp_path / 'out.mp4', b'video'))
+    assert not hit
+
+
+def test_disabled_cache_is_a_no_op(tmp_path):
+    cache = ArtifactCache(root=str(tmp_path / 'artifacts'), enabled=False)
+    cache.put_json('k', 'asr', {'text': 'x'})
+    assert cache.get_json('k', 'asr') is None
+    assert not (tmp_path / 'artifacts').exists()
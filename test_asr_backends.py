@@ -0,0 +1,62 @@
+"""
+识别后端测试：auto按是否安装faster-whisper选择后端、未知后端报错、faster-whisper结果转换为openai-whisper结构
+"""
+
+import sys
+import types
+from types import SimpleNamespace
+
+import pytest
+
+import asr_backends as backends_module
+from asr_backends import BACKENDS, FasterWhisperBackend, get_backend
+
+
+@pytest.fixture
+def faster_whisper_installed(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'faster_whisper', types.ModuleType('faster_whisper'))
+
+
+@pytest.fixture
+def faster_whisper_missing(monkeypatch):
+    # sys.modules中为None时import抛出ImportError
+    monkeypatch.setitem(sys.modules, 'faster_whisper', None)
+
+
+def test_auto_prefers_faster_whisper_when_installed(faster_whisper_installed, monkeypatch):
+    monkeypatch.setattr(backends_module, 'ASR_BACKEND', 'auto')
+    assert get_backend().name == 'faster-whisper'
+    assert get_backend('auto') is BACKENDS['faster-whisper']
+
+
+def test_auto_falls_back_to_whisper_when_faster_whisper_missing(faster_whisper_missing, monkeypatch):
+    monkeypatch.setattr(backends_module, 'ASR_BACKEND', 'auto')
+    assert not BACKENDS['faster-whisper'].available()
+    assert get_backend().name == 'whisper'
+
+
+def test_explicit_and_unknown_backend(faster_whisper_missing):
+    # 明确指定时不检查是否安装
+    assert get_backend('faster-whisper').name == 'faster-whisper'
+    with pytest.raises(Exception, match='未知识别后端'):
+        get_backend('vosk')
+
+
+def test_faster_whisper_result_matches_whisper_structure():
+    words = [SimpleNamespace(word=' hi', start=0.0, end=0.4, probability=0.9)]
+    decoded = [
+        SimpleNamespace(seek=0, start=0.0, end=0.5, text=' hi', tokens=(1, 2), temperature=0.0, avg_logprob=-0.1,
+                        compression_ratio=1.0, no_speech_prob=0.01, words=words),
+        SimpleNamespace(seek=0, start=1.0, end=2.0, text=' there', tokens=(3,), temperature=0.0, avg_logprob=-0.2,
+                        compression_ratio=1.1, no_speech_prob=0.02, words=None),
+    ]
+    model = SimpleNamespace(transcribe=lambda audio, **options: (iter(decoded), SimpleNamespace(language='en')))
+    received = []
+    result = FasterWhisperBackend().transcribe(model, 'audio.wav', on_segment=received.append)
+    assert result['text'] == ' hi there'
+    assert result['language'] == 'en'
+    assert [segment['id'] for segment in result['segments']] == [0, 1]
+    assert result['segments'][0]['words'] == [{'word': ' hi', 'start': 0.0, 'end': 0.4, 'probability': 0.9}]
+    assert 'words' not in result['segments'][1]
+    assert received == result['segments']
+    assert FasterWhisperBackend(compute_type='float32').params() == {'name': 'faster-whisper', 'compute_type': 'float32'}
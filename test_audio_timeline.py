@@ -0,0 +1,104 @@
+"""
+配音时间轴测试：按起始时间写入、超出部分截断、按需延长与缩短、磁盘映射缓冲区与编码输出
+"""
+
+import os
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_timeline import DubTimeline
+
+SR = 1000
+
+
+@pytest.fixture(params=['memory', 'memmap'])
+def timeline(request, tmp_path, monkeypatch):
+    # 磁盘映射文件写在工作目录的temp下
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('temp')
+    memmap_seconds = 0 if request.param == 'memmap' else None
+    timeline = DubTimeline(2.0, SR, memmap_seconds=memmap_seconds)
+    yield timeline
+    timeline.close()
+
+
+def test_place_writes_at_start_and_truncates(timeline):
+    timeline.place(0.5, np.full(200, 0.5, dtype=np.float32))
+    timeline.place(1.9, np.full(300, 0.25, dtype=np.float32))
+    timeline.place(5.0, np.ones(10, dtype=np.float32))
+    buffer = np.asarray(timeline.buffer)
+    assert len(buffer) == 2 * SR
+    assert np.all(buffer[500:700] == 0.5)
+    assert np.all(buffer[:500] == 0) and np.all(buffer[700:1900] == 0)
+    assert np.all(buffer[1900:] == 0.25)
+    assert timeline.placed == 2
+
+
+def test_write_encodes_whole_timeline(timeline, tmp_path):
+    timeline.place(0.0, np.full(100, 2.0, dtype=np.float32))
+    path = str(tmp_path / 'out.wav')
+    timeline.write(path, block_seconds=0.3)
+    data, sample_rate = sf.read(path, dtype='float32')
+    assert sample_rate == SR
+    assert len(data) == 2 * SR
+    # 编码前限幅
+    assert data[:100] == pytest.approx(np.full(100, 1.0), abs=1e-3)
+
+
+def test_close_removes_memmap_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('temp')
+    timeline = DubTimeline(1.0, SR, memmap_seconds=0)
+    assert len(os.listdir('temp')) == 1
+    timeline.close()
+    assert os.listdir('temp') == []
+
+
+def test_fits_and_extend_keep_placed_audio(timeline):
+    samples = np.full(500, 0.5, dtype=np.float32)
+    timeline.place(0.0, samples)
+    assert timeline.fits(1.5, samples)
+    assert not timeline.fits(1.6, samples)
+    timeline.extend(1.0)
+    assert timeline.length == 2 * SR
+    timeline.extend(3.0)
+    assert timeline.duration == 3.0
+    timeline.place(2.6, samples)
+    buffer = np.asarray(timeline.buffer)
+    assert np.all(buffer[:500] == 0.5)
+    assert np.all(buffer[500:2600] == 0)
+    assert np.all(buffer[2600:] == 0.5)
+
+
+def test_grow_to_fit_then_truncate(timeline):
+    samples = np.full(500, 0.5, dtype=np.float32)
+    timeline.grow_to_fit(1.0, samples)
+    assert timeline.length == 2 * SR
+    # 至少延长为两倍
+    timeline.grow_to_fit(1.8, samples)
+    assert timeline.length == 4 * SR
+    timeline.place(1.8, samples)
+    timeline.grow_to_fit(7.0, samples)
+    assert timeline.length == 8 * SR
+    timeline.truncate(2.0)
+    assert timeline.duration == 2.0
+    assert np.all(np.asarray(timeline.buffer)[1800:] == 0.5)
+    # 缩短后再延长，新增部分是静音
+    timeline.extend(3.0)
+    assert np.all(np.asarray(timeline.buffer)[2000:] == 0)
+
+
+def test_unknown_duration_moves_to_memmap_when_extended(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('temp')
+    timeline = DubTimeline(0.0, SR, memmap_seconds=2.0)
+    timeline.grow_to_fit(0.0, np.full(1500, 0.5, dtype=np.float32))
+    timeline.place(0.0, np.full(1500, 0.5, dtype=np.float32))
+    assert os.listdir('temp') == []
+    timeline.extend(3.0)
+    assert isinstance(timeline.buffer, np.memmap)
+    assert np.all(timeline.buffer[:1500] == 0.5) and np.all(timeline.buffer[1500:] == 0)
+    timeline.close()
+    assert os.listdir('temp') == []
@@ -0,0 +1,130 @@
+"""
+任务检查点测试：恢复时跳过已完成阶段、从指定阶段重新处理、产物丢失后重新生成、处理进程存活判断
+"""
+
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+import checkpoint as checkpoint_module
+from artifact_cache import ArtifactCache
+from checkpoint import STAGES, WORKER_ID, JobCheckpoint, list_checkpoints, worker_alive
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ArtifactCache(root=str(tmp_path / 'artifacts'), enabled=True)
+    monkeypatch.setattr(checkpoint_module, 'artifact_cache', cache)
+    return cache
+
+
+def make_checkpoint(tmp_path):
+    return JobCheckpoint('t1', root=str(tmp_path / 'checkpoints'))
+
+
+class Producer:
+    """记录调用次数的阶段处理函数，文件阶段在tmp_path下写出产物"""
+
+    def __init__(self, tmp_path, value='结果'):
+        self.tmp_path = tmp_path
+        self.value = value
+        self.calls = 0
+
+    def json(self):
+        self.calls += 1
+        return {'text': self.value}
+
+    def file(self):
+        self.calls += 1
+        path = self.tmp_path / f'audio_{self.calls}.wav'
+        path.write_bytes(self.value.encode())
+        return str(path)
+
+
+def test_completed_stages_are_skipped_on_resume(tmp_path, cache, monkeypatch):
+    produce = Producer(tmp_path)
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.save_job(kind='url', video_url='http://x')
+    audio_path, _, hit = checkpoint.file_stage('extract', {'source': 's'}, str(tmp_path / 'extract'), produce.file)
+    assert not hit
+    checkpoint.json_stage('asr', {'audio': 'a'}, produce.json)
+
+    # 进程重启后重新读取清单；换成空的产物缓存，复用只能来自检查点
+    monkeypatch.setattr(checkpoint_module, 'artifact_cache', ArtifactCache(root=str(tmp_path / 'empty')))
+    resumed = make_checkpoint(tmp_path)
+    assert resumed.job == {'kind': 'url', 'video_url': 'http://x'}
+    assert resumed.completed_stages() == ['extract', 'asr']
+    path, _, hit = resumed.file_stage('extract', {'source': 's'}, str(tmp_path / 'extract'), produce.file)
+    assert (path, hit) == (audio_path, True)
+    value, _, hit = resumed.json_stage('asr', {'audio': 'a'}, produce.json)
+    assert (value, hit) == ({'text': '结果'}, True)
+    assert resumed.will_reuse('asr', {'audio': 'a'})
+    assert produce.calls == 2
+    assert list_checkpoints(str(tmp_path / 'checkpoints')) == ['t1']
+
+
+def test_changed_params_rerun_the_stage(tmp_path, cache):
+    produce = Producer(tmp_path)
+    checkpoint = make_checkpoint(tmp_path)
+    checkpoint.json_stage('asr', {'audio': 'a'}, produce.json)
+    assert not checkpoint.will_reuse('asr', {'audio': 'b'})
+    checkpoint.json_stage('asr', {'audio': 'b'}, produce.json)
+    assert produce.calls == 2
+
+
+def test_reset_from_invalidates_every_later_stage(tmp_path, cache):
+    produce = Producer(tmp_path)
+    checkpoint = make_checkpoint(tmp_path)
+    for stage in ('download', 'extract', 'asr', 'subtitle'):
+        checkpoint.json_stage(stage, {'n': stage}, produce.json)
+    checkpoint.reset_from('asr')
+
+    resumed = make_checkpoint(tmp_path)
+    assert resumed.completed_stages() == ['download', 'extract']
+    assert resumed.job['refresh'] == list(STAGES[STAGES.index('asr'):])
+    # 产物缓存中仍有旧结果，但重新处理的阶段不读取缓存
+    assert cache.contains(cache.make_key('asr', {'n': 'asr'}))
+    assert not resumed.will_reuse('asr', {'n': 'asr'})
+    assert resumed.will_reuse('extract', {'n': 'extract'})
+    produce.value = '新结果'
+    value, _, hit = resumed.json_stage('asr', {'n': 'asr'}, produce.json)
+    assert (value, hit) == ({'text': '新结果'}, False)
+
+    resumed.finish()
+    assert 'refresh' not in make_checkpoint(tmp_path).job
+    assert make_checkpoint(tmp_path).will_reuse('subtitle', {'n': 'subtitle'})
+
+
+def test_stage_with_deleted_output_is_recomputed(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint_module, 'artifact_cache', ArtifactCache(root=str(tmp_path / 'a'), enabled=False))
+    produce = Producer(tmp_path)
+    checkpoint = make_checkpoint(tmp_path)
+    audio_path, _, _ = checkpoint.file_stage('extract', {'source': 's'}, str(tmp_path / 'extract'), produce.file)
+    checkpoint.json_stage('asr', {'audio': 'a'}, produce.json)
+    os.remove(audio_path)
+    os.remove(checkpoint.value_path('asr'))
+
+    resumed = make_checkpoint(tmp_path)
+    assert not resumed.will_reuse('extract', {'source': 's'})
+    path, _, hit = resumed.file_stage('extract', {'source': 's'}, str(tmp_path / 'extract'), produce.file)
+    assert (hit, os.path.exists(path)) == (False, True)
+    assert resumed.json_stage('asr', {'audio': 'a'}, produce.json)[2] is False
+    assert produce.calls == 4
+
+
+def test_worker_alive():
+    host = socket.gethostname()
+    finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+    finished.wait()
+    assert worker_alive(WORKER_ID)
+    assert worker_alive(f'{host}:{os.getppid()}:other')
+    # 进程号与当前进程相同但启动随机数不同，是重启前的进程
+    assert not worker_alive(f'{host}:{os.getpid()}:other')
+    assert not worker_alive(f'{host}:{finished.pid}:other')
+    # 其他主机上的进程无法判断，不接管
+    assert worker_alive(f'{host}-other:1:abc')
+    assert not worker_alive(None)
+    assert not worker_alive('garbage')
@@ -0,0 +1,89 @@
+"""
+分块上传测试：偏移校验（409）、中断后续传、重启后继续上传与完整性哈希
+"""
+
+import hashlib
+import io
+
+import pytest
+
+from chunked_upload import ChunkedUploadManager, UploadError
+
+DATA = bytes(range(256)) * 40
+
+
+def make_manager(tmp_path):
+    return ChunkedUploadManager(root=str(tmp_path / 'parts'), max_bytes=len(DATA) * 2, chunk_bytes=4096)
+
+
+class BrokenStream(io.BytesIO):
+    """只读出一部分数据就断开的连接"""
+
+    def __init__(self, data, limit):
+        super().__init__(data[:limit])
+
+
+def test_chunks_complete_with_sha256(tmp_path):
+    manager = make_manager(tmp_path)
+    upload_id = manager.create('a.mp4', len(DATA))['upload_id']
+    offset = 0
+    while offset < len(DATA):
+        chunk = DATA[offset:offset + 4096]
+        offset = manager.write_chunk(upload_id, offset, io.BytesIO(chunk), len(chunk))
+    dest = tmp_path / 'a.mp4'
+    session, digest = manager.complete(upload_id, str(dest))
+    assert session['filename'] == 'a.mp4'
+    assert digest == hashlib.sha256(DATA).hexdigest()
+    assert dest.read_bytes() == DATA
+    with pytest.raises(UploadError) as error:
+        manager.get(upload_id)
+    assert error.value.status_code == 404
+
+
+def test_offset_mismatch_returns_409_with_current_offset(tmp_path):
+    manager = make_manager(tmp_path)
+    upload_id = manager.create('a.mp4', len(DATA))['upload_id']
+    manager.write_chunk(upload_id, 0, io.BytesIO(DATA[:1000]), 1000)
+    with pytest.raises(UploadError) as error:
+        manager.write_chunk(upload_id, 0, io.BytesIO(DATA[:1000]), 1000)
+    assert (error.value.status_code, error.value.offset) == (409, 1000)
+
+
+def test_resume_after_interrupted_chunk_and_restart(tmp_path):
+    manager = make_manager(tmp_path)
+    upload_id = manager.create('a.mp4', len(DATA))['upload_id']
+    # 连接中断，只收到一部分
+    offset = manager.write_chunk(upload_id, 0, BrokenStream(DATA, 1500), 4096)
+    assert offset == 1500
+    assert manager.get(upload_id)['offset'] == 1500
+
+    # 服务重启后由新的实例从磁盘上的已收到部分继续
+    restarted = make_manager(tmp_path)
+    while offset < len(DATA):
+        chunk = DATA[offset:offset + 4096]
+        offset = restarted.write_chunk(upload_id, offset, io.BytesIO(chunk), len(chunk))
+    _, digest = restarted.complete(upload_id, str(tmp_path / 'a.mp4'))
+    assert digest == hashlib.sha256(DATA).hexdigest()
+
+
+def test_complete_before_all_bytes_returns_409(tmp_path):
+    manager = make_manager(tmp_path)
+    upload_id = manager.create('a.mp4', len(DATA))['upload_id']
+    manager.write_chunk(upload_id, 0, io.BytesIO(DATA[:100]), 100)
+    with pytest.raises(UploadError) as error:
+        manager.complete(upload_id, str(tmp_path / 'a.mp4'))
+    assert (error.value.status_code, error.value.offset) == (409, 100)
+
+
+def test_rejects_oversize_and_invalid_ids(tmp_path):
+    manager = make_manager(tmp_path)
+    with pytest.raises(UploadError) as error:
+        manager.create('big.mp4', len(DATA) * 3)
+    assert error.value.status_code == 413
+    upload_id = manager.create('a.mp4', 10)['upload_id']
+    with pytest.raises(UploadError) as error:
+        manager.write_chunk(upload_id, 0, io.BytesIO(DATA[:20]), 20)
+    assert error.value.status_code == 413
+    with pytest.raises(UploadError) as error:
+        manager.get('../../etc/passwd')
+    assert error.value.status_code == 404
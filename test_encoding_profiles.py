@@ -0,0 +1,46 @@
+"""
+编码档位测试：按名称取档位与回退到默认档位、是否需要缩小分辨率、缩放滤镜与编码参数
+"""
+
+import pytest
+
+import encoding_profiles as profiles_module
+from encoding_profiles import (ENCODING_PROFILES, audio_encode_args, get_profile, needs_downscale, scale_filter,
+                               video_encode_args)
+
+
+def test_get_profile_by_name_and_default():
+    assert get_profile('draft')['name'] == 'draft'
+    assert get_profile()['name'] == profiles_module.ENCODING_PROFILE
+    # 返回副本，修改不影响档位表
+    get_profile('draft')['crf'] = 0
+    assert ENCODING_PROFILES['draft']['crf'] == 28
+
+
+def test_unknown_profile_falls_back_to_default(monkeypatch):
+    assert get_profile('missing') == get_profile(profiles_module.ENCODING_PROFILE)
+    monkeypatch.setattr(profiles_module, 'ENCODING_PROFILE', 'missing')
+    assert get_profile()['name'] == 'standard'
+
+
+@pytest.mark.parametrize('name, height, expected', [
+    ('draft', 1080, True),
+    ('draft', 720, False),
+    ('draft', None, False),
+    ('standard', 2160, False),
+    ('archive', 4320, False),
+])
+def test_needs_downscale(name, height, expected):
+    assert needs_downscale(get_profile(name), height) is expected
+
+
+def test_scale_filter_keeps_even_dimensions():
+    # 宽度-2按比例取偶数，高度在不超过上限时取不大于原高度的偶数
+    assert scale_filter(get_profile('draft')) == "scale=-2:'min(720,trunc(ih/2)*2)'"
+    assert scale_filter(get_profile('standard')) is None
+
+
+def test_encode_args():
+    profile = dict(get_profile('archive'), threads=2)
+    assert video_encode_args(profile) == '-c:v libx264 -preset slow -crf 18 -threads 2'
+    assert audio_encode_args(profile) == '-c:a aac -b:a 192k'
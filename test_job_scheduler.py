@@ -0,0 +1,74 @@
+"""
+任务调度器测试：有界队列的排队位置与拒绝、阶段资源池限流
+"""
+
+import threading
+import time
+
+import pytest
+
+from job_scheduler import JobScheduler, QueueFullError, StagePools
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            raise AssertionError('等待超时')
+        time.sleep(0.01)
+
+
+def test_queue_positions_and_rejection():
+    scheduler = JobScheduler(max_workers=1, max_queue=1)
+    release = threading.Event()
+    done = []
+    assert scheduler.submit('a', release.wait) == 0
+    wait_until(lambda: scheduler.stats()['running'] == 1)
+    assert scheduler.submit('b', done.append, 'b') == 1
+    assert scheduler.position('b') == 1
+    assert not scheduler.has_capacity()
+    with pytest.raises(QueueFullError) as error:
+        scheduler.submit('c', done.append, 'c')
+    assert error.value.retry_after >= 5
+    assert scheduler.stats()['rejected'] == 1
+
+    release.set()
+    wait_until(lambda: scheduler.stats()['completed'] == 2)
+    assert done == ['b']
+    assert scheduler.position('b') is None
+
+
+def test_failing_job_does_not_stop_worker():
+    scheduler = JobScheduler(max_workers=1, max_queue=2)
+    done = []
+    scheduler.submit('bad', lambda: 1 / 0)
+    scheduler.submit('good', done.append, 'good')
+    wait_until(lambda: scheduler.stats()['completed'] == 2)
+    assert done == ['good']
+
+
+def test_stage_pool_limits_concurrency():
+    pools = StagePools({'asr': 1, 'network': 2})
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def job():
+        with pools.stage('asr'):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=job) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 1
+    stats = pools.stats()
+    assert stats['asr']['completed'] == 4
+    assert stats['network']['limit'] == 2
+    assert pools.run('network', lambda x: x * 2, 21) == 42
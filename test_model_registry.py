@@ -0,0 +1,82 @@
+"""
+模型注册表测试：并发获取同一尺寸只加载一次、超出容量淘汰最久未使用的模型、加载与命中统计、预热
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from model_registry import WhisperModelRegistry
+
+
+class StubLoader:
+    """记录加载次数的模型加载函数，加载时等待一小段时间，让并发请求在加载期间到达"""
+
+    def __init__(self, delay=0.0, fail=()):
+        self.delay = delay
+        self.fail = fail
+        self.loads = []
+        self._lock = threading.Lock()
+
+    def __call__(self, size):
+        if size in self.fail:
+            raise RuntimeError(f'模型{size}不存在')
+        time.sleep(self.delay)
+        with self._lock:
+            self.loads.append(size)
+        return object()
+
+
+def test_concurrent_get_loads_model_once():
+    loader = StubLoader(delay=0.2)
+    registry = WhisperModelRegistry(default_size='base', max_models=2, loader=loader)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        models = list(executor.map(lambda _: registry.get('base'), range(8)))
+    assert loader.loads == ['base']
+    assert all(model is models[0] for model in models)
+    [info] = registry.stats()['models']
+    assert (info['loads'], info['hits']) == (1, 7)
+
+
+def test_least_recently_used_model_is_evicted_at_capacity():
+    loader = StubLoader()
+    registry = WhisperModelRegistry(default_size='base', max_models=2, loader=loader)
+    tiny = registry.get('tiny')
+    registry.get('base')
+    # 再次使用tiny后，最久未使用的是base
+    assert registry.get('tiny') is tiny
+    registry.get('small')
+    stats = registry.stats()
+    assert stats['loaded'] == ['tiny', 'small']
+    evicted = {info['size']: info for info in stats['models']}['base']
+    assert not evicted['loaded'] and 'evicted_at' in evicted
+    # 被淘汰的模型再次获取时重新加载，加载次数累加
+    registry.get('base')
+    assert loader.loads == ['tiny', 'base', 'small', 'base']
+    assert {info['size']: info['loads'] for info in registry.stats()['models']}['base'] == 2
+    assert registry.stats()['loaded'] == ['small', 'base']
+
+
+def test_stats_record_load_and_hits():
+    registry = WhisperModelRegistry(default_size='base', max_models=2, loader=StubLoader())
+    with registry.use() as model:
+        assert model is registry.get('base')
+    stats = registry.stats()
+    assert (stats['backend'], stats['default_size'], stats['max_models']) == (None, 'base', 2)
+    [info] = stats['models']
+    assert (info['size'], info['loads'], info['hits'], info['loaded']) == ('base', 1, 1, True)
+    assert info['load_seconds'] >= 0
+    # 没有parameters()的模型不统计权重
+    assert info['weight_bytes'] is None
+
+
+def test_preload_skips_failed_sizes(monkeypatch):
+    monkeypatch.setenv('WHISPER_PRELOAD_MODELS', 'tiny, missing,base')
+    loader = StubLoader(fail=('missing',))
+    registry = WhisperModelRegistry(default_size='base', max_models=3, loader=loader)
+    registry.preload()
+    assert registry.stats()['loaded'] == ['tiny', 'base']
+    with pytest.raises(RuntimeError):
+        registry.get('missing')
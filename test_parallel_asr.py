@@ -0,0 +1,100 @@
+"""
+分段并行识别测试：静音处切分、切点两侧重叠部分按词去重与按分句中点归属、下游取消时取消排队的分段
+"""
+
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+import parallel_asr as asr_module
+from parallel_asr import ChunkMerger, parallel_transcribe, plan_chunks
+from segment_stream import StreamCancelled
+
+SR = 16000
+
+
+def test_cut_lands_in_silence_without_overlap(tone, silence):
+    samples = np.concatenate([tone(9), silence(2), tone(9)])
+    chunks = plan_chunks(samples, SR, chunk_seconds=10, overlap=1.0)
+    assert len(chunks) == 2
+    cut = chunks[1]['core'][0]
+    assert 9.0 < cut < 11.0
+    assert chunks[0]['window'] == chunks[0]['core']
+    assert chunks[1]['window'] == chunks[1]['core']
+
+
+def test_cut_in_continuous_speech_overlaps_both_sides(tone):
+    chunks = plan_chunks(tone(20), SR, chunk_seconds=10, overlap=1.0)
+    cut = chunks[1]['core'][0]
+    assert chunks[0]['window'][1] == pytest.approx(cut + 1.0)
+    assert chunks[1]['window'][0] == pytest.approx(cut - 1.0)
+
+
+def word(text, start, end):
+    return {'word': text, 'start': start, 'end': end}
+
+
+def test_overlap_words_are_kept_once():
+    chunks = [{'core': (0.0, 10.0), 'window': (0.0, 11.0)},
+              {'core': (10.0, 20.0), 'window': (9.0, 20.0)}]
+    merger = ChunkMerger(chunks)
+    first = merger.add(0, {'language': 'en', 'segments': [
+        {'start': 8.0, 'end': 10.6, 'text': ' a b c', 'tokens': [1, 2, 3], 'words': [
+            word(' a', 8.0, 8.5), word(' b', 9.2, 10.05), word(' c', 10.3, 10.6)]},
+    ]})
+    # 第一段只保留起点在10秒之前的词
+    assert [segment['text'] for segment in first] == [' a b']
+    assert 'tokens' not in first[0]
+
+    # 第二段的时间相对窗口起点9秒；b的后半截与上一段重叠，c归第二段
+    second = merger.add(1, {'language': 'de', 'segments': [
+        {'start': 0.2, 'end': 1.6, 'text': ' a b c', 'tokens': [1, 2, 3], 'words': [
+            word(' a', 0.2, 0.5), word(' b', 1.0, 1.1), word(' c', 1.3, 1.6)]},
+        {'start': 2.0, 'end': 3.0, 'text': ' d', 'words': [word(' d', 2.0, 3.0)]},
+    ]})
+    assert [segment['text'] for segment in second] == [' c', ' d']
+    assert second[0]['start'] == pytest.approx(10.3)
+    result = merger.result()
+    assert result['text'] == ' a b c d'
+    assert [segment['id'] for segment in result['segments']] == [0, 1, 2]
+    assert result['language'] == 'en'
+
+
+def test_segments_without_words_follow_their_midpoint():
+    chunks = [{'core': (0.0, 10.0), 'window': (0.0, 10.0)},
+              {'core': (10.0, 20.0), 'window': (10.0, 20.0)}]
+    merger = ChunkMerger(chunks)
+    merger.add(0, {'segments': [{'start': 1.0, 'end': 3.0, 'text': ' x'}]})
+    merger.add(1, {'segments': [{'start': 0.5, 'end': 2.0, 'text': ' y'}]})
+    segments = merger.result()['segments']
+    assert [(s['text'], s['start'], s['end']) for s in segments] == [(' x', 1.0, 3.0), (' y', 10.5, 12.0)]
+
+
+class FakePool:
+    """第一段立即完成，其余分段一直排队"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, size, samples, options):
+        future = Future()
+        if not self.futures:
+            future.set_result({'language': 'en', 'segments': [{'start': 1.0, 'end': 2.0, 'text': ' a'}]})
+        self.futures.append(future)
+        return future
+
+
+def test_cancelled_stream_cancels_pending_chunks(tone, silence, monkeypatch):
+    pool = FakePool()
+    monkeypatch.setattr(asr_module, 'get_pool', lambda workers, size: pool)
+
+    def on_segment(segment):
+        raise StreamCancelled('分句流已取消')
+
+    samples = np.concatenate([tone(9), silence(2), tone(9), silence(2), tone(9)])
+    with pytest.raises(StreamCancelled):
+        parallel_transcribe(samples, SR, 'base', {'language': 'en'}, workers=2, chunk_seconds=10,
+                            on_segment=on_segment)
+    assert len(pool.futures) == 4
+    assert [future.cancelled() for future in pool.futures] == [False, True, True, True]
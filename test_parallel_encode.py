@@ -0,0 +1,98 @@
+"""
+分段并行编码测试：关键帧处分段（无关键帧、单个、不均匀、最短段长）、各段首尾相接覆盖全片、分段编码命令
+"""
+
+import pytest
+
+import parallel_encode as encode_module
+from encoding_profiles import get_profile
+from parallel_encode import chunk_command, plan_chunks, probe_keyframes
+
+
+def intervals(starts, duration):
+    """把各段起点换算为[起点, 终点)，最后一段到结尾"""
+    return list(zip(starts, starts[1:] + [duration]))
+
+
+def assert_covers(starts, duration):
+    spans = intervals(starts, duration)
+    assert spans[0][0] == 0.0
+    assert spans[-1][1] == duration
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert end == start
+    assert all(start < end for start, end in spans)
+
+
+def test_regular_keyframes_split_near_equal_points():
+    keyframes = [float(t) for t in range(0, 120, 2)]
+    starts = plan_chunks(keyframes, 120.0, 4, min_seconds=0)
+    assert starts == [0.0, 30.0, 60.0, 90.0]
+    assert_covers(starts, 120.0)
+
+
+@pytest.mark.parametrize('keyframes', [[], [0.0]])
+def test_without_usable_keyframes_encodes_one_chunk(keyframes):
+    assert plan_chunks(keyframes, 100.0, 4, min_seconds=0) == [0.0]
+
+
+def test_single_keyframe_is_used_once():
+    starts = plan_chunks([50.0], 100.0, 4, min_seconds=0)
+    assert starts == [0.0, 50.0]
+    assert_covers(starts, 100.0)
+
+
+def test_irregular_keyframes_never_repeat_or_go_backwards():
+    keyframes = [0.0, 3.0, 4.0, 41.0, 97.0]
+    # 60秒等分点最接近的关键帧仍是41秒，不重复分段
+    starts = plan_chunks(keyframes, 100.0, 5, min_seconds=0)
+    assert starts == [0.0, 4.0, 41.0, 97.0]
+    assert_covers(starts, 100.0)
+    # 限制最短段长后不再切出开头4秒和结尾3秒的短段
+    assert plan_chunks(keyframes, 100.0, 5, min_seconds=10) == [0.0, 41.0]
+
+
+def test_min_chunk_length():
+    keyframes = [0.0, 12.0, 15.0, 95.0]
+    # 最接近25秒等分点的15秒可以分段；离结尾只有5秒的95秒不能
+    assert plan_chunks(keyframes, 100.0, 4, min_seconds=10) == [0.0, 15.0]
+    assert plan_chunks(keyframes, 100.0, 4, min_seconds=20) == [0.0]
+    assert_covers(plan_chunks(keyframes, 100.0, 4, min_seconds=10), 100.0)
+
+
+def test_probe_keyframes_subtracts_start_time(monkeypatch):
+    outputs = iter([b'1.500000\n', b'1.500000,K__\n1.540000,___\n3.500000,K__\nN/A,K__\n3.500000,K__\n'])
+    monkeypatch.setattr(encode_module.subprocess, 'check_output', lambda args: next(outputs))
+    assert probe_keyframes('in.mp4') == ([0.0, 2.0], 1.5)
+
+
+@pytest.fixture
+def fps_mode(monkeypatch):
+    monkeypatch.setattr(encode_module, 'passthrough_args', lambda: '-fps_mode passthrough')
+
+
+def test_first_chunk_command(fps_mode):
+    command = chunk_command('in.mp4', 'c0.mp4', get_profile('draft'), 1.5, 0.0, 30.0, 2, 'sub.srt')
+    assert '-ss' not in command
+    assert ('-vf "setpts=PTS-1.500000/TB,trim=start=0.000000:end=29.999000,'
+            "scale=-2:'min(720,trunc(ih/2)*2)',subtitles=sub.srt,setpts=PTS-STARTPTS\"") in command
+    assert '-fps_mode passthrough' in command and '-vsync' not in command
+    assert '-threads 2' in command
+
+
+def test_last_chunk_command_seeks_to_its_keyframe(fps_mode):
+    command = chunk_command('in.mp4', 'c1.mp4', get_profile('archive'), 0.0, 30.0, None, 4)
+    assert '-copyts -ss 30.000000 -noaccurate_seek -i "in.mp4"' in command
+    assert 'trim=start=29.999000,setpts=PTS-STARTPTS"' in command
+    assert 'scale=' not in command and 'subtitles=' not in command
+
+
+def test_passthrough_falls_back_to_vsync_on_old_ffmpeg(monkeypatch):
+    class Result:
+        stdout = '-vsync            video sync method'
+
+    encode_module.passthrough_args.cache_clear()
+    monkeypatch.setattr(encode_module.subprocess, 'run', lambda *args, **kwargs: Result())
+    try:
+        assert encode_module.passthrough_args() == '-vsync passthrough'
+    finally:
+        encode_module.passthrough_args.cache_clear()
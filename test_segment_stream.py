@@ -0,0 +1,72 @@
+"""
+识别分句流测试：按数量和等待时长攒批、识别失败时抛出、下游放弃时取消识别线程
+"""
+
+import threading
+import time
+
+import pytest
+
+from segment_stream import SegmentStream, StreamCancelled
+
+
+def producer(count, delay=0.0, fail=False, log=None):
+    def produce(on_segment):
+        try:
+            for idx in range(count):
+                time.sleep(delay)
+                on_segment({'id': idx})
+        except StreamCancelled:
+            if log is not None:
+                log.append('cancelled')
+            raise
+        if fail:
+            raise ValueError('识别失败')
+        return {'segments': list(range(count))}
+    return produce
+
+
+def test_batches_respect_max_items_and_keep_order():
+    stream = SegmentStream(producer(7))
+    stream._thread.join()
+    batches = [[seg['id'] for seg in batch] for batch in stream.batches(max_items=3, max_wait=1)]
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert stream.result == {'segments': list(range(7))}
+    assert stream.count == 7
+    assert stream.first_segment_at is not None
+
+
+def test_batch_closes_after_max_wait():
+    release = threading.Event()
+
+    def produce(on_segment):
+        on_segment({'id': 0})
+        release.wait(5)
+        on_segment({'id': 1})
+
+    stream = SegmentStream(produce)
+    batches = stream.batches(max_items=10, max_wait=0.05)
+    start = time.time()
+    assert [seg['id'] for seg in next(batches)] == [0]
+    assert time.time() - start < 2
+    release.set()
+    assert [[seg['id'] for seg in batch] for batch in batches] == [[1]]
+
+
+def test_producer_error_is_raised_after_delivered_segments():
+    stream = SegmentStream(producer(2, fail=True))
+    received = []
+    with pytest.raises(ValueError):
+        for batch in stream.batches(max_items=1, max_wait=0):
+            received.extend(seg['id'] for seg in batch)
+    assert received == [0, 1]
+
+
+def test_close_cancels_producer():
+    log = []
+    stream = SegmentStream(producer(1000, delay=0.01, log=log))
+    next(stream.batches(max_items=1, max_wait=0))
+    stream.close()
+    assert log == ['cancelled']
+    assert not stream._thread.is_alive()
+    assert stream.count < 1000
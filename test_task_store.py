@@ -0,0 +1,72 @@
+"""
+任务状态存储测试：内存与SQLite两种后端行为一致
+"""
+
+import threading
+
+import pytest
+
+import task_store as store_module
+from task_store import MemoryTaskStore, SQLiteTaskStore, TaskStore
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryTaskStore(ttl_seconds=60)
+    return SQLiteTaskStore(path=str(tmp_path / 'tasks.db'), ttl_seconds=60)
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        TaskStore()
+
+
+def test_create_update_and_get(store):
+    store.create('t1', {'status': 'queued', 'progress': 0, 'steps': ['已排队'], 'video_url': 'http://x'})
+    store.update('t1', status='processing', output_file='out.mp4')
+    task = store.get('t1')
+    assert task['status'] == 'processing'
+    assert task['video_url'] == 'http://x'
+    assert task['output_file'] == 'out.mp4'
+    assert task['steps'] == ['已排队']
+    assert store.get('missing') is None
+
+
+def test_progress_returns_only_new_steps(store):
+    store.create('t1', {'status': 'processing', 'progress': 0, 'steps': []})
+    for idx in range(3):
+        store.set_progress('t1', idx * 10, f'消息{idx}', f'步骤{idx}')
+    progress = store.get_progress('t1', since=1)
+    assert progress['steps'] == ['步骤1', '步骤2']
+    assert progress['step_count'] == 3
+    assert (progress['progress'], progress['message']) == (20, '消息2')
+
+
+def test_update_if_checks_predicate(store):
+    store.create('t1', {'status': 'processing', 'progress': 0, 'steps': [], 'worker': 'a'})
+    assert not store.update_if('t1', lambda task: task.get('worker') == 'b', worker='c')
+    assert store.update_if('t1', lambda task: task.get('worker') == 'a', worker='c')
+    assert store.get('t1')['worker'] == 'c'
+    assert not store.update_if('missing', lambda task: True, worker='c')
+
+
+def test_list_and_purge_finished_tasks(store, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(store_module.time, 'time', lambda: now)
+    store.create('done', {'status': 'processing', 'progress': 0, 'steps': []})
+    store.create('running', {'status': 'processing', 'progress': 0, 'steps': []})
+    store.update('done', status='completed')
+    assert store.list_tasks(['completed']) == ['done']
+    now += 61
+    assert store.purge_expired() == 1
+    assert store.list_tasks() == ['running']
+
+
+def test_writes_wake_up_waiters(store):
+    store.create('t1', {'status': 'processing', 'progress': 0, 'steps': []})
+    generation = store.generation()
+    timer = threading.Timer(0.05, store.set_progress, ('t1', 50, '进行中', '步骤'))
+    timer.start()
+    assert store.wait_for_change(generation, timeout=5)
+    timer.join()
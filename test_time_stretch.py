@@ -0,0 +1,100 @@
+"""
+变速引擎测试：输出长度精确、音高不变、引擎选择，以及ffmpeg分句攒批时的输出顺序
+"""
+
+import numpy as np
+import pytest
+
+from time_stretch import (ENGINES, StretchBatcher, TimeStretchEngine, WsolaEngine, _atempo_chain,
+                          defer_to_batch, fit_length, select_engine, stretch_to_length)
+
+SR = 16000
+
+
+def dominant_frequency(y):
+    spectrum = np.abs(np.fft.rfft(y * np.hanning(len(y))))
+    return np.argmax(spectrum) * SR / len(y)
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        TimeStretchEngine()
+
+
+def test_fit_length_pads_or_truncates():
+    assert len(fit_length(np.ones(10), 4)) == 4
+    padded = fit_length(np.ones(3), 5)
+    assert list(padded) == [1, 1, 1, 0, 0]
+
+
+def test_atempo_chain_stays_within_filter_range():
+    assert _atempo_chain(5.0) == 'atempo=2.0,atempo=2.0,atempo=1.250000'
+    assert _atempo_chain(0.2) == 'atempo=0.5,atempo=0.5,atempo=0.800000'
+
+
+@pytest.mark.parametrize('speed', [0.7, 1.4])
+def test_wsola_keeps_length_and_pitch(speed, tone):
+    y = tone(1.0, freq=440.0)
+    target_len = int(len(y) / speed)
+    out = WsolaEngine().stretch(y, SR, target_len)
+    assert len(out) == target_len
+    assert dominant_frequency(out) == pytest.approx(440.0, abs=5)
+
+
+def test_engine_selection(tone):
+    assert select_engine(1.2, SR, SR, 'auto').name == 'wsola'
+    assert select_engine(2.5, SR, SR, 'auto').name == 'ffmpeg'
+    assert select_engine(1.2, 40 * SR, SR, 'auto').name == 'ffmpeg'
+    assert select_engine(2.5, SR, SR, 'librosa').name == 'librosa'
+    assert stretch_to_length(tone(1.0), SR, 0)[1] == 'none'
+
+
+def test_only_ffmpeg_segments_are_deferred(tone):
+    assert defer_to_batch(tone(1.0), SR, SR // 3, 'auto')
+    assert not defer_to_batch(tone(1.0), SR, SR // 2, 'auto')
+    assert not defer_to_batch(tone(1.0), SR, 0, 'auto')
+
+
+class FakeFfmpeg(TimeStretchEngine):
+    name = 'ffmpeg'
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def stretch(self, y, sr, target_len):
+        raise AssertionError('攒批的分句不应逐句调用ffmpeg')
+
+    def stretch_batch(self, items, sr):
+        if self.fail:
+            raise Exception('ffmpeg不可用')
+        self.batches.append(len(items))
+        return [np.full(target_len, len(y), dtype=np.float32) for y, target_len in items]
+
+
+def test_batcher_keeps_order_and_batches_ffmpeg(monkeypatch):
+    fake = FakeFfmpeg()
+    monkeypatch.setitem(ENGINES, 'ffmpeg', fake)
+    emitted = []
+    batcher = StretchBatcher(SR, lambda key, y: emitted.append((key, None if y is None else len(y))), batch_size=3)
+    batcher.add('a', np.zeros(5))
+    batcher.add('b', np.zeros(30), 10)
+    batcher.add('c', np.zeros(7))
+    # 前面有待变速的分句时后续分句先暂存，暂存满3个时批量处理
+    assert emitted == [('a', 5)]
+    batcher.add('d', None)
+    assert [key for key, _ in emitted] == ['a', 'b', 'c', 'd']
+    batcher.add('e', np.zeros(40), 20)
+    batcher.add('f', np.zeros(3))
+    batcher.flush()
+    assert emitted == [('a', 5), ('b', 10), ('c', 7), ('d', None), ('e', 20), ('f', 3)]
+    assert fake.batches == [1, 1]
+
+
+def test_batcher_falls_back_to_wsola(monkeypatch, tone):
+    monkeypatch.setitem(ENGINES, 'ffmpeg', FakeFfmpeg(fail=True))
+    emitted = []
+    batcher = StretchBatcher(SR, lambda key, y: emitted.append((key, len(y))))
+    batcher.add('a', tone(1.0), SR // 3)
+    batcher.flush()
+    assert emitted == [('a', SR // 3)]
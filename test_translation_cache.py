@@ -0,0 +1,65 @@
+"""
+翻译记忆缓存测试：规范化命中、语言对隔离、过期与LRU淘汰
+"""
+
+import translation_cache as cache_module
+from translation_cache import TranslationCache
+
+
+def make_cache(tmp_path, **kwargs):
+    return TranslationCache(path=str(tmp_path / 'translations.db'), enabled=True, **kwargs)
+
+
+def test_normalized_text_hits_same_entry(tmp_path):
+    """首尾空白和连续空白不同的原文命中同一条缓存"""
+    cache = make_cache(tmp_path)
+    cache.put('  Hello   world ', '你好世界')
+    assert cache.get('Hello world') == '你好世界'
+    assert cache.get('Hello\nworld') == '你好世界'
+    assert cache.get('Hello world!') is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_language_pair_and_scene_are_separate(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put('hello', '你好')
+    assert cache.get('hello', target_language='ja') is None
+    assert cache.get('hello', scene='title') is None
+    assert cache.get('hello') == '你好'
+
+
+def test_get_many_maps_duplicates_to_every_index(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many([('a', '甲'), ('b', '乙')])
+    assert cache.get_many(['a', 'c', 'b', 'a']) == {0: '甲', 2: '乙', 3: '甲'}
+
+
+def test_expired_entries_are_ignored_and_evicted(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, ttl_seconds=60)
+    now = 1000.0
+    monkeypatch.setattr(cache_module.time, 'time', lambda: now)
+    cache.put('old', '旧')
+    now += 61
+    assert cache.get('old') is None
+    assert cache.evict() == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_evict_drops_least_recently_accessed(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, max_entries=2, ttl_seconds=0)
+    clock = iter(range(100))
+    monkeypatch.setattr(cache_module.time, 'time', lambda: float(next(clock)))
+    cache.put('a', '甲')
+    cache.put('b', '乙')
+    cache.put('c', '丙')
+    # 访问a后，最久未访问的是b
+    assert cache.get('a') == '甲'
+    assert cache.evict() == 1
+    assert cache.get_many(['a', 'b', 'c']) == {0: '甲', 2: '丙'}
+
+
+def test_disabled_cache_is_a_no_op(tmp_path):
+    cache = TranslationCache(path=str(tmp_path / 'translations.db'), enabled=False)
+    cache.put('hello', '你好')
+    assert cache.get('hello') is None
+    assert not (tmp_path / 'translations.db').exists()
@@ -0,0 +1,69 @@
+"""
+VAD预处理测试：有声区间检测，以及拼接后时间轴上的分句、逐词时间戳映射回原时间轴（含接缝处的拆分）
+"""
+
+import numpy as np
+import pytest
+
+from vad import SpeechMap, detect_speech_regions, prepass
+
+SR = 16000
+
+
+def test_long_silence_is_cut_and_short_pause_kept(tone, silence):
+    samples = np.concatenate([tone(1), silence(3), tone(1), silence(0.5), tone(1), silence(2)])
+    regions = detect_speech_regions(samples, SR, threshold_db=35, min_silence=1.0, pad=0.25)
+    assert regions == pytest.approx([(0.0, 1.25), (3.75, 6.75)])
+
+
+def test_prepass_skips_compaction_when_little_silence(tone, silence):
+    mapping, stats = prepass(np.concatenate([tone(5), silence(0.05)]), SR)
+    assert mapping is None
+    assert stats['skipped_seconds'] == 0
+
+
+@pytest.fixture
+def mapping():
+    # 原时间轴10秒，有声区间0~2秒和5~7秒，拼接后共4秒，接缝在拼接后的2秒处
+    return SpeechMap([(0.0, 2.0), (5.0, 7.0)], 10.0, SR)
+
+
+def test_to_source_resolves_seam_by_side(mapping):
+    assert mapping.to_source(1.0) == pytest.approx(1.0)
+    assert mapping.to_source(3.0) == pytest.approx(6.0)
+    # 接缝上的起始时间归后一个区间，结束时间归前一个区间
+    assert mapping.to_source(2.0, 'start') == pytest.approx(5.0)
+    assert mapping.to_source(2.0, 'end') == pytest.approx(2.0)
+
+
+def test_segment_across_seam_is_split_by_words(mapping):
+    segment = {
+        'id': 0, 'start': 1.2, 'end': 2.8, 'text': ' one two three', 'tokens': [1, 2, 3],
+        'words': [
+            {'word': ' one', 'start': 1.2, 'end': 1.5},
+            # 跨接缝的词截止在所在区间的末尾
+            {'word': ' two', 'start': 1.7, 'end': 2.3},
+            {'word': ' three', 'start': 2.4, 'end': 2.8},
+        ],
+    }
+    first, second = mapping.remap_segment(segment)
+    assert first['text'] == ' one two'
+    assert (first['start'], first['end']) == pytest.approx((1.2, 2.0))
+    assert first['words'][1]['end'] == pytest.approx(2.0)
+    assert second['text'] == ' three'
+    assert (second['start'], second['end']) == pytest.approx((5.4, 5.8))
+    assert 'tokens' not in first
+
+
+def test_segment_without_words_is_remapped_whole(mapping):
+    pieces = mapping.remap_segment({'start': 2.5, 'end': 3.5, 'text': ' later'})
+    assert len(pieces) == 1
+    assert (pieces[0]['start'], pieces[0]['end']) == pytest.approx((5.5, 6.5))
+
+
+def test_compact_keeps_only_regions(mapping):
+    samples = np.arange(10 * SR, dtype=np.float32)
+    compacted = mapping.compact(samples)
+    assert len(compacted) == 4 * SR
+    assert compacted[2 * SR] == 5 * SR
+    assert mapping.stats()['skipped_seconds'] == pytest.approx(6.0)
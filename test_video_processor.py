@@ -0,0 +1,291 @@
+"""
+视频处理器测试：批量翻译的分批与回退、分句翻译结果的复用与失败重试、按ffprobe结果选择流复制或重新编码、字幕方式对应的合成参数、
+时长未知时流式配音的时间轴按需延长
+"""
+
+import json
+import os
+import subprocess
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import soundfile as sf
+from Tea.exceptions import TeaException
+
+import video_processor as vp_module
+from encoding_profiles import get_profile
+from segment_stream import SegmentStream
+from translation_cache import TranslationCache
+from video_processor import VideoProcessor
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for key in ('OPENAI_API_KEY', 'ALI_API_KEY', 'ALI_CLOUD_ACCESS_KEY_ID', 'ALI_CLOUD_ACCESS_KEY_SECRET'):
+        monkeypatch.setenv(key, 'test')
+    monkeypatch.setattr(vp_module, 'translation_cache',
+                        TranslationCache(path=str(tmp_path / 'translations.db'), enabled=True))
+    return VideoProcessor()
+
+
+def batch_body(source, skip=(), code=200):
+    translated = [{'index': key, 'code': '200', 'translated': f'译{text}'}
+                  for key, text in source.items() if key not in skip]
+    return SimpleNamespace(code=code, message='', translated_list=translated)
+
+
+def single_body(text):
+    return SimpleNamespace(code=200, message='', data=SimpleNamespace(translated=f'译{text}'))
+
+
+class FakeMTClient:
+    """按给定规则应答的机器翻译客户端，记录每次请求的原文"""
+
+    def __init__(self, batch=batch_body, single=single_body):
+        self.batch = batch
+        self.single = single
+        self.batch_requests = []
+        self.single_requests = []
+
+    def get_batch_translate_with_options(self, request, runtime):
+        source = json.loads(request.source_text)
+        self.batch_requests.append(source)
+        return SimpleNamespace(body=self.batch(source))
+
+    def translate_general_with_options(self, request, runtime):
+        self.single_requests.append(request.source_text)
+        return SimpleNamespace(body=self.single(request.source_text))
+
+
+def test_pack_respects_item_and_char_limits(processor, monkeypatch):
+    monkeypatch.setattr(vp_module, 'MT_BATCH_MAX_ITEMS', 2)
+    monkeypatch.setattr(vp_module, 'MT_BATCH_MAX_CHARS', 10)
+    assert processor._pack_translate_batches(['a', 'b', 'c']) == ([[0, 1], [2]], [])
+    assert processor._pack_translate_batches(['aaaa', 'bbbbbbb', 'cc']) == ([[0], [1, 2]], [])
+
+
+def test_pack_skips_blank_and_routes_long_items_to_single(processor, monkeypatch):
+    monkeypatch.setattr(vp_module, 'MT_BATCH_MAX_ITEM_CHARS', 5)
+    batches, singles = processor._pack_translate_batches(['ab', '', '   ', 'toolong', 'cd'])
+    assert batches == [[0, 4]]
+    assert singles == [3]
+
+
+def test_failed_batch_retries_each_sentence(processor):
+    def batch(source):
+        raise TeaException({'code': 'ServiceUnavailable', 'message': '服务不可用'})
+
+    def single(text):
+        if text == 'bad':
+            # 接口返回了错误码，没有译文
+            return SimpleNamespace(code=500, message='内部错误', data=None)
+        return single_body(text)
+
+    client = processor._mt_client = FakeMTClient(batch=batch, single=single)
+    results = processor.translate_batch(['one', 'bad', 'two'])
+    assert client.single_requests == ['one', 'bad', 'two']
+    assert results[0] == ('译one', None)
+    assert results[1][0] == 'bad' and '500' in results[1][1]
+    assert results[2] == ('译two', None)
+
+
+def test_partial_batch_fills_only_missing_indices(processor):
+    client = processor._mt_client = FakeMTClient(batch=lambda source: batch_body(source, skip={'1'}))
+    results = processor.translate_batch(['one', 'two', 'three'])
+    assert client.single_requests == ['two']
+    assert [zh for zh, _ in results] == ['译one', '译two', '译three']
+
+
+def test_batch_error_code_and_malformed_items_fall_back(processor):
+    client = processor._mt_client = FakeMTClient(batch=lambda source: SimpleNamespace(
+        code=200, message='', translated_list=[{'index': 'x', 'translated': '错'}, {'translated': '错'}]))
+    assert [zh for zh, _ in processor.translate_batch(['one', 'two'])] == ['译one', '译two']
+    assert client.single_requests == ['one', 'two']
+
+    client = processor._mt_client = FakeMTClient(batch=lambda source: batch_body(source, code=500))
+    assert [zh for zh, _ in processor.translate_batch(['three'])] == ['译three']
+    assert client.single_requests == ['three']
+
+
+def test_cache_hits_are_not_requested(processor):
+    vp_module.translation_cache.put('cached', '缓存')
+    client = processor._mt_client = FakeMTClient()
+    results = processor.translate_batch(['cached', 'fresh', 'cached'])
+    assert client.batch_requests == [{'1': 'fresh'}]
+    assert [zh for zh, _ in results] == ['缓存', '译fresh', '缓存']
+    # 译文写回缓存，再次翻译不请求接口
+    processor.translate_batch(['fresh'])
+    assert len(client.batch_requests) == 1
+
+
+def test_programming_errors_in_batch_are_not_swallowed(processor):
+    def batch(source):
+        raise AttributeError('bug')
+
+    processor._mt_client = FakeMTClient(batch=batch)
+    with pytest.raises(AttributeError):
+        processor.translate_batch(['one'])
+
+
+def whisper_result(*texts):
+    return {'segments': [{'start': idx, 'end': idx + 1, 'text': text} for idx, text in enumerate(texts)]}
+
+
+@pytest.fixture
+def batch_calls(processor, monkeypatch):
+    calls = []
+
+    def translate_batch(texts):
+        calls.append(list(texts))
+        return [(f'译{text}', None) for text in texts]
+
+    monkeypatch.setattr(processor, 'translate_batch', translate_batch)
+    return calls
+
+
+def test_translate_segments_retries_only_failed_items(processor, batch_calls):
+    items = processor.translate_segments(whisper_result('a', 'b', 'c'), 't1')
+    assert batch_calls == [['a', 'b', 'c']]
+    items[1].update(translated='b', error='超时')
+    with open(processor.translated_segments_path('t1'), 'w', encoding='utf-8') as f:
+        json.dump(items, f)
+
+    items = processor.translate_segments(whisper_result('a', 'b', 'c'), 't1')
+    assert batch_calls[1:] == [['b']]
+    assert [item['translated'] for item in items] == ['译a', '译b', '译c']
+    assert not any(item['error'] for item in items)
+    # 没有失败分句时直接复用
+    processor.translate_segments(whisper_result('a', 'b', 'c'), 't1')
+    assert len(batch_calls) == 2
+
+
+def test_translate_segments_discards_artifact_when_texts_change(processor, batch_calls):
+    processor.translate_segments(whisper_result('a', 'b'), 't1')
+    items = processor.translate_segments(whisper_result('a', 'x'), 't1')
+    assert batch_calls == [['a', 'b'], ['a', 'x']]
+    assert [item['translated'] for item in items] == ['译a', '译x']
+
+
+@pytest.mark.parametrize('content', ['[{"index": 0, "text": "a", "transl', '{"text": "a"}'])
+def test_translate_segments_retranslates_corrupt_artifact(processor, batch_calls, content):
+    with open(processor.translated_segments_path('t1'), 'w', encoding='utf-8') as f:
+        f.write(content)
+    items = processor.translate_segments(whisper_result('a', 'b'), 't1')
+    assert batch_calls == [['a', 'b']]
+    with open(processor.translated_segments_path('t1'), encoding='utf-8') as f:
+        assert json.load(f) == items
+
+
+def test_probe_streams_keeps_first_video_and_audio(processor, monkeypatch):
+    output = json.dumps({'format': {'format_name': 'matroska,webm'}, 'streams': [
+        {'codec_type': 'video', 'codec_name': 'vp9', 'height': 2160},
+        {'codec_type': 'audio', 'codec_name': 'opus'},
+        {'codec_type': 'audio', 'codec_name': 'aac'},
+    ]}).encode()
+    monkeypatch.setattr(vp_module.subprocess, 'check_output', lambda args: output)
+    streams = processor.probe_streams('in.webm')
+    assert streams['format'] == 'matroska,webm'
+    assert (streams['video']['height'], streams['audio']['codec_name']) == (2160, 'opus')
+
+    def fail(args):
+        raise subprocess.CalledProcessError(1, args)
+
+    monkeypatch.setattr(vp_module.subprocess, 'check_output', fail)
+    assert processor.probe_streams('in.webm') == {}
+
+
+@pytest.mark.parametrize('video, profile, reason', [
+    ({'codec_name': 'h264', 'height': 2160}, 'standard', None),
+    ({'codec_name': 'hevc', 'height': 1440}, 'archive', None),
+    ({'codec_name': 'h264', 'height': 1080}, 'draft', '1080p'),
+    ({'codec_name': 'vp9', 'height': 720}, 'standard', 'vp9'),
+    (None, 'standard', '无法识别'),
+])
+def test_video_encode_reason(processor, video, profile, reason):
+    streams = {'video': video} if video else {}
+    result = processor._video_encode_reason(streams, get_profile(profile))
+    if reason is None:
+        assert result is None
+    else:
+        assert reason in result
+
+
+def test_prepare_video_copies_4k_hevc_with_default_profile(processor):
+    streams = {'video': {'codec_name': 'hevc', 'height': 2160}}
+    assert processor._prepare_video('in.mkv', 't1', streams, get_profile('standard')) == (
+        'in.mkv', '-c:v copy -tag:v hvc1', {'video': 'copy', 'video_codec': 'hevc'})
+
+
+def test_prepare_video_reencodes_when_profile_downscales(processor, monkeypatch):
+    monkeypatch.setattr(processor, 'probe_duration', lambda path: 10.0)
+    streams = {'video': {'codec_name': 'h264', 'height': 1080}}
+    path, args, info = processor._prepare_video('in.mp4', 't1', streams, get_profile('draft'))
+    assert path == 'in.mp4'
+    assert "scale=-2:'min(720,trunc(ih/2)*2)'" in args and '-preset ultrafast' in args
+    assert (info['video'], info['profile']) == ('encode', 'draft')
+
+
+@pytest.mark.parametrize('codec, mode', [('aac', 'copy'), ('opus', 'copy'), ('vorbis', 'encode'), (None, 'encode')])
+def test_audio_codec_whitelist(processor, codec, mode):
+    streams = {'audio': {'codec_name': codec}} if codec else {}
+    args, info = processor._audio_codec_args(streams, get_profile('standard'))
+    assert info == {'audio': mode}
+    assert args == ('-c:a copy' if mode == 'copy' else '-c:a aac -b:a 128k')
+
+
+def test_soft_subtitle_codec_follows_container(processor):
+    assert '-map 2:s:0 -c:s mov_text' in processor._soft_subtitle_args(2, 'outputs/out.mp4')
+    assert '-map 3:s:0 -c:s srt' in processor._soft_subtitle_args(3, 'outputs/out.mkv')
+
+
+@pytest.fixture
+def merge_commands(processor, monkeypatch):
+    """记录合成命令，源视频为可流复制的h264"""
+    commands = []
+    monkeypatch.setattr(processor, 'probe_streams', lambda path: {
+        'video': {'codec_name': 'h264', 'height': 1080}, 'audio': {'codec_name': 'aac'}})
+    monkeypatch.setattr(processor, 'probe_duration', lambda path: 10.0)
+    monkeypatch.setattr(processor, '_run_merge', lambda command, *args: commands.append(command))
+    return commands
+
+
+@pytest.mark.parametrize('mode', ['burn', 'soft', 'sidecar'])
+@pytest.mark.parametrize('audio_mode', ['synth', 'original'])
+def test_subtitle_mode_merge_args(processor, merge_commands, mode, audio_mode):
+    if audio_mode == 'original':
+        processor.merge_video_audio_original('raw.mp4', 't1', 'sub.srt', mode)
+    else:
+        processor.merge_video_audio_subtitle('raw.mp4', 'new.wav', 'sub.srt', 't1', mode)
+    [command] = merge_commands
+    assert ('subtitles=sub.srt' in command) == (mode == 'burn')
+    assert (':s:0' in command) == (mode == 'soft')
+    assert ('"sub.srt"' in command) == (mode == 'soft')
+    # 不烧录字幕时视频流直接复制
+    assert ('-c:v copy' in command) == (mode != 'burn')
+    assert processor.last_merge_info['subtitle'] == mode
+
+
+def test_streaming_timeline_grows_when_duration_unknown(processor, monkeypatch):
+    sr = vp_module.TTS_SAMPLE_RATE
+    segments = [{'start': 0.0, 'end': 1.0, 'text': 'a'}, {'start': 1.5, 'end': 3.0, 'text': 'b'},
+                {'start': 3.0, 'end': 4.0, 'text': 'c'}]
+    # 第二句配音比分句长0.5秒，后半截被第三句覆盖；第三句超出最后一句结束时间的部分截断
+    lengths = {'a': 1.0, 'b': 2.0, 'c': 1.5}
+    levels = {'a': 0.1, 'b': 0.2, 'c': 0.3}
+    monkeypatch.setattr(processor, 'translate_batch', lambda texts: [(f'译{text}', None) for text in texts])
+    monkeypatch.setattr(processor, '_synthesize_segment', lambda idx, seg, zh: (
+        np.full(int(lengths[seg['text']] * sr), levels[seg['text']], dtype=np.float32), None))
+
+    def produce(on_segment):
+        for segment in segments:
+            on_segment(dict(segment))
+        return {'segments': segments}
+
+    srt_path, audio_path = processor.generate_streaming_outputs(SegmentStream(produce), 't1', total_duration=None)
+    data, sample_rate = sf.read(audio_path, dtype='float32')
+    assert (sample_rate, len(data)) == (sr, 4 * sr)
+    levels_at = [data[int(t * sr)] for t in (0.5, 1.2, 2.0, 3.2)]
+    assert levels_at == pytest.approx([0.1, 0.0, 0.2, 0.3], abs=1e-3)
+    assert open(srt_path, encoding='utf-8').read().count('译') == 3
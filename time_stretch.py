@@ -0,0 +1,226 @@
+"""
+音频变速（时长拉伸）引擎
+提供多种实现：NumPy向量化WSOLA、ffmpeg atempo（支持单进程批量处理）、librosa相位声码器（质量参考），
+并按拉伸比例和分句长度自动选择引擎
+
+所有引擎的接口统一为：把采样数组y拉伸/压缩到恰好target_len个采样点，音高不变
+"""
+
+import os
+import subprocess
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+# 引擎选择：auto/wsola/ffmpeg/librosa
+TIME_STRETCH_ENGINE = os.environ.get('TIME_STRETCH_ENGINE', 'auto')
+# ffmpeg批量处理时单个进程最多处理的分句数，避免滤镜参数过长
+FFMPEG_BATCH_SIZE = 64
+
+
+def fit_length(y, target_len):
+    """裁剪或补零到精确长度"""
+    if len(y) > target_len:
+        return y[:target_len]
+    return np.pad(y, (0, target_len - len(y)), mode='constant')
+
+
+def _atempo_chain(speed):
+    """把变速倍数拆成若干个0.5~2.0之间的atempo滤镜，兼容旧版ffmpeg"""
+    filters = []
+    while speed > 2.0:
+        filters.append('atempo=2.0')
+        speed /= 2.0
+    while speed < 0.5:
+        filters.append('atempo=0.5')
+        speed /= 0.5
+    filters.append(f'atempo={speed:.6f}')
+    return ','.join(filters)
+
+
+class TimeStretchEngine(ABC):
+    name = 'base'
+
+    @abstractmethod
+    def stretch(self, y, sr, target_len):
+        """把y拉伸/压缩到恰好target_len个采样点，返回float32采样数组"""
+
+    def stretch_batch(self, items, sr):
+        """批量拉伸，items为[(y, target_len)]，返回结果列表"""
+        return [self.stretch(y, sr, target_len) for y, target_len in items]
+
+
+class LibrosaEngine(TimeStretchEngine):
+    """librosa相位声码器，速度最慢，作为质量参考"""
+    name = 'librosa'
+
+    def stretch(self, y, sr, target_len):
+        import librosa
+        rate = len(y) / target_len
+        # 新版librosa只接受关键字参数rate
+        return fit_length(librosa.effects.time_stretch(y, rate=rate), target_len).astype(np.float32)
+
+
+class WsolaEngine(TimeStretchEngine):
+    """波形相似叠加（WSOLA），每帧在容差范围内用向量化互相关寻找最佳拼接位置"""
+    name = 'wsola'
+
+    def __init__(self, frame_seconds=0.03, tolerance_ratio=0.25, correlation_step=4):
+        self.frame_seconds = frame_seconds
+        self.tolerance_ratio = tolerance_ratio
+        self.correlation_step = correlation_step
+
+    def stretch(self, y, sr, target_len):
+        y = np.asarray(y, dtype=np.float32)
+        frame = max(64, int(sr * self.frame_seconds) // 2 * 2)
+        hop = frame // 2
+        tol = max(1, int(frame * self.tolerance_ratio))
+        speed = len(y) / target_len
+        analysis_hop = hop * speed
+        n_frames = int(np.ceil((target_len + hop) / hop)) + 1
+        # 前端补hop个0使首帧窗口完整，后端补足搜索范围
+        tail = int(n_frames * analysis_hop) + frame + 2 * tol + hop - len(y)
+        padded = np.pad(y, (hop + tol, max(0, tail) + tol))
+        window = np.hanning(frame + 1)[:frame].astype(np.float32)
+        windows = np.lib.stride_tricks.sliding_window_view(padded, frame)
+        step = self.correlation_step
+
+        out = np.zeros((n_frames - 1) * hop + frame, dtype=np.float32)
+        prev = tol
+        for k in range(n_frames):
+            if k == 0:
+                pos = tol
+            else:
+                # 上一帧的自然延续作为模板，在名义位置附近寻找最相似的帧：先隔点粗搜，再在最优点附近精搜
+                template = windows[prev + hop]
+                center = int(round(k * analysis_hop)) + tol
+                coarse = windows[center - tol:center + tol + 1:step, ::step] @ template[::step]
+                best = center - tol + int(np.argmax(coarse)) * step
+                lo = max(center - tol, best - step)
+                fine = windows[lo:min(center + tol, best + step) + 1] @ template
+                pos = lo + int(np.argmax(fine))
+            out[k * hop:k * hop + frame] += windows[pos] * window
+            prev = pos
+        return fit_length(out[hop:], target_len)
+
+
+class FfmpegAtempoEngine(TimeStretchEngine):
+    """ffmpeg atempo滤镜，通过管道传输原始采样，不落盘；批量模式下多个分句共用一个ffmpeg进程"""
+    name = 'ffmpeg'
+
+    def _run(self, samples, sr, filter_args):
+        command = [
+            'ffmpeg', '-hide_banner', '-loglevel', 'error',
+            '-f', 'f32le', '-ar', str(sr), '-ac', '1', '-i', 'pipe:0',
+        ] + filter_args + ['-f', 'f32le', '-ar', str(sr), '-ac', '1', 'pipe:1']
+        result = subprocess.run(command, input=samples.astype(np.float32).tobytes(), capture_output=True)
+        if result.returncode != 0:
+            raise Exception(f"ffmpeg atempo失败: {result.stderr.decode(errors='ignore').strip()}")
+        return np.frombuffer(result.stdout, dtype=np.float32)
+
+    def stretch(self, y, sr, target_len):
+        out = self._run(y, sr, ['-filter:a', _atempo_chain(len(y) / target_len)])
+        return fit_length(out, target_len)
+
+    def stretch_batch(self, items, sr):
+        results = []
+        for start in range(0, len(items), FFMPEG_BATCH_SIZE):
+            chunk = items[start:start + FFMPEG_BATCH_SIZE]
+            filters = []
+            offset = 0
+            for i, (y, target_len) in enumerate(chunk):
+                # 每个分句截取自己的采样区间，变速后补齐并截断到精确长度，便于按长度切分输出
+                filters.append(
+                    f'[0:a]atrim=start_sample={offset}:end_sample={offset + len(y)},asetpts=PTS-STARTPTS,'
+                    f'{_atempo_chain(len(y) / target_len)},'
+                    f'apad=whole_len={target_len},atrim=end_sample={target_len}[a{i}]'
+                )
+                offset += len(y)
+            inputs = ''.join(f'[a{i}]' for i in range(len(chunk)))
+            filters.append(f'{inputs}concat=n={len(chunk)}:v=0:a=1[out]')
+            samples = np.concatenate([y for y, _ in chunk])
+            out = self._run(samples, sr, ['-filter_complex', ';'.join(filters), '-map', '[out]'])
+            position = 0
+            for _, target_len in chunk:
+                results.append(fit_length(out[position:position + target_len], target_len))
+                position += target_len
+        return results
+
+
+ENGINES = {
+    'wsola': WsolaEngine(),
+    'ffmpeg': FfmpegAtempoEngine(),
+    'librosa': LibrosaEngine(),
+}
+
+
+def select_engine(speed, n_samples, sr, preferred=None):
+    """按变速倍数和分句长度选择引擎"""
+    preferred = preferred or TIME_STRETCH_ENGINE
+    if preferred in ENGINES:
+        return ENGINES[preferred]
+    # 极端变速比例下WSOLA的拼接痕迹明显，交给atempo级联处理
+    if speed < 0.5 or speed > 2.0:
+        return ENGINES['ffmpeg']
+    # 长分句时ffmpeg的进程启动开销可以忽略，短分句用进程内WSOLA
+    if n_samples > 30 * sr:
+        return ENGINES['ffmpeg']
+    return ENGINES['wsola']
+
+
+def stretch_to_length(y, sr, target_len, engine=None):
+    """把音频拉伸到target_len个采样点，返回(结果, 使用的引擎名)"""
+    if target_len <= 0:
+        return np.zeros(0, dtype=np.float32), 'none'
+    selected = select_engine(len(y) / target_len, len(y), sr, engine)
+    try:
+        return selected.stretch(y, sr, target_len), selected.name
+    except Exception as e:
+        if selected.name == 'wsola':
+            raise
+        print(f"[变速] {selected.name}引擎失败: {e}，改用wsola")
+        return ENGINES['wsola'].stretch(y, sr, target_len), 'wsola'
+
+
+def defer_to_batch(y, sr, target_len, engine=None):
+    """逐句处理时该分句是否会选中ffmpeg引擎；这类分句交给StretchBatcher攒批，避免每句启动一个ffmpeg进程"""
+    if target_len <= 0:
+        return False
+    return select_engine(len(y) / target_len, len(y), sr, engine).name == 'ffmpeg'
+
+
+class StretchBatcher:
+    """按分句顺序接收音频并交给emit(key, y)：已拉伸好的分句直接输出，需要ffmpeg变速的分句攒成一批，
+    由一个ffmpeg进程处理（stretch_batch）。前面还有未处理的ffmpeg分句时，后面的分句先暂存，
+    保证输出顺序与输入一致；暂存的分句最多batch_size个，不在内存中积压"""
+
+    def __init__(self, sr, emit, batch_size=FFMPEG_BATCH_SIZE):
+        self.sr = sr
+        self.emit = emit
+        self.batch_size = batch_size
+        # [(key, y, target_len)]，target_len为None表示已是最终音频
+        self._pending = []
+
+    def add(self, key, y, target_len=None):
+        if target_len is None and not self._pending:
+            self.emit(key, y)
+            return
+        self._pending.append((key, y, target_len))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """批量变速暂存的ffmpeg分句，按顺序输出全部暂存分句"""
+        pending, self._pending = self._pending, []
+        items = [(y, target_len) for _, y, target_len in pending if target_len is not None]
+        stretched = []
+        if items:
+            try:
+                stretched = ENGINES['ffmpeg'].stretch_batch(items, self.sr)
+                print(f"[变速] ffmpeg批量变速{len(items)}句")
+            except Exception as e:
+                print(f"[变速] ffmpeg批量变速失败: {e}，改用wsola")
+                stretched = [ENGINES['wsola'].stretch(y, self.sr, target_len) for y, target_len in items]
+        results = iter(stretched)
+        for key, y, target_len in pending:
+            self.emit(key, y if target_len is None else next(results))
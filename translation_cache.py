@@ -0,0 +1,203 @@
+"""
+翻译记忆缓存
+基于SQLite（WAL模式）的持久化翻译缓存，按规范化原文、语言对和场景索引，
+支持条数上限的LRU淘汰与过期时间，多线程/多进程可同时读写
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+class TranslationCache:
+    def __init__(self, path=None, max_entries=None, ttl_seconds=None, enabled=None):
+        self.path = path or os.environ.get('TRANSLATION_CACHE_PATH', 'cache/translation_cache.db')
+        self.max_entries = int(max_entries or os.environ.get('TRANSLATION_CACHE_MAX_ENTRIES', 200000))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.environ.get('TRANSLATION_CACHE_TTL_DAYS', 90)) * 86400
+        self.ttl_seconds = ttl_seconds
+        self.enabled = _env_flag('TRANSLATION_CACHE_ENABLED', 'true') if enabled is None else enabled
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        """每个线程使用独立连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        if not self._schema_ready:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS translations (
+                    key TEXT PRIMARY KEY,
+                    source_text TEXT NOT NULL,
+                    translated TEXT NOT NULL,
+                    source_language TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    scene TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_translations_accessed ON translations (accessed_at)')
+            self._schema_ready = True
+        self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def normalize(text):
+        """规范化原文：去除首尾空白并合并连续空白"""
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def make_key(self, text, source_language, target_language, scene):
+        raw = '\x1f'.join([source_language, target_language, scene, self.normalize(text)])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _count(self, hits, misses):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get_many(self, texts, source_language='en', target_language='zh', scene='general'):
+        """批量查询缓存，返回{下标: 译文}"""
+        if not self.enabled or not texts:
+            return {}
+        keys = {}
+        for idx, text in enumerate(texts):
+            keys.setdefault(self.make_key(text, source_language, target_language, scene), []).append(idx)
+        found = {}
+        now = time.time()
+        try:
+            conn = self._connect()
+            key_list = list(keys.keys())
+            # SQLite单条语句的参数个数有上限，分批查询
+            for start in range(0, len(key_list), 500):
+                chunk = key_list[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT key, translated, created_at FROM translations WHERE key IN ({placeholders})',
+                    chunk
+                ).fetchall()
+                fresh = []
+                for key, translated, created_at in rows:
+                    if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                        continue
+                    fresh.append(key)
+                    for idx in keys[key]:
+                        found[idx] = translated
+                if fresh:
+                    conn.execute(
+                        f'UPDATE translations SET accessed_at = ?, hits = hits + 1 '
+                        f'WHERE key IN ({",".join("?" * len(fresh))})',
+                        [now] + fresh
+                    )
+        except sqlite3.Error as e:
+            print(f"[翻译缓存] 查询失败: {e}")
+            return {}
+        self._count(len(found), len(texts) - len(found))
+        return found
+
+    def get(self, text, source_language='en', target_language='zh', scene='general'):
+        return self.get_many([text], source_language, target_language, scene).get(0)
+
+    def put_many(self, pairs, source_language='en', target_language='zh', scene='general'):
+        """写入多条(原文, 译文)"""
+        if not self.enabled or not pairs:
+            return
+        now = time.time()
+        rows = [
+            (self.make_key(text, source_language, target_language, scene), self.normalize(text),
+             translated, source_language, target_language, scene, now, now)
+            for text, translated in pairs
+        ]
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO translations '
+                    '(key, source_text, translated, source_language, target_language, scene, created_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            print(f"[翻译缓存] 写入失败: {e}")
+            return
+        with self._stats_lock:
+            self._puts += len(rows)
+            need_evict = self._puts >= 1000
+            if need_evict:
+                self._puts = 0
+        if need_evict:
+            self.evict()
+
+    def put(self, text, translated, source_language='en', target_language='zh', scene='general'):
+        self.put_many([(text, translated)], source_language, target_language, scene)
+
+    def evict(self):
+        """删除过期条目，超出条数上限时按最近访问时间淘汰"""
+        try:
+            conn = self._connect()
+            removed = 0
+            if self.ttl_seconds:
+                cursor = conn.execute('DELETE FROM translations WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+                removed += cursor.rowcount
+            count = conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+            if count > self.max_entries:
+                cursor = conn.execute(
+                    'DELETE FROM translations WHERE key IN '
+                    '(SELECT key FROM translations ORDER BY accessed_at ASC LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+                removed += cursor.rowcount
+            if removed:
+                print(f"[翻译缓存] 淘汰条目: {removed}")
+            return removed
+        except sqlite3.Error as e:
+            print(f"[翻译缓存] 淘汰失败: {e}")
+            return 0
+
+    def stats(self):
+        entries = None
+        if self.enabled:
+            try:
+                entries = self._connect().execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+            except sqlite3.Error:
+                pass
+        total = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'path': self.path,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else None,
+        }
+
+
+# 进程级共享实例
+translation_cache = TranslationCache()
@@ -0,0 +1,204 @@
+"""
+语音活动检测（VAD）预处理
+识别前按帧能量找出有声区间，只把有声区间拼接起来交给Whisper，跳过长段静音、无人声的空镜等；
+识别结果的分句与逐词时间戳再映射回原音频的时间轴，字幕生成和分句配音直接使用，与未做预处理时一致
+
+检测方式：
+- 每20ms一帧计算RMS能量（dBFS），以全片响度的95分位为参考，低于参考值VAD_THRESHOLD_DB的帧视为静音
+- 短于VAD_MIN_SILENCE_SECONDS的停顿保留（句间停顿对Whisper断句有用），只剪掉更长的静音段
+- 每个有声区间前后各保留VAD_PAD_SECONDS，避免切掉弱起的辅音和尾音
+能量检测只能区分有无声音，响度与人声相当的背景音乐仍会交给Whisper识别
+"""
+
+import bisect
+import os
+
+import numpy as np
+
+VAD_ENABLED = os.environ.get('VAD_ENABLED', 'true').lower() in ('1', 'true', 'yes', 'on')
+# 比全片响度参考值低多少dB的帧视为静音
+VAD_THRESHOLD_DB = float(os.environ.get('VAD_THRESHOLD_DB', 35))
+# 只剪掉长于该时长（秒）的静音段
+VAD_MIN_SILENCE_SECONDS = float(os.environ.get('VAD_MIN_SILENCE_SECONDS', 1.0))
+# 有声区间前后保留的时长（秒）
+VAD_PAD_SECONDS = float(os.environ.get('VAD_PAD_SECONDS', 0.25))
+# 帧长（秒）
+FRAME_SECONDS = 0.02
+# 低于该电平（dBFS）的帧无论参考值多少都视为静音
+SILENCE_FLOOR_DB = -60.0
+# 短于该时长（秒）的孤立声响（咔哒声等）不算有声
+MIN_SPEECH_SECONDS = 0.1
+# 可跳过的静音不足总时长的该比例时不拼接，直接识别整段音频
+MIN_SKIP_RATIO = 0.02
+
+
+def vad_params():
+    """影响识别结果的VAD参数，用于识别阶段的缓存键；关闭时返回None"""
+    if not VAD_ENABLED:
+        return None
+    return {
+        'threshold_db': VAD_THRESHOLD_DB,
+        'min_silence': VAD_MIN_SILENCE_SECONDS,
+        'pad': VAD_PAD_SECONDS,
+        'frame': FRAME_SECONDS,
+    }
+
+
+def frame_levels(samples, sample_rate):
+    """每帧的RMS电平（dBFS），末尾不足一帧的部分单独算一帧"""
+    frame_len = max(1, int(round(FRAME_SECONDS * sample_rate)))
+    count = int(np.ceil(len(samples) / frame_len))
+    padded = np.zeros(count * frame_len, dtype=np.float32)
+    padded[:len(samples)] = samples
+    power = np.mean(np.square(padded.reshape(count, frame_len), dtype=np.float64), axis=1)
+    return 10 * np.log10(np.maximum(power, 1e-12)), frame_len
+
+
+def detect_speech_regions(samples, sample_rate, threshold_db=None, min_silence=None, pad=None):
+    """返回有声区间列表[(起始秒, 结束秒)]，按时间排序且互不重叠"""
+    threshold_db = VAD_THRESHOLD_DB if threshold_db is None else threshold_db
+    min_silence = VAD_MIN_SILENCE_SECONDS if min_silence is None else min_silence
+    pad = VAD_PAD_SECONDS if pad is None else pad
+    duration = len(samples) / sample_rate
+    if len(samples) == 0:
+        return []
+    levels, frame_len = frame_levels(samples, sample_rate)
+    frame_seconds = frame_len / sample_rate
+    reference = np.percentile(levels, 95)
+    voiced = levels > max(reference - threshold_db, SILENCE_FLOOR_DB)
+
+    # 找出连续有声帧的区间
+    edges = np.diff(np.concatenate(([0], voiced.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    regions = []
+    for start, end in zip(starts * frame_seconds, ends * frame_seconds):
+        if regions and start - regions[-1][1] < min_silence:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    regions = [r for r in regions if r[1] - r[0] >= MIN_SPEECH_SECONDS]
+
+    # 前后留白后合并重叠的区间
+    padded = []
+    for start, end in regions:
+        start, end = max(0.0, start - pad), min(duration, end + pad)
+        if padded and start <= padded[-1][1]:
+            padded[-1][1] = max(padded[-1][1], end)
+        else:
+            padded.append([start, end])
+    return [(start, end) for start, end in padded]
+
+
+class SpeechMap:
+    """有声区间在原时间轴与拼接后时间轴之间的对应关系"""
+
+    def __init__(self, regions, duration, sample_rate):
+        self.sample_rate = sample_rate
+        self.duration = duration
+        # 按采样点对齐，拼接和映射使用同样的边界
+        self.regions = [(int(round(s * sample_rate)), int(round(e * sample_rate))) for s, e in regions]
+        self.offsets = []
+        offset = 0
+        for start, end in self.regions:
+            self.offsets.append(offset)
+            offset += end - start
+        self.compact_length = offset
+
+    @property
+    def speech_seconds(self):
+        return self.compact_length / self.sample_rate
+
+    def compact(self, samples):
+        """只保留有声区间的采样并首尾相接"""
+        return np.concatenate([samples[start:end] for start, end in self.regions])
+
+    def region_index(self, t, side='start'):
+        """拼接后时间t所在的区间序号；恰好落在两个区间的接缝上时，起始时间归后一个区间，结束时间归前一个区间"""
+        position = t * self.sample_rate
+        if side == 'start':
+            index = bisect.bisect_right(self.offsets, position) - 1
+        else:
+            index = bisect.bisect_left(self.offsets, position) - 1
+        return min(max(index, 0), len(self.regions) - 1)
+
+    def region_end(self, index):
+        """第index个区间在拼接后时间轴上的结束时间（秒）"""
+        start, end = self.regions[index]
+        return (self.offsets[index] + end - start) / self.sample_rate
+
+    def to_source(self, t, side='start'):
+        """把拼接后时间轴上的时间换算回原时间轴（秒）"""
+        index = self.region_index(t, side)
+        start, end = self.regions[index]
+        position = start + t * self.sample_rate - self.offsets[index]
+        return min(max(position, start), end) / self.sample_rate
+
+    def _split_segment(self, segment):
+        """跨越接缝的分句按逐词时间戳在接缝处拆开，避免一句字幕或配音横跨被剪掉的静音段"""
+        words = segment.get('words') or []
+        groups = []
+        for word in words:
+            index = self.region_index(word['start'], 'start')
+            if groups and groups[-1][0] == index:
+                groups[-1][1].append(word)
+            else:
+                groups.append((index, [word]))
+        if len(groups) <= 1:
+            return [segment]
+        pieces = []
+        for _, group in groups:
+            piece = {key: value for key, value in segment.items() if key != 'tokens'}
+            piece.update(
+                text=''.join(word['word'] for word in group),
+                start=group[0]['start'],
+                end=group[-1]['end'],
+                words=group,
+            )
+            pieces.append(piece)
+        return pieces
+
+    def remap_segment(self, segment):
+        """把一个识别分句的时间戳（含逐词时间戳）换算回原时间轴，跨越接缝时拆成多句，返回分句列表；
+        逐句处理，流式识别时每识别出一句就可以换算"""
+        pieces = self._split_segment(segment)
+        for piece in pieces:
+            for word in piece.get('words') or []:
+                # 跨接缝的词截止在所在区间的末尾
+                seam = self.region_end(self.region_index(word['start'], 'start'))
+                word['start'] = self.to_source(word['start'], 'start')
+                word['end'] = max(word['start'], self.to_source(min(word['end'], seam), 'end'))
+            end = piece['end']
+            if piece.get('words'):
+                # 拆分后的分句只在一个区间内
+                end = min(end, self.region_end(self.region_index(piece['start'], 'start')))
+            piece['start'] = self.to_source(piece['start'], 'start')
+            piece['end'] = max(piece['start'], self.to_source(end, 'end'))
+        return pieces
+
+    def stats(self):
+        skipped = max(0.0, self.duration - self.speech_seconds)
+        return {
+            'duration': round(self.duration, 3),
+            'speech_seconds': round(self.speech_seconds, 3),
+            'skipped_seconds': round(skipped, 3),
+            'skipped_ratio': round(skipped / self.duration, 4) if self.duration else 0.0,
+            'regions': [[round(s / self.sample_rate, 3), round(e / self.sample_rate, 3)] for s, e in self.regions],
+        }
+
+
+def prepass(samples, sample_rate):
+    """对整段音频做VAD，返回(SpeechMap, 统计)；可跳过的静音太少或没有检测到声音时
+    SpeechMap为None，直接识别整段音频，统计中跳过时长为0"""
+    duration = len(samples) / sample_rate
+    regions = detect_speech_regions(samples, sample_rate)
+    mapping = SpeechMap(regions, duration, sample_rate) if regions else None
+    if mapping is None or mapping.stats()['skipped_ratio'] < MIN_SKIP_RATIO:
+        reason = '未检测到有声区间' if mapping is None else '可跳过的静音太少'
+        print(f"[VAD] {reason}，识别整段音频（{duration:.1f}s）")
+        return None, SpeechMap([(0.0, duration)], duration, sample_rate).stats()
+    stats = mapping.stats()
+    print(f"[VAD] {len(regions)}个有声区间，共{stats['speech_seconds']:.1f}s，"
+          f"跳过{stats['skipped_seconds']:.1f}s（{stats['skipped_ratio']:.0%}）")
+    return mapping, stats
@@ -8,26 +8,63 @@ from alibabacloud_alimt20181012.client import Client as alimt20181012Client
 from alibabacloud_tea_openapi import models as open_api_models
 from alibabacloud_alimt20181012 import models as alimt_20181012_models
 from alibabacloud_tea_util import models as util_models
+from Tea.exceptions import RetryError, TeaException
 from http import HTTPStatus
 
 import dashscope
+import io
 import os
+import shlex
 import subprocess
 import textwrap
 import time
-import whisper  # 在文件开头加
 import json
 import re
-import tempfile
 import shutil
 from pydub import AudioSegment
 import string
 import librosa
 import soundfile as sf
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from model_registry import model_registry
+from asr_backends import get_backend
+from translation_cache import translation_cache
+from audio_timeline import DubTimeline
+from time_stretch import StretchBatcher, defer_to_batch, fit_length, stretch_to_length
+from encoding_profiles import get_profile, needs_downscale, scale_filter, video_encode_args, audio_encode_args
+from parallel_encode import should_parallel_encode, parallel_encode
+from vad import VAD_ENABLED, prepass
+from parallel_asr import should_parallel_transcribe, parallel_transcribe
 
 load_dotenv()
 
+# 阿里云批量翻译接口限制：单次最多50条，总字符数不超过8000，单条超过1000字符走单句翻译
+MT_BATCH_MAX_ITEMS = int(os.environ.get('MT_BATCH_MAX_ITEMS', 50))
+MT_BATCH_MAX_CHARS = int(os.environ.get('MT_BATCH_MAX_CHARS', 8000))
+MT_BATCH_MAX_ITEM_CHARS = int(os.environ.get('MT_BATCH_MAX_ITEM_CHARS', 1000))
+# 批量翻译接口本身的失败（服务端错误、重试耗尽、网络错误），只有这些才回退为单句翻译，代码错误直接抛出
+MT_API_ERRORS = (TeaException, RetryError, OSError)
+
+# 分句TTS合成的并发数
+TTS_CONCURRENCY = int(os.environ.get('TTS_CONCURRENCY', 4))
+# 分句TTS的采样率，分句音频以该采样率在内存中处理
+TTS_SAMPLE_RATE = int(os.environ.get('TTS_SAMPLE_RATE', 24000))
+# TTS音色
+TTS_VOICE = os.environ.get('TTS_VOICE', 'sambert-zhixiang-v1')
+# 可以不重新编码直接封装进mp4的视频/音频编码
+MP4_COPY_VIDEO_CODECS = {'h264', 'hevc', 'mpeg4', 'av1'}
+MP4_COPY_AUDIO_CODECS = {'aac', 'mp3', 'mp2', 'ac3', 'eac3', 'alac', 'flac', 'opus'}
+# Whisper模型的输入采样率，提取音频时直接输出该采样率的单声道PCM
+ASR_SAMPLE_RATE = 16000
+# 字幕方式：burn烧录进画面（必须重新编码视频），soft封装为可开关的字幕轨（视频流复制），sidecar在视频旁输出SRT文件
+SUBTITLE_MODES = ('burn', 'soft', 'sidecar')
+SUBTITLE_MODE = os.environ.get('SUBTITLE_MODE', 'burn')
+# 软字幕轨在各输出容器中使用的字幕编码
+SOFT_SUBTITLE_CODECS = {'.mp4': 'mov_text', '.mov': 'mov_text', '.mkv': 'srt'}
+
 class VideoProcessor:
     def __init__(self):
         self.openai_client = OpenAI()
@@ -41,6 +78,12 @@ class VideoProcessor:
         # 设置dashscope API key
         dashscope.api_key = self.ali_api_key
         
+        # 机器翻译客户端，首次使用时创建并复用
+        self._mt_client = None
+        
+        # 最近一次合成视频时视频/音频流的处理方式（流复制或重新编码）
+        self.last_merge_info = None
+        
         # 创建输出目录
         os.makedirs('outputs', exist_ok=True)
         os.makedirs('temp', exist_ok=True)
@@ -52,6 +95,11 @@ class VideoProcessor:
         print(f"命令执行结果: {result}")
         return result
 
+    def run_command(self, args):
+        """以参数列表执行命令，不经过shell，URL等外部输入不会被当作命令解析；命令失败时抛出CalledProcessError"""
+        print(f"执行命令: {shlex.join(args)}")
+        subprocess.run(args, check=True)
+
     def download_video(self, url, task_id):
         """下载YouTube视频"""
         print(f"开始下载视频: {url}")
@@ -71,12 +119,155 @@ class VideoProcessor:
         
         raise Exception("视频下载失败")
 
+    def _find_download(self, prefix):
+        for file in os.listdir('temp'):
+            if file.startswith(prefix) and not file.endswith('.part'):
+                return os.path.join('temp', file)
+        return None
+
+    def download_audio(self, url, task_id):
+        """只下载音频流，体积远小于视频，下载完即可开始识别；站点没有单独的音频流时退回下载完整视频"""
+        print(f"开始下载音频流: {url}")
+        try:
+            # --之后的参数一律按URL处理，以-开头的URL也不会被当作选项
+            self.run_command(['yt-dlp', '-f', 'bestaudio/best', '-o', f'temp/rawaudio_{task_id}.%(ext)s', '--', url])
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"音频下载失败: {e}") from e
+        audio_path = self._find_download(f'rawaudio_{task_id}.')
+        if audio_path is None:
+            raise Exception("音频下载失败")
+        return audio_path
+
+    def download_video_stream(self, url, task_id, audio_path):
+        """下载视频流，并与download_audio下载的音频流配对封装为temp/raw_<id>.mkv（流复制），
+        合成时与整段下载的视频一样使用，保留原音轨模式也能从中取得原音轨"""
+        print(f"开始下载视频流: {url}")
+        try:
+            self.run_command(['yt-dlp', '-f', 'bestvideo/best', '-o', f'temp/rawvideo_{task_id}.%(ext)s', '--', url])
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"视频下载失败: {e}") from e
+        video_only_path = self._find_download(f'rawvideo_{task_id}.')
+        if video_only_path is None:
+            raise Exception("视频下载失败")
+        video_duration = self.probe_duration(video_only_path)
+        audio_duration = self.probe_duration(audio_path)
+        if video_duration and audio_duration and abs(video_duration - audio_duration) > 1:
+            print(f"警告: 视频流时长{video_duration:.1f}s与音频流时长{audio_duration:.1f}s不一致")
+        output_path = f"temp/raw_{task_id}.mkv"
+        try:
+            self.run_command([
+                'ffmpeg', '-y', '-i', video_only_path, '-i', audio_path,
+                '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', output_path
+            ])
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"视频流与音频流封装失败: {e}") from e
+        finally:
+            os.remove(video_only_path)
+        return output_path
+
+    def probe_duration(self, media_path):
+        """用ffprobe获取媒体时长（秒），失败返回None"""
+        try:
+            output = subprocess.check_output([
+                'ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+                '-of', 'default=noprint_wrappers=1:nokey=1', media_path
+            ])
+            return float(output.decode().strip())
+        except Exception as e:
+            print(f"获取媒体时长失败: {e}")
+            return None
+
+    def probe_streams(self, media_path):
+        """用ffprobe获取容器格式及首个视频流、音频流的编码信息，失败返回空字典"""
+        try:
+            output = subprocess.check_output([
+                'ffprobe', '-v', 'error',
+                '-show_entries', 'stream=codec_type,codec_name,pix_fmt,height:format=format_name',
+                '-of', 'json', media_path
+            ])
+            data = json.loads(output.decode())
+        except Exception as e:
+            print(f"获取媒体流信息失败: {e}")
+            return {}
+        info = {'format': data.get('format', {}).get('format_name')}
+        for stream in data.get('streams', []):
+            kind = stream.get('codec_type')
+            if kind in ('video', 'audio') and kind not in info:
+                info[kind] = stream
+        return info
+
+    def _video_encode_reason(self, streams, profile):
+        """源视频流需要重新编码的原因：编码不能直接封装进mp4或超过档位分辨率上限；可以流复制时返回None"""
+        video = streams.get('video')
+        if video is None:
+            return '无法识别视频编码'
+        if video.get('codec_name') not in MP4_COPY_VIDEO_CODECS:
+            return f"视频编码{video.get('codec_name')}不能直接封装进mp4"
+        if needs_downscale(profile, video.get('height')):
+            return f"分辨率{video.get('height')}p超过{profile['name']}档位上限{profile['max_height']}p"
+        return None
+
+    def _prepare_video(self, video_path, task_id, streams, profile, subtitle_path=None):
+        """准备合成用的视频流：可以流复制时直接复制；需要重新编码（或传入subtitle_path烧录字幕）时按编码档位编码，
+        长视频先分段并行编码成temp/video_<id>.mp4再复制进输出；返回(视频输入路径, ffmpeg视频参数, 处理方式说明)"""
+        encode_reason = '烧录字幕' if subtitle_path else self._video_encode_reason(streams, profile)
+        if encode_reason is None:
+            codec = streams['video']['codec_name']
+            # hevc使用hvc1标签，否则部分播放器无法识别
+            args = '-c:v copy -tag:v hvc1' if codec == 'hevc' else '-c:v copy'
+            return video_path, args, {'video': 'copy', 'video_codec': codec}
+        info = {'video': 'encode', 'reason': encode_reason, 'profile': profile['name']}
+        duration = self.probe_duration(video_path)
+        if should_parallel_encode(duration):
+            encoded_path = f"temp/video_{task_id}.mp4"
+            info.update(parallel_encode(video_path, encoded_path, profile, duration, subtitle_path))
+            return encoded_path, '-c:v copy', info
+        return video_path, f'{self._video_filter_args(profile, subtitle_path)} {video_encode_args(profile)}', info
+
+    def _video_filter_args(self, profile, subtitle_path=None):
+        """重新编码时的视频滤镜：先按档位缩小分辨率，再烧录字幕（在输出分辨率上渲染字幕更省时）"""
+        filters = [f for f in (scale_filter(profile),) if f]
+        if subtitle_path:
+            filters.append(f'subtitles={subtitle_path}')
+        return f'-vf "{",".join(filters)}"' if filters else ''
+
+    def _audio_codec_args(self, streams, profile):
+        """保留原音轨时，源音频编码可以直接封装进mp4则流复制，否则按档位码率转为aac"""
+        audio = streams.get('audio')
+        if audio is not None and audio.get('codec_name') in MP4_COPY_AUDIO_CODECS:
+            return '-c:a copy', {'audio': 'copy'}
+        return audio_encode_args(profile), {'audio': 'encode'}
+
+    def _soft_subtitle_args(self, input_index, output_path):
+        """软字幕轨的ffmpeg参数，字幕文件为第input_index个输入，按输出容器选择字幕编码"""
+        codec = SOFT_SUBTITLE_CODECS.get(os.path.splitext(output_path)[1].lower(), 'mov_text')
+        return (f'-map {input_index}:s:0 -c:s {codec} -metadata:s:s:0 language=chi '
+                f'-metadata:s:s:0 title="中文字幕" -disposition:s:0 default')
+
+    def _length_args(self, media_paths, shortest=True):
+        """输出时长参数：-shortest也会把字幕轨算在内（最后一条字幕结束时截断视频），两路都流复制时也可能提前截断，
+        这些情况下改为按media_paths中最短的时长截取"""
+        if shortest:
+            return '-shortest'
+        durations = [d for d in (self.probe_duration(path) for path in media_paths) if d]
+        return f'-t {min(durations):.3f}' if durations else ''
+
+    def export_sidecar_subtitle(self, subtitle_path, output_path):
+        """把字幕文件复制到输出视频旁（同名.srt），返回字幕文件路径"""
+        sidecar_path = os.path.splitext(output_path)[0] + '.srt'
+        shutil.copyfile(subtitle_path, sidecar_path)
+        print(f"字幕文件已输出: {sidecar_path}")
+        return sidecar_path
+
     def extract_audio(self, video_path, task_id):
-        """从视频中提取音频"""
+        """从视频中提取音频，直接输出Whisper所需的16kHz单声道16位PCM（wav），
+        不经过有损编码，识别时也不需要再解码"""
         print(f"从视频提取音频: {video_path}")
         
-        audio_path = f"temp/audio_{task_id}.mp3"
-        audio_command = f"ffmpeg -i '{video_path}' -vn '{audio_path}'"
+        audio_path = f"temp/audio_{task_id}.wav"
+        audio_command = (
+            f"ffmpeg -y -i '{video_path}' -vn -ac 1 -ar {ASR_SAMPLE_RATE} -c:a pcm_s16le '{audio_path}'"
+        )
         
         self.execute_command(audio_command)
         
@@ -85,12 +276,55 @@ class VideoProcessor:
         else:
             raise Exception("音频提取失败")
 
+    def load_asr_audio(self, audio_path):
+        """16kHz单声道PCM直接读成float32数组交给Whisper（与Whisper内部用ffmpeg解码的结果相同），
+        省去Whisper再启动ffmpeg解码整条音轨；其他格式返回路径，由Whisper自行解码"""
+        try:
+            info = sf.info(audio_path)
+        except RuntimeError:
+            return audio_path
+        if info.samplerate != ASR_SAMPLE_RATE or info.channels != 1:
+            return audio_path
+        samples, _ = sf.read(audio_path, dtype='float32')
+        return samples
+
+    def transcribe(self, audio_path, on_segment=None, **options):
+        """通过ASR_BACKEND配置的后端识别；开启VAD时只识别有声区间，分句时间戳映射回原时间轴，
+        result['vad']记录有声时长与跳过的时长；（跳过静音后）仍然较长的音频分段并行识别。
+        on_segment按顺序接收已确定的分句（时间戳已换算回原时间轴），下游可以边识别边处理"""
+        audio = self.load_asr_audio(audio_path)
+        speech = None
+        vad_stats = None
+        if VAD_ENABLED and isinstance(audio, np.ndarray):
+            speech, vad_stats = prepass(audio, ASR_SAMPLE_RATE)
+            if speech is not None:
+                audio = speech.compact(audio)
+        segments = []
+
+        def collect(segment):
+            for piece in speech.remap_segment(segment) if speech is not None else [segment]:
+                piece['id'] = len(segments)
+                segments.append(piece)
+                if on_segment is not None:
+                    on_segment(piece)
+
+        if isinstance(audio, np.ndarray) and should_parallel_transcribe(len(audio) / ASR_SAMPLE_RATE):
+            result = parallel_transcribe(audio, ASR_SAMPLE_RATE, model_registry.default_size, options,
+                                         on_segment=collect)
+        else:
+            # 模型由进程级注册表共享，尺寸通过WHISPER_MODEL_SIZE配置（base/small/medium/large）
+            with model_registry.use() as model:
+                result = get_backend().transcribe(model, audio, on_segment=collect, **options)
+        result['segments'] = segments
+        if vad_stats is not None:
+            result['vad'] = vad_stats
+        return result
+
     def speech_to_text(self, audio_path):
         """使用本地 Whisper 将音频转换为文字"""
         print(f"开始本地语音识别: {audio_path}")
         try:
-            model = whisper.load_model("base")  # 你也可以用"small"、"medium"、"large"
-            result = model.transcribe(audio_path)
+            result = self.transcribe(audio_path)
             text = result["text"]
             print(f"语音识别完成，文本长度: {len(text)}")
             return text
@@ -98,12 +332,11 @@ class VideoProcessor:
             print(f"本地语音识别失败: {str(e)}")
             raise e
 
-    def speech_to_text_with_timestamps(self, audio_path):
-        """使用本地 Whisper 将音频转换为带时间戳的文字"""
+    def speech_to_text_with_timestamps(self, audio_path, on_segment=None):
+        """使用本地 Whisper 将音频转换为带时间戳的文字，on_segment逐句接收识别出的分句"""
         print(f"开始本地语音识别（带时间戳）: {audio_path}")
         try:
-            model = whisper.load_model("base")
-            result = model.transcribe(audio_path, word_timestamps=True)
+            result = self.transcribe(audio_path, on_segment=on_segment, word_timestamps=True)
             print(f"语音识别完成，文本长度: {len(result['text'])}")
             return result
         except Exception as e:
@@ -148,18 +381,33 @@ class VideoProcessor:
         
         return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
 
-    def translate_text(self, text):
-        """将英文翻译为中文"""
-        print(f"开始翻译文本，长度: {len(text)}")
-        
-        try:
+    def _get_mt_client(self):
+        """获取机器翻译客户端（同一处理器内复用）"""
+        if self._mt_client is None:
             config = open_api_models.Config(
                 access_key_id=self.ali_access_key_id,
                 access_key_secret=self.ali_access_key_secret
             )
-            config.endpoint = 'mt.cn-hangzhou.aliyuncs.com'
+            config.endpoint = os.environ.get('ALI_MT_ENDPOINT', 'mt.cn-hangzhou.aliyuncs.com')
             config.region_id = 'cn-hangzhou'
-            client = alimt20181012Client(config)
+            # 本地压测时可指定http协议
+            if os.environ.get('ALI_MT_PROTOCOL'):
+                config.protocol = os.environ['ALI_MT_PROTOCOL']
+            self._mt_client = alimt20181012Client(config)
+        return self._mt_client
+
+    def translate_text(self, text):
+        """将英文翻译为中文"""
+        print(f"开始翻译文本，长度: {len(text)}")
+        
+        # 先查翻译记忆缓存
+        cached = translation_cache.get(text)
+        if cached is not None:
+            print(f"翻译命中缓存，翻译后长度: {len(cached)}")
+            return cached
+        
+        try:
+            client = self._get_mt_client()
 
             translate_request = alimt_20181012_models.TranslateGeneralRequest(
                 format_type='text',
@@ -171,7 +419,10 @@ class VideoProcessor:
             runtime = util_models.RuntimeOptions()
 
             response = client.translate_general_with_options(translate_request, runtime)
+            if str(response.body.code) != '200' or response.body.data is None:
+                raise Exception(f"翻译接口返回错误: {response.body.code} {response.body.message}")
             translated_text = response.body.data.translated
+            translation_cache.put(text, translated_text)
             
             print(f"翻译完成，翻译后长度: {len(translated_text)}")
             return translated_text
@@ -180,6 +431,89 @@ class VideoProcessor:
             print(f"翻译失败: {str(e)}")
             raise e
 
+    def _pack_translate_batches(self, texts):
+        """按接口的条数和字符数限制把文本分批，返回(批次列表, 需单句翻译的下标)"""
+        batches = []
+        singles = []
+        current = []
+        current_chars = 0
+        for idx, text in enumerate(texts):
+            if not text.strip():
+                continue
+            if len(text) > MT_BATCH_MAX_ITEM_CHARS:
+                singles.append(idx)
+                continue
+            if current and (len(current) >= MT_BATCH_MAX_ITEMS or current_chars + len(text) > MT_BATCH_MAX_CHARS):
+                batches.append(current)
+                current = []
+                current_chars = 0
+            current.append(idx)
+            current_chars += len(text)
+        if current:
+            batches.append(current)
+        return batches, singles
+
+    def _translate_batch_request(self, texts, indices):
+        """调用批量翻译接口，返回{下标: 译文}，只包含翻译成功的条目；接口返回错误码或条目格式不对时，
+        对应条目不出现在结果中，由调用方回退为单句翻译"""
+        client = self._get_mt_client()
+        source = {str(idx): texts[idx] for idx in indices}
+        source_indices = set(indices)
+        batch_request = alimt_20181012_models.GetBatchTranslateRequest(
+            api_type='translate_standard',
+            format_type='text',
+            source_language='en',
+            target_language='zh',
+            source_text=json.dumps(source, ensure_ascii=False),
+            scene='general'
+        )
+        runtime = util_models.RuntimeOptions()
+        response = client.get_batch_translate_with_options(batch_request, runtime)
+        if str(response.body.code) != '200':
+            print(f"批量翻译接口返回错误: {response.body.code} {response.body.message}")
+            return {}
+        results = {}
+        for item in response.body.translated_list or []:
+            if str(item.get('code', '200')) != '200' or item.get('translated') is None:
+                continue
+            try:
+                index = int(item['index'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if index in source_indices:
+                results[index] = item['translated']
+        return results
+
+    def translate_batch(self, texts):
+        """批量翻译多句文本，返回与输入等长的[(译文, 错误信息)]列表；批量失败的条目回退为单句翻译"""
+        results = [(text, None) for text in texts]
+        # 命中翻译记忆缓存的分句不再请求接口
+        cached = translation_cache.get_many(texts)
+        for idx, translated in cached.items():
+            results[idx] = (translated, None)
+        missing = [text if idx not in cached else '' for idx, text in enumerate(texts)]
+        batches, singles = self._pack_translate_batches(missing)
+        print(f"开始批量翻译，共{len(texts)}句，命中缓存{len(cached)}句，{len(batches)}个批次，{len(singles)}句单独翻译")
+        for indices in batches:
+            try:
+                translated = self._translate_batch_request(texts, indices)
+            except MT_API_ERRORS as e:
+                print(f"批量翻译失败，回退为单句翻译: {str(e)}")
+                translated = {}
+            translation_cache.put_many([(texts[idx], zh) for idx, zh in translated.items()])
+            for idx in indices:
+                if idx in translated:
+                    results[idx] = (translated[idx], None)
+                else:
+                    singles.append(idx)
+        for idx in sorted(singles):
+            try:
+                results[idx] = (self.translate_text(texts[idx]), None)
+            except Exception as e:
+                # 单句失败只影响这一句，保留原文并记录错误
+                results[idx] = (texts[idx], str(e))
+        return results
+
     def optimize_text(self, text):
         """使用通义千问优化中文文案"""
         print(f"开始优化文案，长度: {len(text)}")
@@ -208,7 +542,7 @@ class VideoProcessor:
         
         try:
             result = SpeechSynthesizer.call(
-                model='sambert-zhixiang-v1',
+                model=TTS_VOICE,
                 text=text,
                 sample_rate=48000
             )
@@ -227,71 +561,96 @@ class VideoProcessor:
             print(f"语音生成失败: {str(e)}")
             raise e
 
-    def merge_video_audio_subtitle(self, video_path, audio_path, subtitle_path, task_id):
-        """合并视频、音频和字幕，只保留新音轨"""
+    def _run_merge(self, merge_command, output_path, video_input, video_path):
+        print(f"视频流处理方式: {self.last_merge_info}")
+        self.execute_command(merge_command)
+        # 分段并行编码的中间结果已复制进输出
+        if video_input != video_path and os.path.exists(video_input):
+            os.remove(video_input)
+        if os.path.exists(output_path):
+            print(f"视频合并完成: {output_path}")
+            return output_path
+        raise Exception("视频合并失败，输出文件不存在")
+
+    def merge_video_audio_subtitle(self, video_path, audio_path, subtitle_path, task_id, subtitle_mode='burn',
+                                   encoding_profile=None):
+        """合并视频、音频和字幕，只保留新音轨；subtitle_mode为soft时字幕作为字幕轨封装，视频流可以直接复制，
+        burn时烧录字幕必须重新编码视频，sidecar时字幕不进入视频（由export_sidecar_subtitle输出到视频旁）"""
         print(f"开始合并视频、音频和字幕")
         print(f"视频文件: {video_path}")
         print(f"音频文件: {audio_path}")
-        print(f"字幕文件: {subtitle_path}")
+        print(f"字幕文件: {subtitle_path}，方式: {subtitle_mode}")
         try:
             output_path = f"outputs/output_{task_id}.mp4"
-            # 只保留视频和新音轨
+            profile = get_profile(encoding_profile)
+            soft = subtitle_mode == 'soft'
+            video_input, video_args, info = self._prepare_video(
+                video_path, task_id, self.probe_streams(video_path), profile,
+                subtitle_path if subtitle_mode == 'burn' else None
+            )
+            subtitle_input = f'-i "{subtitle_path}" ' if soft else ''
+            subtitle_args = f'{self._soft_subtitle_args(2, output_path)} ' if soft else ''
             merge_command = (
-                f'ffmpeg -y -i "{video_path}" -i "{audio_path}" '
-                f'-map 0:v:0 -map 1:a:0 -vf subtitles="{subtitle_path}" '
-                f'-c:v libx264 -c:a aac -shortest "{output_path}"'
+                f'ffmpeg -y -i "{video_input}" -i "{audio_path}" {subtitle_input}'
+                f'-map 0:v:0 -map 1:a:0 {subtitle_args}{video_args} {audio_encode_args(profile)} '
+                f'{self._length_args([video_path, audio_path], not soft)} "{output_path}"'
             )
-            self.execute_command(merge_command)
-            if os.path.exists(output_path):
-                print(f"视频合并完成: {output_path}")
-                return output_path
-            else:
-                raise Exception("视频合并失败，输出文件不存在")
+            self.last_merge_info = dict(info, audio='encode', subtitle=subtitle_mode)
+            return self._run_merge(merge_command, output_path, video_input, video_path)
         except Exception as e:
             print(f"视频合并失败: {str(e)}")
             raise e
 
-    def merge_video_audio(self, video_path, audio_path, task_id):
-        """合并视频和音频（只保留新音轨）"""
+    def merge_video_audio(self, video_path, audio_path, task_id, encoding_profile=None):
+        """合并视频和音频（只保留新音轨），视频编码兼容时直接流复制，不重新编码"""
         print(f"开始合并视频和音频")
         print(f"视频文件: {video_path}")
         print(f"音频文件: {audio_path}")
         try:
             output_path = f"outputs/output_{task_id}.mp4"
+            profile = get_profile(encoding_profile)
+            video_input, video_args, info = self._prepare_video(
+                video_path, task_id, self.probe_streams(video_path), profile
+            )
             merge_command = (
-                f'ffmpeg -y -i "{video_path}" -i "{audio_path}" '
-                f'-map 0:v:0 -map 1:a:0 -c:v libx264 -c:a aac -shortest "{output_path}"'
+                f'ffmpeg -y -i "{video_input}" -i "{audio_path}" '
+                f'-map 0:v:0 -map 1:a:0 {video_args} {audio_encode_args(profile)} -shortest "{output_path}"'
             )
-            self.execute_command(merge_command)
-            if os.path.exists(output_path):
-                print(f"视频合并完成: {output_path}")
-                return output_path
-            else:
-                raise Exception("视频合并失败，输出文件不存在")
+            self.last_merge_info = dict(info, audio='encode')
+            return self._run_merge(merge_command, output_path, video_input, video_path)
         except Exception as e:
             print(f"视频合并失败: {str(e)}")
             raise e
 
-    def merge_video_audio_original(self, video_path, task_id, subtitle_path=None):
-        """只用原音轨合成视频，可选带字幕"""
-        print(f"开始合并视频和原音轨，字幕: {subtitle_path}")
+    def merge_video_audio_original(self, video_path, task_id, subtitle_path=None, subtitle_mode='burn',
+                                   encoding_profile=None):
+        """只用原音轨合成视频，可选带字幕（烧录或封装为字幕轨）"""
+        print(f"开始合并视频和原音轨，字幕: {subtitle_path}，方式: {subtitle_mode}")
         output_path = f"outputs/output_{task_id}.mp4"
         try:
+            profile = get_profile(encoding_profile)
+            streams = self.probe_streams(video_path)
+            audio_args, audio_info = self._audio_codec_args(streams, profile)
+            soft = bool(subtitle_path) and subtitle_mode == 'soft'
+            video_input, video_args, info = self._prepare_video(
+                video_path, task_id, streams, profile, subtitle_path if subtitle_mode == 'burn' else None
+            )
+            # 视频经过分段并行编码时，原音轨仍从源文件读取；音视频来自同一源文件，按源文件时长截取
+            inputs = [video_input] if video_input == video_path else [video_input, video_path]
+            audio_map = f'{len(inputs) - 1}:a:0?'
+            subtitle_args = ''
             if subtitle_path:
-                merge_command = (
-                    f'ffmpeg -y -i "{video_path}" -vf subtitles="{subtitle_path}" '
-                    f'-c:v libx264 -c:a copy -shortest "{output_path}"'
-                )
-            else:
-                merge_command = (
-                    f'ffmpeg -y -i "{video_path}" -c:v libx264 -c:a copy -shortest "{output_path}"'
-                )
-            self.execute_command(merge_command)
-            if os.path.exists(output_path):
-                print(f"视频合并完成: {output_path}")
-                return output_path
-            else:
-                raise Exception("视频合并失败，输出文件不存在")
+                audio_info['subtitle'] = subtitle_mode
+            if soft:
+                inputs.append(subtitle_path)
+                subtitle_args = f'{self._soft_subtitle_args(len(inputs) - 1, output_path)} '
+            input_args = ''.join(f'-i "{path}" ' for path in inputs)
+            merge_command = (
+                f'ffmpeg -y {input_args}-map 0:v:0 -map {audio_map} {subtitle_args}'
+                f'{video_args} {audio_args} {self._length_args([video_path], False)} "{output_path}"'
+            )
+            self.last_merge_info = dict(info, **audio_info)
+            return self._run_merge(merge_command, output_path, video_input, video_path)
         except Exception as e:
             print(f"视频合并失败: {str(e)}")
             raise e
@@ -301,9 +660,13 @@ class VideoProcessor:
         try:
             temp_files = [
                 f"temp/raw_{task_id}.*",
-                f"temp/audio_{task_id}.mp3",
-                f"temp/new_audio_{task_id}.mp3",
-                f"temp/subtitle_{task_id}.srt"
+                f"temp/rawaudio_{task_id}.*",
+                f"temp/rawvideo_{task_id}.*",
+                f"temp/audio_{task_id}.*",
+                f"temp/new_audio_{task_id}.*",
+                f"temp/video_{task_id}.mp4",
+                f"temp/subtitle_{task_id}.srt",
+                f"temp/segments_zh_{task_id}.json"
             ]
             
             for pattern in temp_files:
@@ -325,116 +688,279 @@ class VideoProcessor:
         table = str.maketrans('', '', all_punc)
         return text.translate(table)
 
+    def translated_segments_path(self, task_id):
+        """分句翻译结果文件路径"""
+        return f"temp/segments_zh_{task_id}.json"
+
+    def translate_segments(self, whisper_result, task_id):
+        """逐句翻译Whisper分句，结果按任务落盘，字幕和配音共用；失败的分句单独记录，再次调用时只重试失败分句"""
+        segments = whisper_result['segments']
+        artifact_path = self.translated_segments_path(task_id)
+        items = None
+        if os.path.exists(artifact_path):
+            try:
+                with open(artifact_path, 'r', encoding='utf-8') as f:
+                    items = json.load(f)
+                # 分句与当前识别结果不一致时作废
+                if [item['text'] for item in items] != [seg['text'] for seg in segments]:
+                    items = None
+            except Exception as e:
+                # 文件损坏或结构不对（如写入中途被中断）时整体重新翻译
+                print(f"读取分句翻译结果失败，重新翻译: {e}")
+                items = None
+        if items is None:
+            items = [{
+                'index': idx,
+                'start': seg['start'],
+                'end': seg['end'],
+                'text': seg['text'],
+                'translated': None,
+                'error': None
+            } for idx, seg in enumerate(segments)]
+
+        pending = [item for item in items if item['translated'] is None or item['error']]
+        if pending:
+            print(f"开始分句翻译，待翻译: {len(pending)}/{len(items)}句")
+            translated = self.translate_batch([item['text'] for item in pending])
+            for item, (zh, error) in zip(pending, translated):
+                if error:
+                    print(f"第{item['index']+1}句翻译失败，使用原文: {error}")
+                item['translated'] = zh
+                item['error'] = error
+
+        with open(artifact_path, 'w', encoding='utf-8') as f:
+            json.dump(items, f, ensure_ascii=False)
+        failed = sum(1 for item in items if item['error'])
+        print(f"分句翻译完成: {artifact_path} 共{len(items)}句，失败{failed}句")
+        return items
+
     def generate_translated_srt_subtitle(self, whisper_result, task_id):
         """对每个分句翻译并生成中文字幕SRT（保留标点）"""
         print(f"开始生成中文字幕SRT字幕文件（保留标点）")
         srt_path = f"temp/subtitle_{task_id}.srt"
         try:
-            segments = whisper_result['segments']
-            zh_texts = []
-            for seg in segments:
-                try:
-                    zh = self.translate_text(seg['text'])
-                except Exception as e:
-                    print(f"分句翻译失败，使用原文: {e}")
-                    zh = seg['text']
-                # 不再去除标点
-                zh_texts.append(zh)
+            translated = self.translate_segments(whisper_result, task_id)
             with open(srt_path, 'w', encoding='utf-8') as f:
-                for idx, seg in enumerate(segments):
-                    start_time = self.format_timestamp(seg['start'])
-                    end_time = self.format_timestamp(seg['end'])
+                for idx, item in enumerate(translated):
+                    start_time = self.format_timestamp(item['start'])
+                    end_time = self.format_timestamp(item['end'])
                     f.write(f"{idx+1}\n")
                     f.write(f"{start_time} --> {end_time}\n")
-                    f.write(f"{zh_texts[idx].strip()}\n\n")
+                    # 不再去除标点
+                    f.write(f"{item['translated'].strip()}\n\n")
             print(f"中文字幕SRT字幕文件生成完成: {srt_path}")
             return srt_path
         except Exception as e:
             print(f"生成中文字幕SRT失败: {str(e)}")
             raise e
 
-    def generate_segmented_audio(self, whisper_result, task_id):
-        """对每个分句翻译、TTS合成、内容变速拉伸并拼接，返回完整音频路径（语音字幕严格同步）"""
-        print(f"开始分句TTS合成并拼接音频（内容变速拉伸）")
-        import tempfile
-        import shutil
-        from pydub import AudioSegment
-        import librosa
-        import soundfile as sf
-        import numpy as np
-        import os
+    def _decode_audio_bytes(self, data):
+        """在内存中解码TTS返回的音频字节，返回(单声道float32采样, 采样率)"""
+        try:
+            y, sr = sf.read(io.BytesIO(data), dtype='float32', always_2d=True)
+            y = y.mean(axis=1)
+        except Exception:
+            # 非wav数据（如mp3）交给pydub解码
+            segment = AudioSegment.from_file(io.BytesIO(data))
+            sr = segment.frame_rate
+            samples = np.array(segment.get_array_of_samples(), dtype=np.float32)
+            samples /= float(1 << (8 * segment.sample_width - 1))
+            y = samples.reshape(-1, segment.channels).mean(axis=1)
+        if sr != TTS_SAMPLE_RATE:
+            y = librosa.resample(y, orig_sr=sr, target_sr=TTS_SAMPLE_RATE)
+            sr = TTS_SAMPLE_RATE
+        return y.astype(np.float32), sr
+
+    def _synthesize_segment(self, idx, seg, zh):
+        """单句TTS合成并变速拉伸到分句时长，全程在内存中处理，返回(采样数组, 待批量变速的目标采样数)；
+        选中ffmpeg引擎的分句不在这里变速，原样返回并给出目标采样数，由调用方交给StretchBatcher批量处理，
+        其余分句第二项为None；合成失败返回(None, None)"""
+        tts_result = SpeechSynthesizer.call(
+            model=TTS_VOICE,
+            text=zh,
+            sample_rate=TTS_SAMPLE_RATE,
+            format='wav',
+            speech_rate=-200  # 慢速合成
+        )
+        audio_data = tts_result.get_audio_data()
+        if audio_data is None:
+            print(f"[TTS] 第{idx+1}句 TTS失败，未生成音频")
+            return None, None
+        y, sr = self._decode_audio_bytes(audio_data)
+        # 目标时长（秒）
+        target_duration = seg['end'] - seg['start']
+        actual_duration = len(y) / sr
+        print(f"[TTS] 第{idx+1}句 音频生成成功 实际时长: {actual_duration:.2f}s 目标时长: {target_duration:.2f}s")
+        # 变速拉伸：按目标采样数拉伸，引擎按变速比例和分句长度自动选择
+        if actual_duration > 0.1 and abs(actual_duration - target_duration) > 0.05:
+            target_len = int(target_duration * sr)
+            speed = len(y) / max(target_len, 1)
+            if defer_to_batch(y, sr, target_len):
+                print(f"[TTS] 第{idx+1}句 speed={speed:.3f} 交给ffmpeg批量变速")
+                return y, target_len
+            try:
+                y, engine = stretch_to_length(y, sr, target_len)
+            except Exception as e:
+                print(f"[TTS] 第{idx+1}句 变速失败: {e}，跳过变速")
+                y, engine = fit_length(y, target_len), 'none'
+            print(f"[TTS] 第{idx+1}句 变速拉伸完成 speed={speed:.3f} engine={engine}")
+        return y, None
+
+    def generate_segmented_audio(self, whisper_result, task_id, concurrency=None, total_duration=None):
+        """对每个分句翻译、TTS合成、内容变速拉伸并拼接，返回完整音频路径（语音字幕严格同步）
+        各分句在有界线程池中并发合成，网络等待与变速计算在分句之间重叠；
+        合成结果按分句起始时间写入预分配的时间轴缓冲区，分句之间的空白保留为静音"""
+        concurrency = max(1, int(concurrency or TTS_CONCURRENCY))
+        print(f"开始分句TTS合成并拼接音频（内容变速拉伸），并发数: {concurrency}")
         segments = whisper_result['segments']
-        temp_dir = tempfile.mkdtemp(prefix=f"seg_audio_{task_id}_")
-        audio_paths = []
+        # 时间轴覆盖整段视频，未知时长时以最后一句结束时间为准
+        last_end = max((seg['end'] for seg in segments), default=0.0)
+        timeline = DubTimeline(max(total_duration or 0.0, last_end), TTS_SAMPLE_RATE)
         try:
+            # 复用字幕阶段的分句翻译结果，只重试之前失败的分句
+            translated = self.translate_segments(whisper_result, task_id)
             for idx, seg in enumerate(segments):
-                print(f"[TTS] 第{idx+1}句 原文: {seg['text']}")
+                print(f"[TTS] 第{idx+1}句 原文: {seg['text']} 中文: {translated[idx]['translated']}")
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"tts_{task_id}") as executor:
+                futures = [
+                    executor.submit(self._synthesize_segment, idx, seg, translated[idx]['translated'])
+                    for idx, seg in enumerate(segments)
+                ]
+                def place(seg, y):
+                    if y is not None:
+                        timeline.place(seg['start'], y)
+
+                stretcher = StretchBatcher(TTS_SAMPLE_RATE, place)
                 try:
-                    zh = self.translate_text(seg['text'])
-                except Exception as e:
-                    print(f"[TTS] 第{idx+1}句 翻译失败，使用原文: {e}")
-                    zh = seg['text']
-                print(f"[TTS] 第{idx+1}句 中文: {zh}")
-                tts_result = SpeechSynthesizer.call(
-                    model='sambert-zhixiang-v1',
-                    text=zh,
-                    sample_rate=48000,
-                    speech_rate=-200  # 慢速合成
-                )
-                if tts_result.get_audio_data() is not None:
-                    seg_audio_path = os.path.join(temp_dir, f"seg_{idx}.mp3")
-                    with open(seg_audio_path, 'wb') as f:
-                        f.write(tts_result.get_audio_data())
-                    # 目标时长（秒）
-                    target_duration = seg['end'] - seg['start']
-                    # 先转为wav
-                    wav_path = seg_audio_path.replace('.mp3', '.wav')
-                    os.system(f'ffmpeg -y -i "{seg_audio_path}" -ar 22050 "{wav_path}"')
-                    y, sr = librosa.load(wav_path, sr=None, mono=True)
-                    actual_duration = librosa.get_duration(y=y, sr=sr)
-                    print(f"[TTS] 第{idx+1}句 音频生成成功: {seg_audio_path} 实际时长: {actual_duration:.2f}s 目标时长: {target_duration:.2f}s")
-                    # 变速拉伸
-                    if actual_duration > 0.1 and abs(actual_duration - target_duration) > 0.05:
-                        rate = target_duration / actual_duration  # 修正为目标/实际
-                        try:
-                            y_stretch = librosa.effects.time_stretch(y, rate)
-                        except Exception as e:
-                            print(f"[TTS] 第{idx+1}句 time_stretch失败: {e}，跳过变速")
-                            y_stretch = y
-                        # 裁剪或补零精确对齐
-                        target_len = int(target_duration * sr)
-                        if len(y_stretch) > target_len:
-                            y_stretch = y_stretch[:target_len]
-                        else:
-                            y_stretch = np.pad(y_stretch, (0, target_len - len(y_stretch)), mode='constant')
-                        sf.write(wav_path, y_stretch, sr)
-                        # 再转回mp3
-                        os.system(f'ffmpeg -y -i "{wav_path}" -ar 48000 "{seg_audio_path}"')
-                        print(f"[TTS] 第{idx+1}句 变速拉伸完成 rate={rate:.3f}")
-                    audio_paths.append(seg_audio_path)
-                else:
-                    print(f"[TTS] 第{idx+1}句 TTS失败，未生成音频")
-            # 拼接所有音频片段
-            combined = None
-            total_duration = 0.0
-            for path in audio_paths:
-                seg_audio = AudioSegment.from_file(path)
-                if combined is None:
-                    combined = seg_audio
-                else:
-                    combined += seg_audio
-                total_duration += seg_audio.duration_seconds
-            final_audio_path = f"temp/new_audio_{task_id}.mp3"
-            if combined:
-                combined.export(final_audio_path, format="mp3")
-                print(f"[TTS] 分句拼接音频完成: {final_audio_path} 总时长: {total_duration:.2f}s 共{len(audio_paths)}句")
-            else:
+                    # 每句完成后立即写入时间轴对应位置，需要ffmpeg变速的分句攒批处理，不在内存中积压
+                    for seg, future in zip(segments, futures):
+                        stretcher.add(seg, *future.result())
+                    stretcher.flush()
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            if not timeline.placed:
                 print("[TTS] 没有可用的分句音频，TTS全失败，未生成音频！")
                 raise Exception("没有可用的分句音频，TTS全失败")
-            # 清理临时分句音频
-            shutil.rmtree(temp_dir)
+            # 整条音轨只编码一次
+            final_audio_path = f"temp/new_audio_{task_id}.wav"
+            timeline.write(final_audio_path)
+            print(f"[TTS] 分句拼接音频完成: {final_audio_path} 总时长: {timeline.duration:.2f}s 共{timeline.placed}句")
             return final_audio_path
         except Exception as e:
             print(f"[TTS] 分句TTS合成拼接失败: {str(e)}")
-            shutil.rmtree(temp_dir, ignore_errors=True)
-            raise e 
\ No newline at end of file
+            raise e
+        finally:
+            timeline.close()
+
+    def generate_streaming_outputs(self, stream, task_id, concurrency=None, total_duration=None,
+                                   network_slot=None, on_subtitles=None):
+        """边识别边处理：从SegmentStream按批取出识别出的分句，逐批翻译、写入中文字幕、合成分句配音，
+        识别结束时字幕和配音也接近完成；返回(字幕路径, 配音路径)。
+        network_slot()返回网络阶段名额的上下文，只在每批的翻译和TTS请求期间占用，等待识别时不占用；
+        字幕和分句翻译文件写完后（写入配音之前）调用on_subtitles(字幕路径)，调用方据此先记录识别和字幕的检查点，
+        之后配音失败时恢复任务不必重新识别。
+        处理方式与识别完成后依次调用generate_translated_srt_subtitle、generate_segmented_audio相同：
+        字幕使用第一次翻译结果，翻译失败的分句在配音前重试一次，配音按分句顺序写入时间轴，
+        时间轴最终长度取视频时长与最后一句结束时间的较大值"""
+        concurrency = max(1, int(concurrency or TTS_CONCURRENCY))
+        network_slot = network_slot or nullcontext
+        print(f"开始流式处理分句（翻译、中文字幕、分句TTS），TTS并发数: {concurrency}")
+        srt_path = f"temp/subtitle_{task_id}.srt"
+        # 字幕先写入临时文件，全部分句写完才改名，失败时不会留下只写了一半的字幕
+        partial_srt_path = srt_path + '.part'
+        timeline = DubTimeline(total_duration or 0.0, TTS_SAMPLE_RATE)
+        items = []
+        last_end = 0.0
+
+        def place(seg, y):
+            if y is None:
+                return
+            # 时长未知或分句超出视频时长时先延长时间轴，分句不被截断、也不必积压在内存中，最终长度在写出前确定
+            timeline.grow_to_fit(seg['start'], y)
+            timeline.place(seg['start'], y)
+
+        stretcher = StretchBatcher(TTS_SAMPLE_RATE, place)
+        # 配音出错后不再提交TTS，但继续翻译并写完字幕，识别结果和字幕仍可记录检查点
+        tts_error = None
+        try:
+            with open(partial_srt_path, 'w', encoding='utf-8') as srt, \
+                    ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"tts_{task_id}") as executor:
+                for batch in stream.batches():
+                    with network_slot():
+                        translated = self.translate_batch([seg['text'] for seg in batch])
+                        batch_items = []
+                        for seg, (zh, error) in zip(batch, translated):
+                            idx = len(items)
+                            if error:
+                                print(f"第{idx+1}句翻译失败，使用原文: {error}")
+                            item = {
+                                'index': idx,
+                                'start': seg['start'],
+                                'end': seg['end'],
+                                'text': seg['text'],
+                                'translated': zh,
+                                'error': error
+                            }
+                            items.append(item)
+                            batch_items.append(item)
+                            srt.write(f"{idx+1}\n")
+                            srt.write(f"{self.format_timestamp(seg['start'])} --> {self.format_timestamp(seg['end'])}\n")
+                            srt.write(f"{zh.strip()}\n\n")
+                        srt.flush()
+                        # 与generate_segmented_audio相同：字幕保留第一次翻译结果，配音前只重试失败的分句
+                        pending = [item for item in batch_items if item['error']]
+                        if pending:
+                            print(f"重试翻译失败的分句: {len(pending)}句")
+                            retried = self.translate_batch([item['text'] for item in pending])
+                            for item, (zh, error) in zip(pending, retried):
+                                item['translated'] = zh
+                                item['error'] = error
+                        if tts_error is None:
+                            for seg, item in zip(batch, batch_items):
+                                print(f"[TTS] 第{item['index']+1}句 原文: {seg['text']} 中文: {item['translated']}")
+                            futures = [
+                                executor.submit(self._synthesize_segment, item['index'], seg, item['translated'])
+                                for seg, item in zip(batch, batch_items)
+                            ]
+                            try:
+                                # 本批配音按顺序写入时间轴，需要ffmpeg变速的分句攒批处理
+                                for seg, future in zip(batch, futures):
+                                    stretcher.add(seg, *future.result())
+                            except Exception as e:
+                                for future in futures:
+                                    future.cancel()
+                                print(f"[TTS] 分句TTS合成失败，继续完成字幕: {str(e)}")
+                                tts_error = e
+                    last_end = max([last_end] + [seg['end'] for seg in batch])
+                    print(f"[流式] 已处理{len(items)}句，已写入配音{timeline.placed}句")
+            os.replace(partial_srt_path, srt_path)
+            with open(self.translated_segments_path(task_id), 'w', encoding='utf-8') as f:
+                json.dump(items, f, ensure_ascii=False)
+            failed = sum(1 for item in items if item['error'])
+            print(f"中文字幕SRT字幕文件生成完成: {srt_path} 共{len(items)}句，翻译失败{failed}句")
+            if on_subtitles is not None:
+                on_subtitles(srt_path)
+            if tts_error is not None:
+                raise tts_error
+            stretcher.flush()
+            final_duration = max(total_duration or 0.0, last_end)
+            timeline.extend(final_duration)
+            timeline.truncate(final_duration)
+            if not timeline.placed:
+                print("[TTS] 没有可用的分句音频，TTS全失败，未生成音频！")
+                raise Exception("没有可用的分句音频，TTS全失败")
+            final_audio_path = f"temp/new_audio_{task_id}.wav"
+            timeline.write(final_audio_path)
+            print(f"[TTS] 分句拼接音频完成: {final_audio_path} 总时长: {timeline.duration:.2f}s 共{timeline.placed}句")
+            return srt_path, final_audio_path
+        except Exception as e:
+            print(f"[流式] 分句流式处理失败: {str(e)}")
+            raise e
+        finally:
+            # 下游出错时取消识别线程并等待其退出，不再为已失败的任务占用识别资源
+            stream.close()
+            if os.path.exists(partial_srt_path):
+                os.remove(partial_srt_path)
+            timeline.close()